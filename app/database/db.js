@@ -940,48 +940,39 @@ const getEmployeesNotLinked = async () => {
 
 /**
  * Updates the inventory based on the order ID.
+ * Every inventory item goes down by the servings of the order that use it:
+ * the order's items are joined to their ingredients (each menu item's bill of
+ * materials) and summed per inventory item, so the whole order is one statement.
+ * quantity counts servings, one per serving of each ingredient, the same unit the
+ * generated inventory_report history uses (py_scripts/create_inventory_report.py).
  * @param {number} orderId - The ID of the order.
+ * @returns {Promise<number>} The number of inventory items updated.
  * @throws Will throw an error if the query fails or inventory update fails.
  */
 async function updateInventory(orderId) {
-    const getMenuItemsQuery = 'SELECT menu_item_id FROM order_items WHERE order_id = $1';
+    const query = `
+        WITH used AS (
+            SELECT ig.inventory_item_id, SUM(oi.recorded_quantity) AS used
+            FROM order_items oi
+            JOIN ingredients ig ON ig.menu_item_id = oi.menu_item_id
+            WHERE oi.order_id = $1
+            GROUP BY ig.inventory_item_id
+        ), locked AS (
+            -- lock in id order so concurrent cashouts cannot deadlock
+            SELECT inventory_id FROM inventory
+            WHERE inventory_id IN (SELECT inventory_item_id FROM used)
+            ORDER BY inventory_id
+            FOR UPDATE
+        )
+        UPDATE inventory iv
+        SET quantity = iv.quantity - used.used
+        FROM used
+        JOIN locked ON locked.inventory_id = used.inventory_item_id
+        WHERE iv.inventory_id = used.inventory_item_id
+    `;
     try {
-        const { rows: menuItems } = await pool.query(getMenuItemsQuery, [orderId]);
-
-        if (menuItems.length === 0) {
-            console.log(`No menu items found for order ID ${orderId}`);
-            return;  
-        }
-
-        console.log(`Found ${menuItems.length} menu items for order ID ${orderId}`);
-
-        for (const menuItem of menuItems) {
-            const menuItemID = menuItem.menu_item_id;
-            console.log(`Processing menu item ID: ${menuItemID}`);
-
-            const getIngredientsQuery = 'SELECT inventory_item_id FROM ingredients WHERE menu_item_id = $1';
-            const { rows: ingredients } = await pool.query(getIngredientsQuery, [menuItemID]);
-
-            if (ingredients.length === 0) {
-                console.log(`No ingredients found for menu item ID: ${menuItemID}`);
-                continue;  
-            }
-
-            console.log(`Found ${ingredients.length} ingredients for menu item ID: ${menuItemID}`);
-
-            for (const ingredient of ingredients) {
-                const inventoryItemID = ingredient.inventory_item_id;
-
-                const updateInventoryQuery = 'UPDATE inventory SET quantity = quantity - 1 WHERE inventory_id = $1 RETURNING *';
-                const { rows: updatedInventory } = await pool.query(updateInventoryQuery, [inventoryItemID]);
-
-                if (updatedInventory.length > 0) {
-                    console.log(`Inventory updated for inventory_item_id: ${inventoryItemID}`);
-                } else {
-                    console.log(`No inventory item found with inventory_id: ${inventoryItemID}`);
-                }
-            }
-        }
+        const { rowCount } = await pool.query(query, [orderId]);
+        return rowCount;
     } catch (error) {
         console.error('Error updating inventory:', error);
         throw new Error('Failed to update inventory');
@@ -0,0 +1,19 @@
+import argparse
+
+from . import append, build_cache, load, seed, shards, subsample, validate
+
+parser = argparse.ArgumentParser(prog="python -m py_scripts", description="Generate the POS database seed data.")
+commands = parser.add_subparsers(dest="command", required=True)
+seed.add_arguments(commands.add_parser("seed", help="generate every table and a load manifest"))
+shards.add_arguments(commands.add_parser("shard", help="generate orders for many stores and years in shards"))
+append.add_arguments(commands.add_parser("append", help="generate only the next days of orders for an existing "
+                                                        "database"))
+load.add_arguments(commands.add_parser("load", help="stream a generated directory, compressed or not, into psql"))
+validate.add_arguments(commands.add_parser("validate", help="check a generated directory for duplicate keys, "
+                                                            "dangling references and bad dates"))
+subsample.add_arguments(commands.add_parser("subsample", help="cut a generated directory down to a stratified "
+                                                              "sample of its orders"))
+build_cache.add_arguments(commands.add_parser("cache", help="show or trim the seed command's build cache"))
+
+args = parser.parse_args()
+args.func(args)
@@ -0,0 +1,194 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+import json
+import os
+import random
+import time
+
+from . import compression, create_inventory_report, create_orders, db_queries, demand, seed
+from .paths import sql_file, sql_files_dir
+from .pg import run_psql
+from .writers import DEFAULT_BATCH_SIZE, DEFAULT_FORMAT, FORMATS, open_table, report_throughput
+
+# Tops up an existing database with the orders of the next few days, instead
+# of generating everything again from create_orders.start_date. Only new rows
+# are written: orders, order_items and sales_report past the highest ids in
+# use, and the inventory_report snapshots that fall in the new days, with the
+# stock carried on from where it was.
+#
+# Where things stand (the high-water marks) comes from the checkpoint the
+# previous run wrote into the output directory, or with --database from the
+# database itself, using the same highest id lookups as db.js. Read them from
+# the database when the app has taken orders since the last run, or the new
+# ids would clash with them. The seed command writes no checkpoint, so the
+# first top-up of a database always needs --database.
+#
+#   python -m py_scripts append --database pos --days 1 --output-dir top_up
+#   psql -d pos -f top_up/load.sql
+#
+# The checkpoint is moved on when the files are written, so load them before
+# the next run.
+
+# the checkpoint's name in the output directory, which is left out of git
+checkpoint_file = "append_checkpoint.json"
+
+# the tables an append writes: the order tables, plus inventory_report when a
+# weekly snapshot falls in the new days
+tables = list(create_orders.order_tables) + ["inventory_report"]
+
+
+def query(sql, database):
+    result = run_psql(["-A", "-t", "-F", "\t", "-c", sql], database)
+    return [line.split("\t") for line in result.stdout.splitlines()]
+
+
+# the high-water marks of a database: the last order day, the highest ids and
+# the stock after the last day, replayed from the latest inventory_report
+# snapshot with the servings sold since.
+def database_marks(database):
+    order_id = query(db_queries.function_query("getHighestOrderId"), database)
+    order_item_id = query(db_queries.function_query("getHighestOrderItemId"), database)
+    (last_date, sales_report_id, inventory_report_id, report_date), = query(
+        "SELECT (SELECT max(order_date) FROM orders), (SELECT max(sales_report_id) FROM sales_report), "
+        "(SELECT max(inventory_report_id) FROM inventory_report), "
+        "(SELECT max(inventory_report_date) FROM inventory_report)", database)
+    if not last_date:
+        raise ValueError(f"no orders in {database}: seed it first")
+    marks = {
+        "last_date": last_date,
+        "order_id": int(order_id[0][0]) if order_id else 0,
+        "order_item_id": int(order_item_id[0][0] or 0),
+        "sales_report_id": int(sales_report_id or 0),
+        "inventory_report_id": int(inventory_report_id or 0),
+        "inventory_report_date": report_date or None,
+        "discounts": {menu_item_id: float(discount) for menu_item_id, discount in
+                      query("SELECT discounted_item, discount_amount FROM promos ORDER BY promo_id", database)},
+        "fill_levels": {},
+        "servings": {},
+    }
+    if report_date:
+        marks["fill_levels"] = {inventory_id: int(fill_level) for inventory_id, fill_level in
+                                query("SELECT inventory_id, fill_level FROM inventory", database)}
+        stock = create_inventory_report.Stock(
+            {int(inventory_id): fill_level for inventory_id, fill_level in marks["fill_levels"].items()},
+            {int(inventory_id): int(quantity) for inventory_id, quantity in
+             query(f"SELECT inventory_item_id, recorded_quantity FROM inventory_report "
+                   f"WHERE inventory_report_date = '{report_date}'", database)})
+        usage = defaultdict(dict)
+        for date, menu_item_id, servings in query(
+                f"SELECT o.order_date, oi.menu_item_id, sum(oi.recorded_quantity) FROM order_items oi "
+                f"JOIN orders o ON o.order_id = oi.order_id WHERE o.order_date >= '{report_date}' "
+                f"GROUP BY 1, 2", database):
+            usage[date][int(menu_item_id)] = int(servings)
+        day = datetime.strptime(report_date, '%Y-%m-%d')
+        while day <= datetime.strptime(last_date, '%Y-%m-%d'):
+            stock.run_day(usage.get(day.strftime('%Y-%m-%d'), {}))
+            day += timedelta(days=1)
+        marks["servings"] = {str(inventory_id): servings for inventory_id, servings in stock.servings.items()}
+    return marks
+
+
+def read_checkpoint(path):
+    with open(path) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def write_checkpoint(path, marks):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # write to the side and rename, so a crash never leaves half a checkpoint
+    with open(path + ".tmp", 'w') as checkpoint_file:
+        json.dump(marks, checkpoint_file, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+# Write the rows of num_days after the marks into output_dir and return the
+# rows written per table and the marks after them
+def write_delta(output_dir, marks, num_days, options):
+    first_date = datetime.strptime(marks["last_date"], '%Y-%m-%d') + timedelta(days=1)
+    # every day gets its own random streams, so a top-up is reproducible
+    # whatever was appended before it
+    day_seed = f"{options['seed']}:{first_date.strftime('%Y-%m-%d')}"
+    random.seed(f"{day_seed}:orders")
+    first_order_id = max(marks["order_id"], marks["sales_report_id"]) + 1
+    rows = create_orders.write_order_data(
+        output_dir, first_date, 0, options["format"], options["batch_size"], day_seed, engine=options["engine"],
+        demand_file=options["demand"], daily_orders=options["daily_orders"], num_days=num_days,
+        first_order_id=first_order_id, first_order_item_id=marks["order_item_id"] + 1,
+        discounts={int(menu_item_id): discount for menu_item_id, discount in marks["discounts"].items()},
+        create_tables=False)
+
+    last_date = first_date + timedelta(days=num_days - 1)
+    new_marks = dict(marks, last_date=last_date.strftime('%Y-%m-%d'),
+                     order_id=first_order_id + rows["orders"] - 1,
+                     order_item_id=marks["order_item_id"] + rows["order_items"],
+                     sales_report_id=first_order_id + rows["sales_report"] - 1)
+
+    usage_path = os.path.join(output_dir, create_orders.usage_file)
+    if marks["inventory_report_date"]:
+        stock = create_inventory_report.Stock(
+            {int(inventory_id): fill_level for inventory_id, fill_level in marks["fill_levels"].items()},
+            {int(inventory_id): servings for inventory_id, servings in marks["servings"].items()})
+        next_report = datetime.strptime(marks["inventory_report_date"], '%Y-%m-%d') + timedelta(weeks=1)
+        first_report_day = (next_report - first_date).days % 7
+        output_file = sql_file("inventory_report", output_dir)
+        with open_table(output_file, "inventory_report", create_inventory_report.columns, "", options["format"],
+                        options["batch_size"]) as writer:
+            for row in create_inventory_report.simulate(stock, create_orders.read_usage(usage_path), first_date,
+                                                        num_days, marks["inventory_report_id"] + 1,
+                                                        first_report_day):
+                writer.write(row)
+                new_marks["inventory_report_date"] = row[2]
+        report_throughput("inventory_report", writer.rows_written, writer.started)
+        rows["inventory_report"] = writer.rows_written
+        new_marks["inventory_report_id"] = marks["inventory_report_id"] + writer.rows_written
+        new_marks["servings"] = {str(inventory_id): servings for inventory_id, servings in stock.servings.items()}
+    return rows, new_marks
+
+
+def add_arguments(parser):
+    parser.add_argument("--days", type=int, default=1, help="number of days to add after the last order day")
+    parser.add_argument("--output-dir", default=os.path.join(sql_files_dir, "append"))
+    parser.add_argument("--checkpoint", help=f"the high-water marks of the last run, updated after this one "
+                                             f"(default: {checkpoint_file} in the output directory)")
+    parser.add_argument("--database", help="read the high-water marks from this database instead of the checkpoint")
+    parser.add_argument("--format", choices=FORMATS, default=DEFAULT_FORMAT)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--engine", choices=create_orders.engines, default="python")
+    parser.add_argument("--demand", default=demand.default_config, help="demand model config (JSON)")
+    parser.add_argument("--daily-orders", type=int, nargs=2, metavar=("MIN", "MAX"),
+                        help="override the demand model's orders per ordinary day")
+    parser.add_argument("--seed", default="append", help="the same seed and days always give the same rows")
+    compression.add_compression_arguments(parser)
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    checkpoint = args.checkpoint or os.path.join(args.output_dir, checkpoint_file)
+    if args.database:
+        marks = database_marks(args.database)
+        source = f"database {args.database}"
+    elif os.path.exists(checkpoint):
+        marks = read_checkpoint(checkpoint)
+        source = checkpoint
+    else:
+        raise SystemExit(f"{checkpoint} not found: pass --database to read the high-water marks from the database "
+                         "(the first top-up always needs it)")
+    options = {"format": args.format, "batch_size": args.batch_size, "seed": args.seed, "engine": args.engine,
+               "demand": os.path.abspath(args.demand), "daily_orders": args.daily_orders, "compress": args.compress,
+               # the tables and their keys are in the database already, so no staged load plan
+               "inline_constraints": True}
+    compression.configure(args.compress, args.compress_level, args.compress_threads)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for table in tables:
+        # leave nothing from an earlier top-up for load.sql to pick up
+        while compression.find_file(sql_file(table, args.output_dir)):
+            os.remove(compression.find_file(sql_file(table, args.output_dir)))
+
+    started = time.perf_counter()
+    rows, new_marks = write_delta(args.output_dir, marks, args.days, options)
+    seed.write_manifest(args.output_dir, rows, options, "append")
+    write_checkpoint(checkpoint, new_marks)
+
+    print(f"Appended {args.days} days after {marks['last_date']} (marks from {source}): "
+          f"{rows['orders']} orders from order_id {marks['order_id'] + 1}, "
+          f"{sum(rows.values())} rows in {time.perf_counter() - started:.2f}s into {args.output_dir}")
@@ -0,0 +1,212 @@
+from collections import Counter, defaultdict
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from . import bench_reports, create_menu_items, create_order_items, create_orders, db_queries, demand
+from .load_test import percentile
+from .pg import connection_settings
+
+try:
+    import asyncpg
+except ImportError as error:
+    raise ImportError("the inventory update benchmark needs asyncpg: pip install asyncpg") from error
+
+# Compares the two ways of taking an order's ingredients out of the inventory
+# on cashout, with many cashouts at once:
+#
+#   loop  what updateInventory in db.js used to do: one query for the order's
+#         items, one per item for its ingredients and one UPDATE per
+#         ingredient, each on whatever pool connection is free
+#   set   the single statement updateInventory runs now, read from db.js
+#
+# A batch of orders is added to a seeded database up front. Every run starts
+# from the same inventory quantities, cashes out all the orders with
+# --concurrency workers, and checks the final quantities against the ones
+# worked out here from the ingredients table. The loop takes one serving per
+# item line whatever its recorded_quantity, so it is checked against that.
+#
+#   python -m py_scripts.bench_inventory_update --orders 2000 --concurrency 1 10 50
+
+paths = ["loop", "set"]
+
+default_concurrency = [1, 10, 50]
+
+# the queries of the old updateInventory
+loop_queries = {
+    "items": "SELECT menu_item_id FROM order_items WHERE order_id = $1",
+    "ingredients": "SELECT inventory_item_id FROM ingredients WHERE menu_item_id = $1",
+    "update": "UPDATE inventory SET quantity = quantity - 1 WHERE inventory_id = $1 RETURNING *",
+}
+
+
+async def update_loop(pool, order_id, set_sql):
+    statements = 1
+    for item in await pool.fetch(loop_queries["items"], order_id):
+        ingredients = await pool.fetch(loop_queries["ingredients"], item["menu_item_id"])
+        statements += 1
+        for ingredient in ingredients:
+            await pool.fetch(loop_queries["update"], ingredient["inventory_item_id"])
+            statements += 1
+    return statements
+
+
+async def update_set(pool, order_id, set_sql):
+    await pool.execute(set_sql, order_id)
+    return 1
+
+
+updates = {"loop": update_loop, "set": update_set}
+
+
+# Add num_orders orders past the highest order id, built with the same rules
+# as the seed data, and return their items
+async def add_orders(pool, num_orders, seed):
+    menu = create_orders.load_menu(create_menu_items.input_file)
+    demand_model = demand.load_demand(demand.default_config, menu)
+    menu_choices = create_order_items.build_menu_choices(menu, demand_model.popularity)
+    random.seed(f"{seed}:orders")
+
+    first_order_id = await pool.fetchval("SELECT COALESCE(max(order_id), 0) + 1 FROM orders")
+    order_item_id = await pool.fetchval("SELECT COALESCE(max(order_item_id), 0) + 1 FROM order_items")
+    now = datetime.now()
+    orders, order_items = [], []
+    for order_id in range(first_order_id, first_order_id + num_orders):
+        items, price = create_order_items.generate_order_items(order_id, order_item_id, menu_choices, {},
+                                                               demand_model.combo_mix)
+        orders.append((order_id, random.randint(1, 10), now.date(), now.time(), price, "Awaiting"))
+        order_items.extend(items)
+        order_item_id += len(items)
+
+    async with pool.acquire() as connection:
+        await connection.copy_records_to_table("orders", records=orders,
+                                               columns=[column.lower() for column in create_orders.order_columns])
+        await connection.copy_records_to_table("order_items", records=order_items,
+                                               columns=create_order_items.order_item_columns)
+    return order_items
+
+
+# the inventory used by a batch of orders: per inventory item, the servings
+# (with_quantity) or the item lines that use it
+async def expected_usage(pool, order_items, with_quantity):
+    ingredients = defaultdict(list)
+    for row in await pool.fetch("SELECT menu_item_id, inventory_item_id FROM ingredients"):
+        ingredients[row["menu_item_id"]].append(row["inventory_item_id"])
+    used = Counter()
+    for _, _, menu_item_id, _, _, _, quantity in order_items:
+        for inventory_item_id in ingredients[menu_item_id]:
+            used[inventory_item_id] += quantity if with_quantity else 1
+    return used
+
+
+async def inventory_quantities(pool):
+    rows = await pool.fetch("SELECT inventory_id, quantity FROM inventory")
+    return {row["inventory_id"]: row["quantity"] for row in rows}
+
+
+async def restore_inventory(pool, quantities):
+    await pool.executemany("UPDATE inventory SET quantity = $2 WHERE inventory_id = $1", list(quantities.items()))
+
+
+# cash out every order with concurrency workers and time each update
+async def run_path(pool, path, order_ids, concurrency, set_sql):
+    update = updates[path]
+    queue = asyncio.Queue()
+    for order_id in order_ids:
+        queue.put_nowait(order_id)
+    latencies = []
+    errors = Counter()
+    statements = 0
+
+    async def worker():
+        nonlocal statements
+        while not queue.empty():
+            order_id = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                count = await update(pool, order_id, set_sql)
+            except asyncpg.PostgresError as error:
+                errors[type(error).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            statements += count
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "orders": len(order_ids),
+        "errors": dict(errors),
+        "statements": statements,
+        "elapsed": elapsed,
+        "orders_per_s": len(latencies) / elapsed,
+        "latency_ms": {name: round(percentile(latencies, q) * 1000, 2) if latencies else None
+                       for name, q in [("p50", 50), ("p95", 95), ("p99", 99)]},
+    }
+
+
+async def run(database, num_orders, concurrency_levels, seed, pool_size):
+    set_sql = db_queries.function_query("updateInventory")
+    pool = await asyncpg.create_pool(min_size=1, max_size=pool_size, **connection_settings(database))
+    try:
+        order_items = await add_orders(pool, num_orders, seed)
+        order_ids = sorted({row[1] for row in order_items})
+        start = await inventory_quantities(pool)
+        expected = {True: await expected_usage(pool, order_items, True),
+                    False: await expected_usage(pool, order_items, False)}
+
+        results = []
+        for concurrency in concurrency_levels:
+            for path in paths:
+                await restore_inventory(pool, start)
+                result = await run_path(pool, path, order_ids, concurrency, set_sql)
+                used = expected[path == "set"]
+                final = await inventory_quantities(pool)
+                result["inventory_matches"] = all(final[inventory_id] == quantity - used[inventory_id]
+                                                  for inventory_id, quantity in start.items())
+                results.append(result)
+        await restore_inventory(pool, start)
+        return results
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the updateInventory cashout query under concurrent load.")
+    parser.add_argument("--database", default="pos_inventory_bench")
+    parser.add_argument("--no-seed", action="store_true", help="reuse the database from an earlier run")
+    parser.add_argument("--weeks", type=int, default=1, help="weeks of seed orders to load first")
+    parser.add_argument("--orders", type=int, default=2000, help="orders cashed out per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=default_concurrency,
+                        help="cashouts in flight at once")
+    parser.add_argument("--pool-size", type=int, default=10,
+                        help="database connections (node-postgres pools 10 by default)")
+    parser.add_argument("--seed", default="inventory_bench")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        bench_reports.seed_database(args.database, 1, args.weeks, "python", 1)
+    results = asyncio.run(run(args.database, args.orders, args.concurrency, args.seed, args.pool_size))
+
+    print(f"{'path':<5} {'conc':>5} {'orders/s':>9} {'stmts':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>7} inventory")
+    for result in results:
+        latency = result["latency_ms"]
+        print(f"{result['path']:<5} {result['concurrency']:>5} {result['orders_per_s']:>9.1f} "
+              f"{result['statements']:>7} "
+              + " ".join(f"{latency[name] if latency[name] is not None else '-':>8}" for name in ["p50", "p95", "p99"])
+              + f" {sum(result['errors'].values()):>7} {'ok' if result['inventory_matches'] else 'MISMATCH'}")
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({"database": args.database, "orders": args.orders, "pool_size": args.pool_size,
+                       "seed": args.seed, "runs": results}, json_file, indent=2)
+    if not all(result["inventory_matches"] for result in results):
+        raise SystemExit(1)
@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from . import create_orders
+from .paths import sql_file
+from .pg import recreate_database, run_sql_file
+from .writers import DEFAULT_BATCH_SIZE, FORMATS
+
+# Compares how long Postgres takes to load the big generated tables in each
+# output format. Needs psql on the PATH and the DB_* (or PG*) connection
+# variables pointing at a server where we may create a scratch database.
+
+# order_items references menu_items, which is loaded untimed before each run
+menu_items_sql = sql_file("menu_items")
+
+
+def generate(output_dir, fmt, num_weeks, batch_size):
+    create_orders.write_order_data(output_dir, create_orders.start_date, num_weeks, fmt, batch_size, seed="bench")
+    return {table: os.path.join(output_dir, f"{table}.sql") for table in create_orders.order_tables}
+
+
+def time_load(paths, database):
+    recreate_database(database)
+    run_sql_file(menu_items_sql, database)
+
+    timings = {}
+    for table, path in paths.items():
+        started = time.perf_counter()
+        run_sql_file(path, database)
+        timings[table] = time.perf_counter() - started
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark loading the generated tables in each output format.")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--weeks", type=int, default=create_orders.num_weeks)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--database", default="pos_load_bench")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for fmt in args.formats:
+            output_dir = os.path.join(work_dir, fmt)
+            os.makedirs(output_dir)
+            paths = generate(output_dir, fmt, args.weeks, args.batch_size)
+            size = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir))
+
+            runs = [time_load(paths, args.database) for _ in range(args.repeat)]
+            best = {table: min(run[table] for run in runs) for table in paths}
+            results[fmt] = {"bytes": size, "best_seconds": best, "total_seconds": sum(best.values())}
+
+    print(f"{'format':<8} {'MB':>8} " + " ".join(f"{table:>13}" for table in create_orders.order_tables)
+          + f" {'total':>9}")
+    for fmt, result in results.items():
+        print(f"{fmt:<8} {result['bytes'] / 1e6:>8.1f} "
+              + " ".join(f"{result['best_seconds'][table]:>12.2f}s" for table in result["best_seconds"])
+              + f" {result['total_seconds']:>8.2f}s")
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
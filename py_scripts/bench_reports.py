@@ -0,0 +1,196 @@
+from datetime import timedelta
+from statistics import median
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+from . import create_orders, db_queries, demand, rollups, seed
+from .pg import recreate_database, run_psql, run_sql_file
+from .paths import repo_root
+
+# Times the manager report queries from db.js against databases seeded at
+# several multiples of the default dataset size. Each database is seeded with
+# the seed command (with the daily order volume scaled up) and loaded with
+# psql; every report then runs under EXPLAIN (ANALYZE, BUFFERS).
+#
+# With --rollups the rollup tables (see rollups.py) are built as well, and the
+# reports they can answer are also timed against them.
+#
+# Every run is appended to a JSON lines results file, and the timings are
+# compared with the previous run of the same query, so an index or rollup
+# change can be checked against the numbers from before it. The results and
+# the EXPLAIN ANALYZE plans go to bench_dir, which git ignores.
+#
+# Needs psql on the PATH and the DB_* (or PG*) connection variables pointing
+# at a server where we may create databases.
+
+default_scales = [1, 10, 100]
+bench_dir = os.path.join(repo_root, "report_bench")
+default_results = os.path.join(bench_dir, "results.jsonl")
+default_plans_dir = os.path.join(bench_dir, "plans")
+
+# the db.js reports and the parameter sets (see report_ranges) they run with
+reports = {
+    "getDailyOrders": ["day"],
+    "getHourlySales": ["day"],
+    "getSalesReport": ["week", "month", "year"],
+    "getProductUsage": ["week", "month", "year"],
+    "getRestockReport": [None],
+}
+
+
+# representative parameters for a dataset covering num_weeks from start_date:
+# a Saturday half-way through, and the last week, month and year of data
+def report_ranges(start_date, num_weeks):
+    end = start_date + timedelta(weeks=num_weeks, days=-1)
+    middle = start_date + timedelta(weeks=num_weeks // 2, days=6)
+
+    def date_range(days):
+        return [max(end - timedelta(days=days - 1), start_date).strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')]
+
+    return {"day": [middle.strftime('%Y-%m-%d')], "week": date_range(7), "month": date_range(28),
+            "year": date_range(364), None: []}
+
+
+def database_name(prefix, scale):
+    return f"{prefix}_{scale}x"
+
+
+# Generate the seed data at a multiple of the demand model's daily volume and
+# load it into a fresh database
+def seed_database(database, scale, num_weeks, engine, workers, with_rollups=False):
+    with open(demand.default_config) as config_file:
+        low, high = json.load(config_file)["daily_orders"]
+    with tempfile.TemporaryDirectory() as output_dir:
+        seed_parser = argparse.ArgumentParser()
+        seed.add_arguments(seed_parser)
+        seed.main(seed_parser.parse_args(["--output-dir", output_dir, "--format", "copy", "--seed", "bench",
+                                          "--weeks", str(num_weeks), "--engine", engine,
+                                          "--daily-orders", str(low * scale), str(high * scale),
+                                          "--workers", str(workers)]))
+        recreate_database(database)
+        started = time.perf_counter()
+        run_sql_file(os.path.join(output_dir, "load.sql"), database)
+        if with_rollups:
+            rollups.run_rollup(database, backfill=True)
+        run_psql(["-c", "VACUUM ANALYZE"], database)
+        print(f"Loaded {database} in {time.perf_counter() - started:.1f}s")
+
+
+def explain(sql, database, analyze=True, fmt="JSON"):
+    options = f"ANALYZE, BUFFERS, FORMAT {fmt}" if analyze else f"FORMAT {fmt}"
+    result = run_psql(["-A", "-t", "-c", f"EXPLAIN ({options}) {sql.rstrip().rstrip(';')}"], database)
+    return result.stdout
+
+
+# Run one report repeat times and return its timings, buffer counts and the
+# text plan of the last run
+def run_report(sql, database, repeat):
+    runs = [json.loads(explain(sql, database))[0] for _ in range(repeat)]
+    execution = [run["Execution Time"] for run in runs]
+    plan = runs[-1]["Plan"]
+    return {
+        "execution_ms": execution,
+        "best_ms": min(execution),
+        "median_ms": median(execution),
+        "planning_ms": median(run["Planning Time"] for run in runs),
+        "rows": plan.get("Actual Rows"),
+        "shared_hit_blocks": plan.get("Shared Hit Blocks"),
+        "shared_read_blocks": plan.get("Shared Read Blocks"),
+        "plan": explain(sql, database, fmt="TEXT"),
+    }
+
+
+def table_rows(database):
+    result = run_psql(["-A", "-t", "-F", "\t", "-c",
+                       "SELECT (SELECT count(*) FROM orders), (SELECT count(*) FROM order_items)"], database)
+    orders, order_items = result.stdout.split()
+    return {"orders": int(orders), "order_items": int(order_items)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_root, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# the most recent earlier result for every (scale, report, source, range)
+def previous_results(results_file):
+    previous = {}
+    if os.path.exists(results_file):
+        with open(results_file) as results:
+            for line in results:
+                record = json.loads(line)
+                previous[(record["scale"], record["report"], record.get("source", "db.js"), record["range"])] = record
+    return previous
+
+
+# write the text plan of a result to its own file and return the path
+def write_plan(plans_dir, record, plan):
+    os.makedirs(plans_dir, exist_ok=True)
+    name = (f"{record['scale']}x-{record['report']}" + ("-rollup" if record["source"] == "rollup" else "")
+            + (f"-{record['range']}" if record["range"] else "") + ".txt")
+    path = os.path.join(plans_dir, name)
+    with open(path, 'w') as plan_file:
+        plan_file.write(f"-- {record['sql']}\n\n{plan}")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the db.js report queries at several data sizes.")
+    parser.add_argument("--scales", type=int, nargs="+", default=default_scales,
+                        help="multiples of the default daily order volume")
+    parser.add_argument("--weeks", type=int, default=create_orders.num_weeks)
+    parser.add_argument("--reports", nargs="+", choices=list(reports), default=list(reports))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-prefix", default="pos_report_bench")
+    parser.add_argument("--no-seed", action="store_true", help="reuse the databases from an earlier run")
+    parser.add_argument("--engine", choices=create_orders.engines, default="numpy")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--results", default=default_results, help="JSON lines file the runs are appended to")
+    parser.add_argument("--plans-dir", default=default_plans_dir, help="where the EXPLAIN ANALYZE output goes")
+    parser.add_argument("--rollups", action="store_true", help="also time the reports against the rollup tables")
+    parser.add_argument("--label", help="a note stored with this run, e.g. the change being measured")
+    args = parser.parse_args()
+
+    source = db_queries.read_db_js()
+    ranges = report_ranges(create_orders.start_date, args.weeks)
+    previous = previous_results(args.results)
+    run_id = time.strftime('%Y-%m-%dT%H:%M:%S')
+    commit = git_commit()
+
+    print(f"{'scale':>5} {'report':<18} {'source':<7} {'range':<6} {'rows':>8} {'best ms':>10} {'median ms':>10} "
+          f"{'vs last':>8}")
+    os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+    with open(args.results, 'a') as results:
+        for scale in args.scales:
+            database = database_name(args.database_prefix, scale)
+            if not args.no_seed:
+                seed_database(database, scale, args.weeks, args.engine, args.workers, args.rollups)
+            dataset = table_rows(database)
+
+            for report in args.reports:
+                sources = {"db.js": db_queries.function_query(report, source)}
+                if args.rollups and report in rollups.report_queries:
+                    sources["rollup"] = rollups.report_queries[report]
+                for sql_source, report_sql in sources.items():
+                    for range_name in reports[report]:
+                        sql = db_queries.bind(report_sql, ranges[range_name])
+                        record = {"run_id": run_id, "commit": commit, "label": args.label, "scale": scale,
+                                  "dataset": dataset, "report": report, "source": sql_source, "range": range_name,
+                                  "params": ranges[range_name], "sql": sql, **run_report(sql, database, args.repeat)}
+                        record["plan"] = write_plan(os.path.join(args.plans_dir, run_id.replace(":", "")), record,
+                                                    record["plan"])
+                        results.write(json.dumps(record) + "\n")
+                        results.flush()
+
+                        last = previous.get((scale, report, sql_source, range_name))
+                        change = f"{record['best_ms'] / last['best_ms']:.2f}x" if last and last["best_ms"] else "-"
+                        print(f"{scale:>5} {report:<18} {sql_source:<7} {range_name or '-':<6} "
+                              f"{record['rows'] or 0:>8} {record['best_ms']:>10.2f} {record['median_ms']:>10.2f} "
+                              f"{change:>8}")
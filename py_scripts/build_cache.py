@@ -0,0 +1,268 @@
+import ast
+import hashlib
+from importlib import metadata
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+from .paths import repo_root
+
+# A content-addressed cache of generated tables for the seed command, so
+# regenerating sql_files/ only reruns the jobs whose inputs changed. Every
+# job gets a fingerprint, a hash of everything its output depends on:
+#
+#   code      the job's module and every py_scripts module it imports, in
+#             turn, and the versions of Faker and numpy if it uses them
+#   config    the input files those modules read (the txt_files/ inputs,
+#             the demand model)
+#   options   the seed command options the job looks at, and the seed
+#   upstream  the fingerprints of the jobs whose tables it references or
+#             whose output it reads
+#
+# Since the upstream fingerprints are part of it, a change to promos also
+# changes the fingerprint of orders and everything downstream of it along
+# the foreign-key graph, and those are generated again too.
+#
+# An entry is a directory named after the fingerprint holding copies of the
+# job's files, plus entry.json with the rows written and how long they took.
+# Entries are written to the side and renamed into place, so two seed runs
+# sharing a cache never see half an entry. When the cache grows past its
+# size limit the entries used longest ago go first.
+#
+#   python -m py_scripts seed --seed 1 --cache
+#   python -m py_scripts cache stats
+#   python -m py_scripts cache evict --max-size 2G
+
+default_cache_dir = os.path.join(repo_root, ".seed_cache")
+
+package_dir = os.path.dirname(os.path.abspath(__file__))
+
+# third-party packages whose version changes what the generators draw
+tracked_packages = {"faker": "Faker", "numpy": "numpy"}
+
+entry_file = "entry.json"
+stats_file = "stats.json"
+
+size_units = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+# '500M', '2G' or a number of bytes
+def parse_size(size):
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", size, flags=re.IGNORECASE)
+    if not match:
+        raise ValueError(f"not a size: {size}")
+    return int(float(match.group(1)) * size_units[match.group(2).upper()])
+
+
+def format_size(size):
+    for unit in ["T", "G", "M", "K"]:
+        if size >= size_units[unit]:
+            return f"{size / size_units[unit]:.1f}{unit}"
+    return f"{size}B"
+
+
+# the py_scripts modules and the third-party packages a module imports
+def module_imports(name):
+    with open(os.path.join(package_dir, f"{name}.py")) as source_file:
+        tree = ast.parse(source_file.read())
+    modules, packages = set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level == 1:
+            if node.module:
+                modules.add(node.module)
+            else:
+                modules.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            packages.add(node.module.split(".")[0])
+        elif isinstance(node, ast.Import):
+            packages.update(alias.name.split(".")[0] for alias in node.names)
+    return modules, packages
+
+
+# a module and every py_scripts module it imports, directly or not, and the
+# third-party packages any of them import
+def module_closure(name):
+    modules, packages, pending = set(), set(), [name]
+    while pending:
+        module = pending.pop()
+        if module not in modules:
+            modules.add(module)
+            imported, third_party = module_imports(module)
+            pending.extend(imported)
+            packages.update(third_party)
+    return modules, packages
+
+
+def package_version(package):
+    try:
+        return metadata.version(tracked_packages[package])
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# The fingerprint of a job. module is its module's name, input_files the
+# paths of the files it reads, options the options it depends on and
+# upstream the fingerprints of the jobs it depends on.
+def fingerprint(module, input_files, options, upstream):
+    modules, packages = module_closure(module)
+    inputs = {
+        "code": {name: file_digest(os.path.join(package_dir, f"{name}.py")) for name in sorted(modules)},
+        "packages": {package: package_version(package) for package in sorted(packages & set(tracked_packages))},
+        "config": {os.path.basename(path): file_digest(path) for path in sorted(set(input_files))},
+        "options": options,
+        "upstream": upstream,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class BuildCache:
+    def __init__(self, directory=default_cache_dir):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # this run's hits and misses, and the generation time hits saved
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    def entry_dir(self, fingerprint):
+        return os.path.join(self.directory, fingerprint)
+
+    # the entry of a fingerprint, or None
+    def get(self, fingerprint):
+        try:
+            with open(os.path.join(self.entry_dir(fingerprint), entry_file)) as json_file:
+                return json.load(json_file)
+        except (OSError, ValueError):
+            return None
+
+    # Copy an entry's files into output_dir and return its rows per table.
+    # The files are copied rather than linked, since the generators write
+    # over their output files in place and would change the cache with them.
+    def restore(self, fingerprint, entry, output_dir):
+        entry_dir = self.entry_dir(fingerprint)
+        for name in entry["files"]:
+            shutil.copyfile(os.path.join(entry_dir, name), os.path.join(output_dir, name))
+        # touched so eviction sees when it was last used
+        os.utime(os.path.join(entry_dir, entry_file))
+        self.hits += 1
+        self.seconds_saved += entry["seconds"]
+        return entry["rows"]
+
+    # copy a job's files (names in output_dir) into the entry of fingerprint
+    def store(self, fingerprint, job, output_dir, files, rows, seconds):
+        self.misses += 1
+        staging = os.path.join(self.directory, f"tmp-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        size = 0
+        for name in files:
+            shutil.copyfile(os.path.join(output_dir, name), os.path.join(staging, name))
+            size += os.path.getsize(os.path.join(staging, name))
+        with open(os.path.join(staging, entry_file), 'w') as json_file:
+            json.dump({"job": job, "files": sorted(files), "rows": rows, "seconds": seconds, "bytes": size,
+                       "created": time.time()}, json_file, indent=2)
+        try:
+            os.rename(staging, self.entry_dir(fingerprint))
+        except OSError:
+            # another run stored the same fingerprint first
+            shutil.rmtree(staging, ignore_errors=True)
+
+    # (fingerprint, entry, last used) for every entry
+    def entries(self):
+        found = []
+        for name in os.listdir(self.directory):
+            entry = self.get(name) if not name.startswith("tmp-") else None
+            if entry is not None:
+                found.append((name, entry, os.path.getmtime(os.path.join(self.entry_dir(name), entry_file))))
+        return found
+
+    # Remove the entries used longest ago until the cache holds at most
+    # max_bytes, and return the fingerprints removed. keep is spared, so the
+    # entries a run just used survive its own eviction.
+    def evict(self, max_bytes, keep=()):
+        entries = sorted(self.entries(), key=lambda found: found[2])
+        total = sum(entry["bytes"] for _, entry, _ in entries)
+        removed = []
+        for fingerprint, entry, _ in entries:
+            if total <= max_bytes:
+                break
+            if fingerprint in keep:
+                continue
+            shutil.rmtree(self.entry_dir(fingerprint), ignore_errors=True)
+            total -= entry["bytes"]
+            removed.append(fingerprint)
+        return removed
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+        if os.path.exists(os.path.join(self.directory, stats_file)):
+            os.remove(os.path.join(self.directory, stats_file))
+
+    # add this run's hits and misses to the totals kept in stats.json
+    def record_run(self):
+        totals = self.totals()
+        totals = {"hits": totals["hits"] + self.hits, "misses": totals["misses"] + self.misses,
+                  "seconds_saved": totals["seconds_saved"] + self.seconds_saved}
+        path = os.path.join(self.directory, stats_file)
+        temporary = f"{path}.{uuid.uuid4().hex}"
+        with open(temporary, 'w') as json_file:
+            json.dump(totals, json_file, indent=2)
+        os.replace(temporary, path)
+
+    def totals(self):
+        try:
+            with open(os.path.join(self.directory, stats_file)) as json_file:
+                return json.load(json_file)
+        except (OSError, ValueError):
+            return {"hits": 0, "misses": 0, "seconds_saved": 0.0}
+
+    def stats(self):
+        entries = self.entries()
+        return dict(self.totals(), directory=self.directory, entries=len(entries),
+                    bytes=sum(entry["bytes"] for _, entry, _ in entries),
+                    jobs={job: sum(1 for _, entry, _ in entries if entry["job"] == job)
+                          for job in sorted({entry["job"] for _, entry, _ in entries})})
+
+
+def print_stats(stats):
+    lookups = stats["hits"] + stats["misses"]
+    print(f"{stats['directory']}: {stats['entries']} entries, {format_size(stats['bytes'])}")
+    print(f"  {stats['hits']} hits and {stats['misses']} misses"
+          + (f" ({stats['hits'] / lookups:.0%} hit rate)" if lookups else "")
+          + f", {stats['seconds_saved']:.1f}s of generation saved")
+    for job, count in stats["jobs"].items():
+        print(f"  {job}: {count} entries")
+
+
+def add_arguments(parser):
+    parser.add_argument("--cache-dir", default=default_cache_dir)
+    actions = parser.add_subparsers(dest="action", required=True)
+    actions.add_parser("stats", help="show the entries, size and hit rate")
+    evict = actions.add_parser("evict", help="remove the least recently used entries down to a size")
+    evict.add_argument("--max-size", required=True, help="e.g. 500M or 2G")
+    actions.add_parser("clear", help="remove every entry and the statistics")
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    cache = BuildCache(args.cache_dir)
+    if args.action == "evict":
+        removed = cache.evict(parse_size(args.max_size))
+        print(f"Evicted {len(removed)} entries")
+    elif args.action == "clear":
+        cache.clear()
+        print(f"Cleared {args.cache_dir}")
+    print_stats(cache.stats())
@@ -0,0 +1,198 @@
+import argparse
+import hashlib
+import json
+import random
+import sys
+
+import numpy as np
+
+from . import (create_allergens, create_ingredients, create_inventory, create_menu_item_allergens, create_menu_items,
+               create_promos)
+from .create_order_items import combo_price_columns, combo_quantities, size_price_columns
+from .create_orders import load_menu
+from .pg import run_psql
+
+# Compiles the menu, its allergens and its ingredients into one catalog that
+# the API can keep in memory instead of joining menu_items, ingredients and
+# allergens on every request. The sources are the ones the generators write
+# the tables from (menu_items.txt, inventory_items.txt and the lists in
+# create_allergens, create_menu_item_allergens and create_ingredients):
+#
+#   allergens        allergen names; allergen i is bit i of a mask
+#   menu_items       id, name and type of every item, and the mask of its
+#                    allergens
+#   inventory_items  id and name of every inventory item
+#   bom              menu items x inventory items: the servings of each
+#                    inventory item one serving of a menu item uses (one per
+#                    ingredients row, as create_inventory_report counts them)
+#   prices           menu items x price options: the price of one line of the
+#                    item in a size or a combo (the combo column times the
+#                    servings in the combo, as create_order_items prices it),
+#                    null where it isn't sold that way
+#   discounts        with --seed, the promo discount on a line of an item
+#
+# "No shellfish, no peanuts" is then one AND per item, and the inventory a set
+# of sales uses is one vector-matrix product:
+#
+#   python -m py_scripts.catalog --output catalog.json
+#   python -m py_scripts.catalog --avoid shellfish peanuts
+#   python -m py_scripts.catalog --verify pos
+#
+# Without --output, --avoid or --verify the catalog goes to stdout. version
+# is a hash of the rest, so a cache can tell when it changed.
+
+# the price options, in the order of the price columns
+price_options = list(size_price_columns) + list(combo_price_columns)
+
+
+def inventory_items(inventory_file=create_inventory.input_file):
+    # the random levels aren't part of the catalog
+    return [(inventory_id, name)
+            for inventory_id, name, *_ in create_inventory.generate_inventory(inventory_file, random.Random(0))]
+
+
+# the price of one line of item (a menu_items row as a dict) per option
+def item_prices(item):
+    prices = [item[column] if item[column] > 0 else None for column in size_price_columns.values()]
+    # combos are built around an entree (see create_order_items)
+    for combo, column in combo_price_columns.items():
+        sold = item["menu_item_type"] == "entree" and item[column] > 0
+        prices.append(round(item[column] * combo_quantities[combo], 2) if sold else None)
+    return prices
+
+
+def compile_catalog(menu_file=create_menu_items.input_file, inventory_file=create_inventory.input_file, seed=None):
+    menu = load_menu(menu_file)
+    inventory = inventory_items(inventory_file)
+    allergen_bits = {allergen_id: bit for bit, (allergen_id, _) in enumerate(create_allergens.allergen_data)}
+    masks = {}
+    for _, allergen_id, menu_item_id in create_menu_item_allergens.item_allergen_data:
+        masks[menu_item_id] = masks.get(menu_item_id, 0) | 1 << allergen_bits[allergen_id]
+
+    rows = {item["menu_item_id"]: row for row, item in enumerate(menu)}
+    columns = {inventory_id: column for column, (inventory_id, _) in enumerate(inventory)}
+    bom = np.zeros((len(menu), len(inventory)), dtype=np.int64)
+    for _, inventory_id, menu_item_id in create_ingredients.ingredient_data:
+        bom[rows[menu_item_id], columns[inventory_id]] += 1
+
+    catalog = {
+        "allergens": [name for _, name in create_allergens.allergen_data],
+        "menu_items": [{"id": item["menu_item_id"], "name": item["menu_item_name"], "type": item["menu_item_type"],
+                        "allergens": masks.get(item["menu_item_id"], 0)} for item in menu],
+        "inventory_items": [{"id": inventory_id, "name": name} for inventory_id, name in inventory],
+        "bom": bom.tolist(),
+        "price_options": price_options,
+        "prices": [item_prices(item) for item in menu],
+    }
+    if seed is not None:
+        catalog["discounts"] = {str(item): discount for item, discount in
+                                sorted(create_promos.promo_discounts(seed).items())}
+    catalog["version"] = hashlib.sha256(json.dumps(catalog, sort_keys=True).encode()).hexdigest()[:16]
+    return catalog
+
+
+# an allergen's name without what follows it in brackets, in lowercase:
+# "sesame (sesame oil)" is asked for as sesame
+def allergen_key(name):
+    return name.split("(")[0].strip().lower()
+
+
+def allergen_mask(catalog, names):
+    keys = [allergen_key(name) for name in catalog["allergens"]]
+    unknown = {name for name in names if allergen_key(name) not in keys}
+    if unknown:
+        raise ValueError(f"unknown allergens: {', '.join(sorted(unknown))} (known: {', '.join(keys)})")
+    return sum(1 << keys.index(key) for key in {allergen_key(name) for name in names})
+
+
+# the menu items with none of the allergens named
+def items_without(catalog, names):
+    mask = allergen_mask(catalog, names)
+    return [item for item in catalog["menu_items"] if not item["allergens"] & mask]
+
+
+def item_allergens(catalog, item):
+    return [name for bit, name in enumerate(catalog["allergens"]) if item["allergens"] >> bit & 1]
+
+
+# The inventory servings used by the servings sold ({menu_item_id: servings}),
+# as {inventory_id: servings}
+def inventory_usage(catalog, sold):
+    row_of = {item["id"]: row for row, item in enumerate(catalog["menu_items"])}
+    servings = np.zeros(len(catalog["menu_items"]), dtype=np.int64)
+    for menu_item_id, count in sold.items():
+        servings[row_of[menu_item_id]] += count
+    used = servings @ np.asarray(catalog["bom"], dtype=np.int64)
+    return {item["id"]: int(count) for item, count in zip(catalog["inventory_items"], used) if count}
+
+
+# The menu items available with the given stock ({inventory_id: quantity}):
+# the ones none of whose ingredients is out, as getMenuItemAvailability
+# decides in db.js
+def available_items(catalog, quantities):
+    out = np.array([quantities.get(item["id"], 0) == 0 for item in catalog["inventory_items"]])
+    blocked = (np.asarray(catalog["bom"]) > 0) @ out
+    return [item for item, is_blocked in zip(catalog["menu_items"], blocked) if not is_blocked]
+
+
+def query_rows(sql, database):
+    return [line.split("\t") for line in run_psql(["-A", "-t", "-F", "\t", "-c", sql], database).stdout.splitlines()]
+
+
+# The parts of the catalog that differ from a database's tables
+def verify(catalog, database):
+    mismatched = []
+    allergen_names = query_rows("SELECT mi.menu_item_id, a.allergen_name FROM menu_items mi "
+                                "JOIN menu_item_allergens mia ON mi.menu_item_id = mia.menu_item_id "
+                                "JOIN allergens a ON mia.allergen_id = a.allergen_id", database)
+    expected = {(str(item["id"]), name) for item in catalog["menu_items"] for name in item_allergens(catalog, item)}
+    if set(map(tuple, allergen_names)) != expected:
+        mismatched.append("allergens")
+    ingredients = query_rows("SELECT menu_item_id, inventory_item_id, COUNT(*) FROM ingredients GROUP BY 1, 2",
+                             database)
+    bom = {(str(item["id"]), str(inventory["id"]), str(count))
+           for item, row in zip(catalog["menu_items"], catalog["bom"])
+           for inventory, count in zip(catalog["inventory_items"], row) if count}
+    if set(map(tuple, ingredients)) != bom:
+        mismatched.append("bom")
+    columns = list(size_price_columns.values()) + list(combo_price_columns.values())
+    prices = {int(row[0]): item_prices(dict(zip(columns, map(float, row[2:])), menu_item_type=row[1]))
+              for row in query_rows(f"SELECT menu_item_id, menu_item_type, {', '.join(columns)} FROM menu_items",
+                                    database)}
+    if prices != {item["id"]: row for item, row in zip(catalog["menu_items"], catalog["prices"])}:
+        mismatched.append("prices")
+    return mismatched
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the menu, allergens and ingredients into a JSON catalog.")
+    parser.add_argument("--output", help="write the catalog to this file (default: stdout, unless --avoid or "
+                                         "--verify is given)")
+    parser.add_argument("--menu", default=create_menu_items.input_file)
+    parser.add_argument("--inventory", default=create_inventory.input_file)
+    parser.add_argument("--seed", help="include the promo discounts create_promos draws for this seed")
+    parser.add_argument("--avoid", nargs="+", metavar="ALLERGEN", help="list the menu items without these allergens")
+    parser.add_argument("--verify", metavar="DATABASE", help="check the catalog against a loaded database")
+    args = parser.parse_args()
+
+    catalog = compile_catalog(args.menu, args.inventory, args.seed)
+    if args.output:
+        with open(args.output, 'w') as json_file:
+            json.dump(catalog, json_file, separators=(",", ":"))
+        print(f"Wrote {args.output}: {len(catalog['menu_items'])} menu items, {len(catalog['allergens'])} allergens, "
+              f"{len(catalog['inventory_items'])} inventory items (version {catalog['version']})")
+    elif not args.avoid and not args.verify:
+        json.dump(catalog, sys.stdout, separators=(",", ":"))
+        print()
+
+    if args.avoid:
+        try:
+            for item in items_without(catalog, args.avoid):
+                print(f"  {item['name']}")
+        except ValueError as error:
+            raise SystemExit(str(error))
+    if args.verify:
+        mismatched = verify(catalog, args.verify)
+        print(f"Differs from the database: {', '.join(mismatched)}" if mismatched else "Matches the database")
+        if mismatched:
+            raise SystemExit(1)
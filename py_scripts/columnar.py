@@ -0,0 +1,156 @@
+import json
+import os
+import time
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError("the columnar format needs numpy: pip install numpy") from error
+
+from . import metrics
+from .orders_numpy import Categorical
+
+# A columnar copy of the order tables, for reading without Postgres (see
+# columnar_reports.py). Every table is a directory with one file of raw
+# little-endian fixed-width values per column, which can be memory-mapped as
+# is, and a schema.json with the row count and the type of every column:
+#
+#   int32, int64  as is
+#   bool          one byte per value
+#   date          int32, days since 1970-01-01
+#   time          int32, seconds since midnight
+#   money         int64, in cents, so sums come out exact like NUMERIC ones
+#   dict          uint8 codes into the labels listed in schema.json
+#
+# Columns are appended a batch at a time, so writing holds at most one batch
+# in memory.
+
+schemas = {
+    "orders": [("order_id", "int64"), ("employee_id", "int32"), ("order_date", "date"), ("order_time", "time"),
+               ("order_price", "money"), ("order_status", "dict")],
+    "order_items": [("order_item_id", "int64"), ("order_id", "int64"), ("menu_item_id", "int32"),
+                    ("combo", "bool"), ("combo_type", "dict"), ("item_size", "dict"),
+                    ("recorded_quantity", "int32")],
+    "sales_report": [("sales_report_id", "int64"), ("order_id", "int64"), ("revenue", "money"),
+                     ("sales_report_date", "date")],
+}
+
+dtypes = {"int32": "<i4", "int64": "<i8", "bool": "|b1", "date": "<i4", "time": "<i4", "money": "<i8",
+          "dict": "|u1"}
+
+
+def column_file(directory, name):
+    return os.path.join(directory, f"{name}.bin")
+
+
+# Has the same write methods as the SQL writers, so either order engine can
+# write to it: rows from the python engine, whole arrays from the numpy one.
+class ColumnarWriter:
+    def __init__(self, directory, table, batch_size):
+        self.directory = directory
+        self.table = table
+        self.columns = schemas[table]
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self.started = time.perf_counter()
+        self.labels = {name: [] for name, kind in self.columns if kind == "dict"}
+        self._codes = {name: {} for name in self.labels}
+        self._batch = []
+        os.makedirs(directory, exist_ok=True)
+        self._files = [open(column_file(directory, name), 'wb') for name, _ in self.columns]
+
+    def write(self, row):
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        if self._batch:
+            batch, self._batch = self._batch, []
+            self.write_arrays(list(zip(*batch)))
+
+    # write one array (or Categorical, or list of values) per column
+    def write_arrays(self, columns):
+        self.flush()
+        for (name, kind), column, column_file in zip(self.columns, columns, self._files):
+            column_file.write(np.ascontiguousarray(self.to_array(name, kind, column), dtypes[kind]).tobytes())
+        self.rows_written += len(columns[0])
+
+    def to_array(self, name, kind, values):
+        if isinstance(values, Categorical):
+            return self.to_array(name, kind, list(values.labels))[values.codes]
+        if kind == "date":
+            return np.array(values, dtype="datetime64[D]").astype(np.int32)
+        if kind == "time":
+            return np.array([int(h) * 3600 + int(m) * 60 + int(s) for h, m, s in (str(v).split(":") for v in values)],
+                            dtype=np.int32)
+        if kind == "money":
+            return np.rint(np.asarray(values, dtype=float) * 100).astype(np.int64)
+        if kind == "dict":
+            return np.array([self.code(name, value) for value in values], dtype=np.uint8)
+        return np.asarray(values)
+
+    def code(self, name, label):
+        codes = self._codes[name]
+        if label not in codes:
+            if len(codes) == 256:
+                raise ValueError(f"{self.table}.{name} has more than 256 distinct values")
+            codes[label] = len(codes)
+            self.labels[name].append(label)
+        return codes[label]
+
+    def close(self):
+        self.flush()
+        for column_file in self._files:
+            column_file.close()
+        schema = {"table": self.table, "rows": self.rows_written,
+                  "columns": [dict({"name": name, "type": kind, "dtype": dtypes[kind]},
+                                   **({"labels": self.labels[name]} if kind == "dict" else {}))
+                              for name, kind in self.columns]}
+        with open(os.path.join(self.directory, "schema.json"), 'w') as schema_file:
+            json.dump(schema, schema_file, indent=2)
+        metrics.record_table(self.table, self, [open_file.name for open_file in self._files])
+
+
+# A table written by ColumnarWriter, with every column memory-mapped
+class ColumnarTable:
+    def __init__(self, directory):
+        with open(os.path.join(directory, "schema.json")) as schema_file:
+            self.schema = json.load(schema_file)
+        self.rows = self.schema["rows"]
+        self.types = {column["name"]: column["type"] for column in self.schema["columns"]}
+        self.labels = {column["name"]: column["labels"] for column in self.schema["columns"] if "labels" in column}
+        self.columns = {column["name"]: np.memmap(column_file(directory, column["name"]), dtype=column["dtype"],
+                                                  mode='r', shape=(self.rows,)) if self.rows
+                        else np.empty(0, dtype=column["dtype"])
+                        for column in self.schema["columns"]}
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    # the code of a dict column's label, or None if it never occurs
+    def code(self, name, label):
+        labels = self.labels[name]
+        return labels.index(label) if label in labels else None
+
+
+def table_dir(output_dir, table):
+    return os.path.join(output_dir, table)
+
+
+# open a writer for every order table in output_dir and register it with stack
+def open_columnar_tables(stack, output_dir, batch_size):
+    writers = []
+    for table in schemas:
+        writer = ColumnarWriter(table_dir(output_dir, table), table, batch_size)
+        stack.callback(writer.close)
+        writers.append(writer)
+    return writers
+
+
+def read_table(output_dir, table):
+    return ColumnarTable(table_dir(output_dir, table))
@@ -0,0 +1,188 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+import argparse
+import json
+import time
+
+import numpy as np
+
+from . import create_ingredients, create_inventory, create_menu_items, create_orders, db_queries
+from .columnar import read_table
+from .pg import run_psql
+
+# getSalesReport, getProductUsage and getHourlySales from db.js, computed from
+# the columnar files create_orders writes with --format columnar instead of
+# from Postgres. The columns are memory-mapped and aggregated a chunk at a
+# time with bincount, so tables far bigger than memory work. Menu items,
+# ingredients and inventory names come from the same files the generators
+# use. Every report returns the same rows as its SQL version (sorted, since
+# the SQL only orders them partly), and --verify checks that against a
+# database loaded with the same data:
+#
+#   python -m py_scripts.create_orders --seed 1 --engine numpy --format columnar --output-dir columnar
+#   python -m py_scripts.columnar_reports columnar --start 2024-01-01 --end 2024-03-31
+
+# rows per chunk when scanning a column
+chunk_rows = 1 << 22
+
+# the order menu item types are listed in by getSalesReport
+type_order = ["entree", "side", "appetizer", "drink", "dessert"]
+
+
+def day_number(day):
+    return (date.fromisoformat(day) - date(1970, 1, 1)).days
+
+
+def chunks(rows):
+    for start in range(0, rows, chunk_rows):
+        yield slice(start, min(start + chunk_rows, rows))
+
+
+def money(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+# one flag per order: completed and dated from start to end (ISO dates)
+def selected_orders(orders, start, end):
+    completed = orders.code("order_status", "Completed")
+    selected = np.zeros(orders.rows, dtype=bool)
+    if completed is None:
+        return selected
+    first, last = day_number(start), day_number(end)
+    for part in chunks(orders.rows):
+        order_date = orders["order_date"][part]
+        selected[part] = (order_date >= first) & (order_date <= last) & (orders["order_status"][part] == completed)
+    return selected
+
+
+# For every order item in part, the row of its order, and whether it has one.
+# The generators hand out order ids in sequence, so that is just an offset;
+# otherwise the ids are looked up, which needs them sorted.
+def order_rows(orders, order_ids):
+    ids = orders["order_id"]
+    if not orders.rows:
+        return np.zeros(len(order_ids), dtype=np.int64), np.zeros(len(order_ids), dtype=bool)
+    if int(ids[-1]) - int(ids[0]) + 1 == orders.rows:
+        rows = order_ids - int(ids[0])
+        return np.clip(rows, 0, orders.rows - 1), (rows >= 0) & (rows < orders.rows)
+    rows = np.clip(np.searchsorted(ids, order_ids), 0, orders.rows - 1)
+    return rows, ids[rows] == order_ids
+
+
+# order item lines (or with quantity, servings) of the selected orders per
+# menu item id
+def menu_item_totals(orders, order_items, selected, quantity=False):
+    totals = np.zeros(0, dtype=np.int64)
+    for part in chunks(order_items.rows):
+        rows, found = order_rows(orders, order_items["order_id"][part])
+        keep = found & selected[rows]
+        weights = order_items["recorded_quantity"][part][keep] if quantity else None
+        counts = np.bincount(order_items["menu_item_id"][part][keep], weights=weights).astype(np.int64)
+        if len(counts) > len(totals):
+            totals = np.pad(totals, (0, len(counts) - len(totals)))
+        totals[:len(counts)] += counts
+    return totals
+
+
+def sales_report(orders, order_items, menu, start, end):
+    counts = menu_item_totals(orders, order_items, selected_orders(orders, start, end))
+    grouped = defaultdict(int)
+    for item in menu:
+        if item["menu_item_id"] < len(counts) and counts[item["menu_item_id"]]:
+            grouped[(item["menu_item_name"], item["menu_item_type"])] += int(counts[item["menu_item_id"]])
+    rank = {menu_item_type: i for i, menu_item_type in enumerate(type_order)}
+    return sorted(((name, menu_item_type, count) for (name, menu_item_type), count in grouped.items()),
+                  key=lambda row: (rank.get(row[1], len(type_order)), row[0], row[1]))
+
+
+def product_usage(orders, order_items, inventory_names, start, end):
+    servings = menu_item_totals(orders, order_items, selected_orders(orders, start, end), quantity=True)
+    used = defaultdict(int)
+    for _, inventory_item_id, menu_item_id in create_ingredients.ingredient_data:
+        if inventory_item_id in inventory_names and menu_item_id < len(servings) and servings[menu_item_id]:
+            used[inventory_names[inventory_item_id]] += int(servings[menu_item_id])
+    return sorted(used.items())
+
+
+def hourly_sales(orders, day):
+    selected = selected_orders(orders, day, day)
+    sales = np.zeros(24, dtype=np.int64)
+    counts = np.zeros(24, dtype=np.int64)
+    for part in chunks(orders.rows):
+        keep = selected[part]
+        hour = orders["order_time"][part][keep] // 3600
+        sales += np.bincount(hour, weights=orders["order_price"][part][keep], minlength=24).astype(np.int64)
+        counts += np.bincount(hour, minlength=24)
+    return [(hour, money(sales[hour])) for hour in range(24) if counts[hour]]
+
+
+def run_reports(columnar_dir, start, end, day, menu_file=create_menu_items.input_file,
+                inventory_file=create_inventory.input_file):
+    orders = read_table(columnar_dir, "orders")
+    order_items = read_table(columnar_dir, "order_items")
+    menu = create_orders.load_menu(menu_file)
+    inventory_names = {row[0]: row[1] for row in create_inventory.generate_inventory(inventory_file)}
+    return {
+        "getSalesReport": ([start, end], sales_report(orders, order_items, menu, start, end)),
+        "getProductUsage": ([start, end], product_usage(orders, order_items, inventory_names, start, end)),
+        "getHourlySales": ([day], hourly_sales(orders, day)),
+    }
+
+
+# compare values as numbers where they are numbers, so 12.50 and 12.5 agree
+def normalize(values):
+    normalized = []
+    for value in values:
+        try:
+            normalized.append(Decimal(str(value)))
+        except ArithmeticError:
+            normalized.append(str(value))
+    return tuple(normalized)
+
+
+# the names of the reports whose rows differ from the db.js queries
+def verify(results, database):
+    source = db_queries.read_db_js()
+    mismatched = []
+    for report, (params, rows) in results.items():
+        sql = db_queries.bind(db_queries.function_query(report, source), params)
+        output = run_psql(["-A", "-t", "-F", "\t", "-c", sql], database).stdout.splitlines()
+        if sorted(normalize(line.split("\t")) for line in output) != sorted(normalize(row) for row in rows):
+            mismatched.append(report)
+    return mismatched
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the manager reports over columnar order files.")
+    parser.add_argument("columnar_dir", help="the --output-dir of create_orders --format columnar")
+    parser.add_argument("--start", default=create_orders.start_date.strftime('%Y-%m-%d'))
+    parser.add_argument("--end", default="9999-12-31")
+    parser.add_argument("--day", help="the day of the hourly sales (default: --start)")
+    parser.add_argument("--menu", default=create_menu_items.input_file)
+    parser.add_argument("--json", help="write the report rows to this file")
+    parser.add_argument("--verify", metavar="DATABASE", help="check the rows against the db.js queries")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = run_reports(args.columnar_dir, args.start, args.end, args.day or args.start, args.menu)
+    elapsed = time.perf_counter() - started
+    order_items_rows = read_table(args.columnar_dir, "order_items").rows
+
+    for report, (params, rows) in results.items():
+        print(f"{report} {' '.join(params)}")
+        for row in rows:
+            print("  " + "\t".join(str(value) for value in row))
+    print(f"Ran the reports over {order_items_rows} order items in {elapsed:.2f}s")
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({report: {"params": params, "rows": [[str(value) if isinstance(value, Decimal) else value
+                                                           for value in row] for row in rows]}
+                       for report, (params, rows) in results.items()}, json_file, indent=2)
+    if args.verify:
+        mismatched = verify(results, args.verify)
+        print(f"Differs from the db.js reports: {', '.join(mismatched)}" if mismatched
+              else "Matches the db.js reports")
+        if mismatched:
+            raise SystemExit(1)
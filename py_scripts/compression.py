@@ -0,0 +1,151 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import io
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compressed output for the generators. With compression on, every table
+# file (and CSV file) is written through a CompressedFile instead of a plain
+# file, to the same path plus .gz or .zst. The text is cut into blocks of
+# block_size characters, every block is compressed by itself on a thread
+# pool (zlib and zstd let go of the GIL while they work), and the blocks are
+# written out in order as separate gzip members or zstd frames. gzip and
+# zstd both read such a file as one stream, and since the blocks don't
+# depend on the number of threads, neither does the output.
+#
+# The SQL files still include each other (\ir) and their CSV files (\copy)
+# by their uncompressed names, which psql can't read compressed. Load them
+# with python -m py_scripts load, which streams them into psql (see load.py).
+#
+# zstd needs the zstandard package (pip install zstandard); gzip needs
+# nothing.
+
+COMPRESSIONS = ["gzip", "zstd"]
+
+suffixes = {"gzip": ".gz", "zstd": ".zst"}
+
+default_levels = {"gzip": 6, "zstd": 3}
+
+# characters per compressed block
+block_size = 1 << 22
+
+# The compression the generators of this process write with, set by
+# configure: the command sets it, and so does every worker process, from the
+# options the command hands it
+settings = {"kind": None, "level": None, "threads": os.cpu_count()}
+
+
+def configure(kind=None, level=None, threads=None):
+    if kind == "zstd" and zstandard is None:
+        raise ImportError("zstd compression needs the zstandard package: pip install zstandard")
+    settings.update(kind=kind, level=level if level is not None else default_levels.get(kind),
+                    threads=threads or os.cpu_count())
+
+
+def compress_block(kind, level, data):
+    if kind == "gzip":
+        # no timestamp, so the same rows always give the same file
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    # a compressor per block, since one can't be shared between threads
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# A write-only text file that compresses what is written to it
+class CompressedFile:
+    def __init__(self, path, kind, level, threads):
+        self.path = path
+        self.kind = kind
+        self.level = level
+        self.threads = threads
+        self._file = open(path, 'wb')
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+        self._pending = deque()
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= block_size:
+            self._submit()
+        return len(text)
+
+    def _submit(self):
+        data = "".join(self._buffer).encode()
+        self._buffer, self._buffered = [], 0
+        self._pending.append(self._pool.submit(compress_block, self.kind, self.level, data))
+        # write out finished blocks, keeping at most two blocks per thread in
+        # memory
+        while self._pending and (len(self._pending) > 2 * self.threads or self._pending[0].done()):
+            self._file.write(self._pending.popleft().result())
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self._buffer:
+            self._submit()
+        while self._pending:
+            self._file.write(self._pending.popleft().result())
+        self._pool.shutdown()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# The path a file written to path really has: path itself, or path.gz or
+# path.zst if it was written compressed. None if there is no such file.
+def find_file(path):
+    for candidate in [path] + [path + suffix for suffix in suffixes.values()]:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+# Open a file for writing text, compressed as configured. Any other version
+# of it (path, path.gz, path.zst) is removed, so a reader never finds a stale
+# one next to it.
+def open_output(path, newline=None):
+    kind = settings["kind"]
+    actual = path + suffixes[kind] if kind else path
+    for candidate in [path] + [path + suffix for suffix in suffixes.values()]:
+        if candidate != actual and os.path.exists(candidate):
+            os.remove(candidate)
+    if not kind:
+        return open(path, 'w', newline=newline)
+    return CompressedFile(actual, kind, settings["level"], settings["threads"])
+
+
+# Open a file written by open_output for reading text, decompressing as it
+# goes. path is the uncompressed name. Line endings are read as \n, so CSV
+# rows (written with \r\n) can be sent inline after a COPY.
+def open_input(path):
+    actual = find_file(path)
+    if actual is None:
+        raise FileNotFoundError(path)
+    if actual.endswith(suffixes["gzip"]):
+        return gzip.open(actual, 'rt')
+    if actual.endswith(suffixes["zstd"]):
+        if zstandard is None:
+            raise ImportError(f"{actual} needs the zstandard package: pip install zstandard")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(actual, 'rb'), read_across_frames=True,
+                                                            closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(actual)
+
+
+# the command line options shared by the commands that write tables
+def add_compression_arguments(parser):
+    parser.add_argument("--compress", choices=COMPRESSIONS,
+                        help="compress the table files (zstd needs the zstandard package)")
+    parser.add_argument("--compress-level", type=int, help="default: 6 for gzip, 3 for zstd")
+    parser.add_argument("--compress-threads", type=int, default=os.cpu_count(),
+                        help="threads compressing blocks, per process writing files")
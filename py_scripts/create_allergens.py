@@ -1,31 +1,44 @@
-output_file = r"C:\Users\amsantia\Desktop\331\Panda POS\allergens.sql"
-
-
-with open(output_file, 'w') as sql_file:
-    # Create inventory table in SQL
-    sql_file.write("CREATE TABLE allergens (\n")
-    sql_file.write("    allergen_id INT PRIMARY KEY,\n")
-    sql_file.write("    allergen_name VARCHAR(100)\n")
-    sql_file.write(");\n\n")
-
-    sql_file.write("INSERT INTO allergens (allergen_id, allergen_name) VALUES \n")
-
-    allergen_data = [
-        (1, 'wheat'),
-        (2, 'soy'),
-        (3, 'treenuts'),
-        (4, 'fish'),
-        (5, 'peanuts'),
-        (6, 'shellfish'),
-        (7, 'eggs'),
-        (8, 'milk'),
-        (9, 'sesame (sesame oil)'),
-        ]
-
-
-    # create the insert statement for each item
-    sql_insert_data = ",\n".join([f"({allergen_id}, '{allergen_name}')" for allergen_id, allergen_name in allergen_data])
-    sql_file.write(sql_insert_data)
-    sql_file.write(";\n")
-
-print("SQL file created and written successfully.")
\ No newline at end of file
+import argparse
+
+from .metrics import instrument
+from .paths import sql_file
+from .writers import DEFAULT_BATCH_SIZE, DEFAULT_FORMAT, add_output_arguments, open_table, report_throughput
+
+output_file = sql_file("allergens")
+
+create_table = (
+    "CREATE TABLE allergens (\n"
+    "    allergen_id INT PRIMARY KEY,\n"
+    "    allergen_name VARCHAR(100)\n"
+    ");\n\n"
+)
+columns = ["allergen_id", "allergen_name"]
+
+allergen_data = [
+    (1, 'wheat'),
+    (2, 'soy'),
+    (3, 'treenuts'),
+    (4, 'fish'),
+    (5, 'peanuts'),
+    (6, 'shellfish'),
+    (7, 'eggs'),
+    (8, 'milk'),
+    (9, 'sesame (sesame oil)'),
+]
+
+
+def write_allergens(output_file, fmt=DEFAULT_FORMAT, batch_size=DEFAULT_BATCH_SIZE):
+    with open_table(output_file, "allergens", columns, create_table, fmt, batch_size) as writer:
+        writer.write_rows(allergen_data)
+    report_throughput("allergens", writer.rows_written, writer.started)
+    return writer.rows_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the allergens table.")
+    add_output_arguments(parser, output_file)
+    args = parser.parse_args()
+
+    with instrument(args, "allergens"):
+        write_allergens(args.output, args.format, args.batch_size)
+    print("SQL file created and written successfully.")
@@ -1,34 +1,180 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
+import random
+import re
+import time
+
 from faker import Faker
+
+from .compression import configure, open_output, settings
+from . import metrics
+from .metrics import instrument
+from .paths import sql_file
+from .writers import DEFAULT_BATCH_SIZE, DEFAULT_FORMAT, add_output_arguments, open_table, report_throughput, table_ddl
+
 fake = Faker()
 
-output_file = r"/home/janelandrum/csce331/p3_database/sql_files/customers.sql"
-
-with open(output_file, "w") as sql_file:
-    sql_file.write("CREATE TABLE customers (\n")
-    sql_file.write("    customer_id INT PRIMARY KEY,\n") 
-    sql_file.write("    name VARCHAR(100),\n")
-    sql_file.write("    email VARCHAR(100),\n")
-    sql_file.write("    phone_number VARCHAR(100),\n")
-    sql_file.write("    points INT\n")
-    sql_file.write(");\n\n")
-    
-    sql_file.write("INSERT INTO customers (customer_id, name, email, phone_number, points) VALUES \n")
-    
-    for i in range(1, 300):
-        customer_id = i
-        name = fake.name()
-        first_name, last_name = name.split(" ")[0], name.split(" ")[-1]
-        email = f"{first_name.lower()}{last_name.lower()}@example.com"
-        phone_number = fake.numerify("###-###-####")
-        points = fake.random_int(min=0, max=100)
-
-        name = name.replace("'", "''")
-        
-        sql_file.write(f"    ({customer_id}, '{name}', '{email}', '{phone_number}', {points})")
-        
-        if i < 299:
-            sql_file.write(",\n")
-        else:
-            sql_file.write(";\n")
-    
-print("SQL file created and written successfully.")
+output_file = sql_file("customers")
+
+create_table = (
+    "CREATE TABLE customers (\n"
+    "    customer_id INT PRIMARY KEY,\n"
+    "    name VARCHAR(100),\n"
+    "    email VARCHAR(100),\n"
+    "    phone_number VARCHAR(100),\n"
+    "    points INT\n"
+    ");\n\n"
+)
+columns = ["customer_id", "name", "email", "phone_number", "points"]
+
+num_customers = 299
+
+# Names are drawn from pools of first and last names that Faker fills once,
+# not with Faker calls per row. db.js looks customers up by email, so emails
+# and phone numbers have to be unique however many customers there are. They
+# are made unique by construction rather than checked: the email ends in the
+# customer id (in base 36), and the phone number is the customer id run
+# through a permutation of the phone number space.
+#
+# Customers are drawn a block of ids at a time, every block from its own
+# generator, so the rows only depend on the seed and not on how the blocks
+# are spread over worker processes.
+block_size = 10000
+
+# names drawn from Faker for each pool, before duplicates are dropped
+pool_draws = 5000
+
+# phone numbers run from 200-000-0000 to 999-999-9999
+phone_base = 2 * 10 ** 9
+phone_space = 8 * 10 ** 9
+
+
+# first and last name pools, with each name's email spelling
+def name_pools():
+    pools = []
+    for draw in (fake.first_name, fake.last_name):
+        names = list(dict.fromkeys(draw() for _ in range(pool_draws)))
+        pools.append([(name, re.sub(r"[^a-z]", "", name.lower())) for name in names])
+    return pools
+
+
+# A keyed permutation of the phone number space: a small Feistel network over
+# 34-bit numbers, repeated until the result falls inside the space ("cycle
+# walking"). Every round is reversible, so no two ids get the same number,
+# and unlike a plain affine map neighbouring ids get unrelated numbers.
+phone_half_bits = 17
+phone_rounds = 4
+
+
+def phone_permutation(rng):
+    return [rng.getrandbits(phone_half_bits) | 1 for _ in range(phone_rounds)]
+
+
+def phone_number(customer_id, keys):
+    mask = (1 << phone_half_bits) - 1
+    number = customer_id - 1
+    while True:
+        left, right = number >> phone_half_bits, number & mask
+        for key in keys:
+            left, right = right, left ^ (((right * key) ^ (right >> 5) ^ key) & mask)
+        number = (left << phone_half_bits) | right
+        if number < phone_space:
+            break
+    number += phone_base
+    return f"{number // 10 ** 7}-{number // 10 ** 4 % 1000:03d}-{number % 10 ** 4:04d}"
+
+
+def base36(number):
+    digits = ""
+    while True:
+        number, digit = divmod(number, 36)
+        digits = "0123456789abcdefghijklmnopqrstuvwxyz"[digit] + digits
+        if not number:
+            return digits
+
+
+# the customers of the blocks first_block up to last_block (exclusive), out
+# of num_customers. key seeds the blocks and the phone permutation.
+def generate_customers(num_customers, first_block, last_block, pools, key):
+    first_names, last_names = pools
+    permutation = phone_permutation(random.Random(f"{key}:phone"))
+    for block in range(first_block, last_block):
+        rng = random.Random(f"{key}:{block}")
+        first_id = block * block_size + 1
+        count = min(block_size, num_customers - first_id + 1)
+        firsts = rng.choices(first_names, k=count)
+        lasts = rng.choices(last_names, k=count)
+        points = rng.choices(range(101), k=count)
+        for i in range(count):
+            customer_id = first_id + i
+            (first, first_email), (last, last_email) = firsts[i], lasts[i]
+            yield (customer_id, f"{first} {last}", f"{first_email}.{last_email}.{base36(customer_id)}@example.com",
+                   phone_number(customer_id, permutation), points[i])
+
+
+def part_file(output_file, part):
+    root, extension = os.path.splitext(output_file)
+    return f"{root}.{part:04d}{extension}"
+
+
+# Runs in a worker process: write the customers of some blocks, without the
+# CREATE TABLE, to their own file (compressed like the parent's files) and
+# return the part's metrics record
+def write_part(output_file, fmt, batch_size, num_customers, first_block, last_block, pools, key, compression):
+    configure(**compression)
+    with open_table(output_file, "customers", columns, "", fmt, batch_size) as writer:
+        writer.write_rows(generate_customers(num_customers, first_block, last_block, pools, key))
+    return metrics.tables[-1]
+
+
+# With more than one worker, the blocks are split into one part file per
+# worker (customers.0000.sql and so on), and output_file creates the table and
+# includes the parts. The pools and the key come from fake and the random
+# module, which the seed command seeds per table.
+def write_customers(output_file, fmt=DEFAULT_FORMAT, batch_size=DEFAULT_BATCH_SIZE, num_customers=num_customers,
+                    workers=1):
+    pools = name_pools()
+    key = random.getrandbits(64)
+    num_blocks = -(-num_customers // block_size)
+    if workers <= 1 or num_blocks <= 1:
+        with open_table(output_file, "customers", columns, create_table, fmt, batch_size) as writer:
+            writer.write_rows(generate_customers(num_customers, 0, num_blocks, pools, key))
+        report_throughput("customers", writer.rows_written, writer.started)
+        return writer.rows_written
+
+    bounds = [num_blocks * part // workers for part in range(workers + 1)]
+    started = time.perf_counter()
+    with open_output(output_file) as table_file:
+        table_file.write(table_ddl(create_table))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(write_part, [part_file(output_file, part) for part in range(workers)],
+                                  [fmt] * workers, [batch_size] * workers, [num_customers] * workers, bounds[:-1],
+                                  bounds[1:], [pools] * workers, [key] * workers, [dict(settings)] * workers))
+        # the parts were recorded in the workers
+        metrics.tables.extend(parts)
+        rows = sum(part["rows"] for part in parts)
+        for part in range(workers):
+            table_file.write(f"\\ir {os.path.basename(part_file(output_file, part))}\n")
+    report_throughput("customers", rows, started)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the customers table.")
+    add_output_arguments(parser, output_file)
+    parser.add_argument("--count", type=int, default=num_customers, help="number of customers")
+    parser.add_argument("--workers", type=int, default=1, help="write this many part files in parallel")
+    parser.add_argument("--seed", help="the same seed gives the same customers, whatever the number of workers")
+    args = parser.parse_args()
+
+    if args.count > phone_space:
+        parser.error(f"at most {phone_space} customers have distinct phone numbers")
+    if args.seed is not None:
+        # the same seeding as the seed command, so the output matches
+        random.seed(f"{args.seed}:customers")
+        fake.seed_instance(f"{args.seed}:customers")
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with instrument(args, "customers"):
+        write_customers(args.output, args.format, args.batch_size, args.count, args.workers)
+    print("SQL file created and written successfully.")
@@ -1,36 +1,55 @@
+import argparse
+
 from faker import Faker
+
+from .metrics import instrument
+from .paths import sql_file
+from .writers import DEFAULT_BATCH_SIZE, DEFAULT_FORMAT, add_output_arguments, open_table, report_throughput
+
 fake = Faker()
 
-output_file = r"/home/janelandrum/csce331/p3_database/sql_files/employees.sql"
-
-with open(output_file, "w") as sql_file:
-    sql_file.write("CREATE TABLE employees (\n")
-    sql_file.write("    employee_id INT PRIMARY KEY,\n") 
-    sql_file.write("    name VARCHAR(100),\n")
-    sql_file.write("    email VARCHAR(100),\n")
-    sql_file.write("    phone_number VARCHAR(100),\n") 
-    sql_file.write("    job_title VARCHAR(100),\n")
-    sql_file.write("    wage FLOAT,\n")  
-    sql_file.write("    hire_date DATE\n") 
-    sql_file.write(");\n\n")
-    
-    sql_file.write("INSERT INTO employees (employee_id, name, email, phone_number, job_title, wage, hire_date) VALUES \n")
-    
-    for i in range(1, 16):
-        employee_id = i
+output_file = sql_file("employees")
+
+create_table = (
+    "CREATE TABLE employees (\n"
+    "    employee_id INT PRIMARY KEY,\n"
+    "    name VARCHAR(100),\n"
+    "    email VARCHAR(100),\n"
+    "    phone_number VARCHAR(100),\n"
+    "    job_title VARCHAR(100),\n"
+    "    wage FLOAT,\n"
+    "    hire_date DATE\n"
+    ");\n\n"
+)
+columns = ["employee_id", "name", "email", "phone_number", "job_title", "wage", "hire_date"]
+
+num_employees = 15
+
+
+def generate_employees(num_employees):
+    for employee_id in range(1, num_employees + 1):
         name = fake.name()
         first_name, last_name = name.split(" ")[0], name.split(" ")[-1]
         email = f"{first_name.lower()}{last_name.lower()}@example.com"
         phone_number = fake.numerify("###-###-####")
         job_title = 'Employee'
-        wage = round(fake.random_number(digits=5) / 100, 2) 
-        hire_date = fake.date_between(start_date="-10y", end_date="today")  
-        
-        sql_file.write(f"    ({employee_id}, '{name}', '{email}', '{phone_number}', '{job_title}', {wage}, '{hire_date}')")
-        
-        if i < 15:
-            sql_file.write(",\n")
-        else:
-            sql_file.write(";\n")
-    
-print("SQL file created and written successfully.")
+        wage = round(fake.random_number(digits=5) / 100, 2)
+        hire_date = fake.date_between(start_date="-10y", end_date="today").isoformat()
+        yield (employee_id, name, email, phone_number, job_title, wage, hire_date)
+
+
+def write_employees(output_file, fmt=DEFAULT_FORMAT, batch_size=DEFAULT_BATCH_SIZE):
+    with open_table(output_file, "employees", columns, create_table, fmt, batch_size) as writer:
+        writer.write_rows(generate_employees(num_employees))
+    report_throughput("employees", writer.rows_written, writer.started)
+    return writer.rows_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the employees table.")
+    add_output_arguments(parser, output_file)
+    args = parser.parse_args()
+
+    with instrument(args, "employees"):
+        write_employees(args.output, args.format, args.batch_size)
+    print("SQL file created and written successfully.")
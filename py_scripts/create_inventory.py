@@ -1,45 +1,70 @@
-import random
+import argparse
 import csv
+import random
+
+from .metrics import instrument
+from .paths import sql_file, txt_file
+from .writers import DEFAULT_BATCH_SIZE, DEFAULT_FORMAT, add_output_arguments, open_table, report_throughput
 
-input_file = r"/home/janelandrum/csce331/p3_database/txt_files/inventory_items.txt"
-output_file = r"/home/janelandrum/csce331/p3_database/sql_files/inventory.sql"
+input_file = txt_file("inventory_items.txt")
+output_file = sql_file("inventory")
 
-with open(output_file, 'w') as sql_file:
-    sql_file.write("CREATE TABLE inventory (\n")
-    sql_file.write("    inventory_id INT PRIMARY KEY, \n")
-    sql_file.write("    inventory_item_name VARCHAR(100), \n")
-    sql_file.write("    quantity INT, \n")
-    sql_file.write("    unit_cost_to_order FLOAT, \n")
-    sql_file.write("    fill_level INT, \n")
-    sql_file.write("    inventory_item_type VARCHAR(100), \n")
-    sql_file.write(");\n\n")
+create_table = (
+    "CREATE TABLE inventory (\n"
+    "    inventory_id INT PRIMARY KEY, \n"
+    "    inventory_item_name VARCHAR(100), \n"
+    "    quantity INT, \n"
+    "    unit_cost_to_order FLOAT, \n"
+    "    fill_level INT, \n"
+    "    inventory_item_type VARCHAR(100) \n"
+    ");\n\n"
+)
+columns = ["inventory_id", "inventory_item_name", "quantity", "unit_cost_to_order", "fill_level", "inventory_item_type"]
 
-    sql_file.write("INSERT INTO inventory (inventory_id, inventory_item_name, quantity, unit_cost_to_order, fill_level, inventory_item_type) VALUES \n")
 
+def generate_inventory(input_file, rng=random):
     with open(input_file, 'r') as items_file:
         reader = csv.reader(items_file, delimiter=' ', quotechar='"')
-        inventory_id = 1
-        rows = list(reader)
 
         # loop through each row in the input file
-        for i, row in enumerate(rows):
+        for inventory_id, row in enumerate(reader, start=1):
             item_name = row[0]
             item_type = row[1]
-            
+
             # random values for the other attributes
-            quantity = random.randint(50, 100)
-            unit_cost_to_order = round(random.uniform(150, 250), 2)
+            quantity = rng.randint(50, 100)
+            unit_cost_to_order = round(rng.uniform(150, 250), 2)
             fill_level = quantity * 2
 
-            # create the insert statement for each item
-            sql_file.write(f"    ({inventory_id}, '{item_name}', {quantity}, {unit_cost_to_order}, {fill_level}, '{item_type}')")
+            yield (inventory_id, item_name, quantity, unit_cost_to_order, fill_level, item_type)
+
+
+# (inventory_id, quantity, fill_level) of every item, as generated for the
+# given seed. The seed command seeds the inventory table with
+# f"{seed}:inventory", so the inventory report simulation starts from exactly
+# the levels that were written.
+def inventory_levels(input_file=input_file, seed=None):
+    rng = random.Random(f"{seed}:inventory") if seed is not None else random.Random()
+    return [(inventory_id, quantity, fill_level)
+            for inventory_id, _, quantity, _, fill_level, _ in generate_inventory(input_file, rng)]
+
+
+def write_inventory(output_file, input_file=input_file, fmt=DEFAULT_FORMAT, batch_size=DEFAULT_BATCH_SIZE):
+    with open_table(output_file, "inventory", columns, create_table, fmt, batch_size) as writer:
+        writer.write_rows(generate_inventory(input_file))
+    report_throughput("inventory", writer.rows_written, writer.started)
+    return writer.rows_written
+
 
-            # add a comma if it's not the last item
-            if i < len(rows) - 1:
-                sql_file.write(",\n")
-            else:
-                sql_file.write(";\n")
-            
-            inventory_id += 1
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the inventory table.")
+    add_output_arguments(parser, output_file)
+    parser.add_argument("--input", default=input_file)
+    parser.add_argument("--seed", help="pass the same seed to create_inventory_report so it starts from these levels")
+    args = parser.parse_args()
 
-print("SQL file created and written successfully.")
\ No newline at end of file
+    if args.seed is not None:
+        random.seed(f"{args.seed}:inventory")
+    with instrument(args, "inventory"):
+        write_inventory(args.output, args.input, args.format, args.batch_size)
+    print("SQL file created and written successfully.")
@@ -1,38 +1,126 @@
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import timedelta
+import argparse
+import os
 
-output_file = r"/home/janelandrum/csce331/p3_database/sql_files/inventory_report.sql"
+from . import create_ingredients, create_inventory, create_orders
+from .metrics import instrument
+from .paths import sql_file
+from .writers import DEFAULT_BATCH_SIZE, DEFAULT_FORMAT, add_output_arguments, open_table, report_throughput
 
-num_inventory_items = 46  # adjust according to actual inventory size
-inventory_ids = [i for i in range(1, num_inventory_items + 1)]  # generate inventory IDs
+output_file = sql_file("inventory_report")
 
-# start date: about a year ago
-start_date = datetime(2023, 9, 17)
-num_weeks = 52
+create_table = (
+    "CREATE TABLE inventory_report (\n"
+    "    inventory_report_id INT PRIMARY KEY, \n"
+    "    inventory_item_id INT, \n"
+    "    inventory_report_date DATE, \n"
+    "    recorded_quantity INT, \n"
+    "    FOREIGN KEY (inventory_item_id) REFERENCES inventory(inventory_id) \n"
+    ");\n\n"
+)
+columns = ["inventory_report_id", "inventory_item_id", "inventory_report_date", "recorded_quantity"]
 
-with open(output_file, 'w') as sql_file:
-    sql_file.write("CREATE TABLE inventory_report (\n")
-    sql_file.write("    inventory_report_id INT PRIMARY KEY, \n")
-    sql_file.write("    inventory_item_id INT, \n")
-    sql_file.write("    inventory_report_date DATE, \n")
-    sql_file.write("    recorded_quantity INT, \n")
-    sql_file.write("    FOREIGN KEY (inventory_item_id) REFERENCES inventory(inventory_id) \n")
-    sql_file.write(");\n\n")
+# The report is a weekly snapshot of every inventory item over the same weeks
+# as the orders. Stock levels are simulated day by day: every serving of a
+# menu item sold uses one of each of its ingredients, and an item is
+# restocked to its fill level overnight once it drops to fill_level * 0.1,
+# the same rule as getRestockReport and restockInventory in db.js. Items
+# without ingredients (supplies) keep their starting level. inventory.quantity
+# counts servings, the unit updateInventory in db.js takes off at cashout, so
+# the history and live stock drain at the same rate.
+start_date = create_orders.start_date
+num_weeks = create_orders.num_weeks
 
-    sql_file.write("INSERT INTO inventory_report (inventory_report_id, inventory_item_id, inventory_report_date, recorded_quantity) VALUES \n")
+# fraction of the fill level at which an item is restocked
+restock_level = 0.1
 
-    # loop through each week and each inventory item
-    inventory_report_id = 1
-    report_entries = [] # list for each line in the report to be added to the table
-    for week in range(num_weeks):
-        report_date = start_date + timedelta(weeks=week)  # calculate the report date for each week
+# inventory item ids used by every menu item, from the ingredients table
+def menu_item_ingredients():
+    ingredients = defaultdict(list)
+    for _, inventory_item_id, menu_item_id in create_ingredients.ingredient_data:
+        ingredients[menu_item_id].append(inventory_item_id)
+    return ingredients
 
-        for inventory_id in inventory_ids:
-            subquery = f"(SELECT quantity FROM inventory WHERE inventory_id = {inventory_id})"
-            report_entries.append(f"    ({inventory_report_id}, {inventory_id}, '{report_date.strftime('%Y-%m-%d')}', {subquery})")
 
-            inventory_report_id += 1
+# Stock of every inventory item in servings. fill_levels and servings are
+# keyed by inventory_id.
+class Stock:
+    def __init__(self, fill_levels, servings):
+        self.fill_levels = fill_levels
+        self.servings = servings
+        self.ingredients = menu_item_ingredients()
 
-    # write all the entries to the SQL file, separated by commas
-    sql_file.write(",\n".join(report_entries) + ";\n")
+    # levels are (inventory_id, quantity, fill_level), as in the inventory table
+    @classmethod
+    def from_levels(cls, levels):
+        return cls({inventory_id: fill_level for inventory_id, _, fill_level in levels},
+                   {inventory_id: quantity for inventory_id, quantity, _ in levels})
 
-print("Inventory report SQL file created and written successfully.")
+    def quantity(self, inventory_id):
+        return self.servings[inventory_id]
+
+    # take a day's servings sold ({menu_item_id: servings}) out of stock, then
+    # restock overnight
+    def run_day(self, day_usage):
+        for menu_item_id, servings in day_usage.items():
+            for inventory_id in self.ingredients[menu_item_id]:
+                if inventory_id in self.servings:
+                    self.servings[inventory_id] = max(self.servings[inventory_id] - servings, 0)
+
+        for inventory_id, fill_level in self.fill_levels.items():
+            if self.servings[inventory_id] <= fill_level * restock_level:
+                self.servings[inventory_id] = fill_level
+
+
+# Run stock through num_days from start_date and yield a report row for every
+# item at the start of every week, the first one on day first_report_day.
+# usage is the servings sold per day and menu item, as written by
+# create_orders.
+def simulate(stock, usage, start_date, num_days, first_report_id=1, first_report_day=0):
+    inventory_report_id = first_report_id
+    for day in range(num_days):
+        date = (start_date + timedelta(days=day)).strftime('%Y-%m-%d')
+        if day >= first_report_day and (day - first_report_day) % 7 == 0:
+            for inventory_id in stock.servings:
+                yield (inventory_report_id, inventory_id, date, stock.quantity(inventory_id))
+                inventory_report_id += 1
+        stock.run_day(usage.get(date, {}))
+
+
+# levels are (inventory_id, quantity, fill_level): the stock on start_date
+def generate_inventory_report(levels, usage, start_date, num_weeks):
+    return simulate(Stock.from_levels(levels), usage, start_date, num_weeks * 7)
+
+
+# The usage file is written by create_orders into its output directory, so by
+# default it is read from next to output_file. seed has to match the one the
+# inventory table was generated with.
+def write_inventory_report(output_file, usage_path=None, seed=None, num_weeks=num_weeks,
+                           inventory_file=create_inventory.input_file, fmt=DEFAULT_FORMAT,
+                           batch_size=DEFAULT_BATCH_SIZE):
+    usage_path = usage_path or os.path.join(os.path.dirname(output_file), create_orders.usage_file)
+    if not os.path.exists(usage_path):
+        raise FileNotFoundError(f"{usage_path} not found: generate the orders first (create_orders writes it)")
+    usage = create_orders.read_usage(usage_path)
+    levels = create_inventory.inventory_levels(inventory_file, seed)
+
+    with open_table(output_file, "inventory_report", columns, create_table, fmt, batch_size) as writer:
+        writer.write_rows(generate_inventory_report(levels, usage, start_date, num_weeks))
+    report_throughput("inventory_report", writer.rows_written, writer.started)
+    return writer.rows_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the inventory_report table.")
+    add_output_arguments(parser, output_file)
+    parser.add_argument("--usage", help=f"the {create_orders.usage_file} written by create_orders "
+                                        "(defaults to the one next to --output)")
+    parser.add_argument("--seed", help="the seed create_inventory was run with")
+    parser.add_argument("--weeks", type=int, default=num_weeks)
+    args = parser.parse_args()
+
+    with instrument(args, "inventory_report"):
+        write_inventory_report(args.output, args.usage, args.seed, args.weeks, fmt=args.format,
+                               batch_size=args.batch_size)
+    print("Inventory report SQL file created and written successfully.")
@@ -1,61 +1,82 @@
-from datetime import datetime, timedelta
 import random
 
-# Define file path for the order_items_report
-output_file_order_items = r"/home/janelandrum/csce331/p3_database/sql_files/order_items.sql"
-
-# Number of orders and menu items
-num_orders = 63972  # arbitrary number of orders
-num_menu_items = 25  # adjust based on number of menu items
-
-with open(output_file_order_items, 'w') as sql_file:
-    sql_file.write("CREATE TABLE order_items (\n")
-    sql_file.write("    order_item_id INT PRIMARY KEY,\n")
-    sql_file.write("    order_id INT,\n")
-    sql_file.write("    menu_item_id INT,\n")
-    sql_file.write("    combo BOOLEAN,\n")
-    sql_file.write("    combo_type VARCHAR(50),\n")
-    sql_file.write("    item_size VARCHAR(10),\n")
-    sql_file.write("    recorded_quantity INT,\n")
-    sql_file.write("    FOREIGN KEY (order_id) REFERENCES orders(order_id),\n")
-    sql_file.write("    FOREIGN KEY (menu_item_id) REFERENCES menu_items(menu_item_id)\n")
-    sql_file.write(");\n\n")
-    
-    # Initialize order_item_id
-    order_item_id = 1
-    order_items_entries = []
-
-    # Define possible combo types and sizes
-    combo_types = ['Bowl', 'Plate', 'Bigger Plate', 'A la carte']
-    item_size = ['Small', 'Medium', 'Large']
-
-    # Generate random entries for order items
-    for order_id in range(1, num_orders + 1):  # Loop through each order
-        # Randomly decide if the order is a combo or a la carte
-        if random.choice([True, False]):  # 50% chance to be a combo
-            combo_type = random.choice(combo_types[:-1])  # Exclude 'A la carte'
-            if combo_type == 'Bowl':
-                sides = 1
-                entrees = 1
-            elif combo_type == 'Plate':
-                sides = 1
-                entrees = 2
-            elif combo_type == 'Bigger Plate':
-                sides = 1
-                entrees = 3
-
-            # Record combo item with size and quantity
-            order_items_entries.append(f"({order_item_id}, {order_id}, {random.randint(1, num_menu_items)}, True, '{combo_type}', '{random.choice(item_size)}', {sides + entrees})")
-            order_item_id += 1  # Increment order_item_id after adding a combo item
-        else:  # A la carte
-            # Generate a random number of items for a la carte (1 to 5)
-            num_items = random.randint(1, 5)
-            for _ in range(num_items):
-                order_items_entries.append(f"({order_item_id}, {order_id}, {random.randint(1, num_menu_items)}, False, 'N/A', '{random.choice(item_size)}', {random.randint(1, 3)})")
-                order_item_id += 1  # Increment for each a la carte item
-
-    # Write all the entries to the SQL file, separated by commas
-    sql_file.write("INSERT INTO order_items (order_item_id, order_id, menu_item_id, combo, combo_type, item_size, recorded_quantity) VALUES \n")
-    sql_file.write(",\n".join(order_items_entries) + ";\n")
-
-print("Order items report SQL file created and written successfully.")
\ No newline at end of file
+# The order_items rows are written by create_orders.py, in the same pass as the
+# orders they belong to. This module holds the table definition and the rules
+# for building and pricing the items of one order.
+
+# Define possible combo types and sizes
+combo_types = ['Bowl', 'Plate', 'Bigger Plate', 'A la carte']
+item_size = ['Small', 'Medium', 'Large']
+
+# sides + entrees that make up each combo
+combo_quantities = {'Bowl': 2, 'Plate': 3, 'Bigger Plate': 4}
+
+# menu_items price column for each size and combo. The combo columns are the
+# price per side or entree, so a Bowl of an entree is 2 x menu_price_bowl.
+size_price_columns = {'Small': 'menu_price_small', 'Medium': 'menu_price_medium', 'Large': 'menu_price_large'}
+combo_price_columns = {'Bowl': 'menu_price_bowl', 'Plate': 'menu_price_plate', 'Bigger Plate': 'menu_price_bplate'}
+
+create_table = (
+    "CREATE TABLE order_items (\n"
+    "    order_item_id INT PRIMARY KEY,\n"
+    "    order_id INT,\n"
+    "    menu_item_id INT,\n"
+    "    combo BOOLEAN,\n"
+    "    combo_type VARCHAR(50),\n"
+    "    item_size VARCHAR(10),\n"
+    "    recorded_quantity INT,\n"
+    "    FOREIGN KEY (order_id) REFERENCES orders(order_id),\n"
+    "    FOREIGN KEY (menu_item_id) REFERENCES menu_items(menu_item_id)\n"
+    ");\n\n"
+)
+order_item_columns = ["order_item_id", "order_id", "menu_item_id", "combo", "combo_type", "item_size", "recorded_quantity"]
+
+
+# Work out once which menu items can be sold how, with how often each is
+# picked. Combos are built around an entree; a la carte items come in the
+# sizes that have a price.
+def build_menu_choices(menu, popularity=None):
+    popularity = popularity or {}
+    combo_items = [item for item in menu if item['menu_item_type'] == 'entree']
+    a_la_carte_items = []
+    for item in menu:
+        sizes = [size for size, column in size_price_columns.items() if item[column] > 0]
+        if sizes:
+            a_la_carte_items.append((item, sizes))
+    combo_weights = [popularity.get(item['menu_item_id'], 1.0) for item in combo_items]
+    a_la_carte_weights = [popularity.get(item['menu_item_id'], 1.0) for item, _ in a_la_carte_items]
+    return combo_items, combo_weights, a_la_carte_items, a_la_carte_weights
+
+
+# price of one order item line, after the item's weekly promo if it has one
+def line_price(item, price_column, quantity, discounts):
+    price = item[price_column] * quantity
+    return max(price - discounts.get(item['menu_item_id'], 0), 0)
+
+
+# Build the item rows of one order, starting at order_item_id, and return them
+# with the order's total price. combo_mix weighs each of combo_types.
+def generate_order_items(order_id, order_item_id, menu_choices, discounts, combo_mix):
+    combo_items, combo_weights, a_la_carte_items, a_la_carte_weights = menu_choices
+    rows = []
+    total = 0
+
+    # Decide if the order is a combo or a la carte
+    combo_type = random.choices(combo_types, weights=combo_mix)[0]
+    if combo_type != 'A la carte':
+        item = random.choices(combo_items, weights=combo_weights)[0]
+        quantity = combo_quantities[combo_type]
+
+        # Record combo item with size and quantity
+        rows.append((order_item_id, order_id, item['menu_item_id'], True, combo_type, random.choice(item_size), quantity))
+        total += line_price(item, combo_price_columns[combo_type], quantity, discounts)
+    else:  # A la carte
+        # Generate a random number of items for a la carte (1 to 5)
+        num_items = random.randint(1, 5)
+        for i, (item, sizes) in enumerate(random.choices(a_la_carte_items, weights=a_la_carte_weights, k=num_items)):
+            size = random.choice(sizes)
+            quantity = random.randint(1, 3)
+            rows.append((order_item_id + i, order_id, item['menu_item_id'], False, 'N/A', size, quantity))
+            total += line_price(item, size_price_columns[size], quantity, discounts)
+
+    return rows, round(total, 2)
@@ -1,41 +1,180 @@
+from collections import Counter, defaultdict
+from contextlib import ExitStack
 from datetime import datetime, timedelta
+import argparse
+import json
+import os
 import random
 
-output_file_orders = r"/home/janelandrum/csce331/p3_database/sql_files/orders.sql"
+from . import create_menu_items, create_order_items, create_promos, create_sales_report, demand, partitions
+from .metrics import add_metrics_arguments, instrument
+from .paths import sql_files_dir
+from .writers import DEFAULT_BATCH_SIZE, DEFAULT_FORMAT, FORMATS, open_table, report_throughput
 
-# Start date and number of weeks for generating data
+# Orders, order_items and Sales_Report are generated together in one pass:
+# each order is built once, its items are priced from menu_items and promos,
+# and its sales report row is derived from it, so the three tables always
+# agree with each other.
+
+# Start date and number of weeks for generating data. How many orders come in
+# and what they contain is up to the demand model (see demand.py).
 start_date = datetime(2023, 9, 17)
 num_weeks = 52
 
-# Open the SQL file for writing the Orders
-with open(output_file_orders, 'w') as sql_file:
-    # Create the Orders table
-    sql_file.write("CREATE TABLE Orders (\n")
-    sql_file.write("    Order_ID SERIAL PRIMARY KEY,\n")
-    sql_file.write("    Employee_ID INT,\n")
-    sql_file.write("    Order_Date DATE,\n")
-    sql_file.write("    Order_Time TIME,\n")
-    sql_file.write("    Order_Price NUMERIC(10, 2),\n")
-    sql_file.write("    Order_Status VARCHAR(50)\n")
-    sql_file.write(");\n\n")
-    
-    # Loop to insert Orders into the Orders table
-    order_id = 1
-    orders_entries = []  # list to hold each order entry
-    for week in range(num_weeks):
-        for day in range(7):
-            date = start_date + timedelta(weeks=week, days=day)
-            # Randomly generate 150 to 200 orders per day
-            for _ in range(random.randint(150, 200)):
-                time = datetime.strptime(f"{random.randint(8,20)}:{random.randint(0,59)}:00", '%H:%M:%S')
-                price = round(random.uniform(50, 200), 2)
-                status = random.choice(['Completed', 'Pending', 'Cancelled'])
-                orders_entries.append(f"({order_id}, {random.randint(1,10)}, '{date.strftime('%Y-%m-%d')}', '{time.strftime('%H:%M:%S')}', {price}, '{status}')")
-                order_id += 1
-    
-    # Write all the entries to the SQL file, separated by commas
-    sql_file.write("INSERT INTO Orders (Order_ID, Employee_ID, Order_Date, Order_Time, Order_Price, Order_Status) VALUES \n")
-    sql_file.write(",\n".join(orders_entries) + ";\n")
-
-print("Orders SQL file created and written successfully.")
+# python draws every value with the random module; numpy draws a week at a
+# time as arrays (see orders_numpy.py) and is much faster at volume
+engines = ["python", "numpy"]
+
+# besides the SQL formats, the order tables can be written as memory-mappable
+# column files (see columnar.py) for reports without a database
+order_formats = FORMATS + ["columnar"]
+
+create_table = (
+    "CREATE TABLE Orders (\n"
+    "    Order_ID SERIAL PRIMARY KEY,\n"
+    "    Employee_ID INT,\n"
+    "    Order_Date DATE,\n"
+    "    Order_Time TIME,\n"
+    "    Order_Price NUMERIC(10, 2),\n"
+    "    Order_Status VARCHAR(50)\n"
+    ");\n\n"
+)
+order_columns = ["Order_ID", "Employee_ID", "Order_Date", "Order_Time", "Order_Price", "Order_Status"]
+
+# servings of every menu item sold per day, written next to the tables for
+# the inventory simulation in create_inventory_report.py
+usage_file = "menu_item_usage.json"
+
+# the tables this generator writes, with their table name, columns and DDL
+order_tables = {
+    "orders": ("Orders", order_columns, create_table),
+    "order_items": ("order_items", create_order_items.order_item_columns, create_order_items.create_table),
+    "sales_report": ("Sales_Report", create_sales_report.sales_columns, create_sales_report.create_table),
+}
+
+
+# menu_items rows as dicts keyed by column name
+def load_menu(menu_file=create_menu_items.input_file):
+    return [dict(zip(create_menu_items.columns, row)) for row in create_menu_items.read_menu_items(menu_file)]
+
+
+# Yield (order row, order item rows, sales report row) for every order, one
+# day at a time, so nothing is held in memory. num_days, if given, replaces
+# num_weeks.
+def generate_order_data(start_date, num_weeks, menu, discounts, demand_model, first_order_id=1,
+                        first_order_item_id=1, num_days=None):
+    menu_choices = create_order_items.build_menu_choices(menu, demand_model.popularity)
+    order_id = first_order_id
+    order_item_id = first_order_item_id
+    for day in range(num_days if num_days is not None else num_weeks * 7):
+        day_date = start_date + timedelta(days=day)
+        date = day_date.strftime('%Y-%m-%d')
+        for _ in range(demand_model.order_count(day_date)):
+            order_time = demand_model.order_time()
+            items, price = create_order_items.generate_order_items(order_id, order_item_id, menu_choices,
+                                                                   discounts, demand_model.combo_mix)
+            status = random.choice(['Completed', 'Pending', 'Cancelled'])
+            order = (order_id, random.randint(1, 10), date, order_time, price, status)
+            yield order, items, create_sales_report.sales_report_row(order_id, price, status, date)
+            order_id += 1
+            order_item_id += len(items)
+
+
+# usage is {date: {menu_item_id: servings}}
+def write_usage(path, usage):
+    with open(path, 'w') as usage_file:
+        json.dump({date: {str(menu_item_id): servings for menu_item_id, servings in sorted(items.items())}
+                   for date, items in sorted(usage.items())}, usage_file)
+
+
+def read_usage(path):
+    with open(path) as usage_file:
+        return {date: {int(menu_item_id): servings for menu_item_id, servings in items.items()}
+                for date, items in json.load(usage_file).items()}
+
+
+# Write orders, order_items and sales_report into output_dir, along with the
+# daily menu item usage, and return the number of rows written to each table.
+# To add to tables that already exist (see append.py), pass the first ids to
+# use and create_tables=False; discounts then usually come from the database
+# rather than from the seed. partition_by_month writes the tables as monthly
+# partitions (see partitions.py), and fmt can also be "columnar".
+def write_order_data(output_dir, start_date, num_weeks, fmt=DEFAULT_FORMAT, batch_size=DEFAULT_BATCH_SIZE,
+                     seed=None, menu_file=create_menu_items.input_file, engine="python",
+                     demand_file=demand.default_config, daily_orders=None, num_days=None, first_order_id=1,
+                     first_order_item_id=1, discounts=None, create_tables=True, partition_by_month=False):
+    if fmt == "columnar" and partition_by_month:
+        raise ValueError("columnar output is not partitioned")
+    menu = load_menu(menu_file)
+    discounts = discounts if discounts is not None else create_promos.promo_discounts(seed)
+    demand_model = demand.load_demand(demand_file, menu)
+    if daily_orders is not None:
+        demand_model.daily_orders = tuple(daily_orders)
+
+    with ExitStack() as stack:
+        if fmt == "columnar":
+            from . import columnar
+            orders, order_items, sales_report = columnar.open_columnar_tables(stack, output_dir, batch_size)
+        elif partition_by_month:
+            orders, order_items, sales_report = partitions.open_partitioned_tables(stack, output_dir, fmt,
+                                                                                   batch_size, order_columns)
+        else:
+            orders, order_items, sales_report = (
+                stack.enter_context(open_table(os.path.join(output_dir, f"{table}.sql"), name, columns,
+                                               ddl if create_tables else "", fmt, batch_size))
+                for table, (name, columns, ddl) in order_tables.items())
+
+        usage = defaultdict(Counter)
+        if engine == "numpy":
+            from . import orders_numpy
+            orders_numpy.write_order_data((orders, order_items, sales_report), start_date, num_weeks, menu,
+                                          discounts, demand_model, seed, first_order_id=first_order_id,
+                                          first_order_item_id=first_order_item_id, usage=usage,
+                                          num_days=num_days)
+        else:
+            for order, items, sale in generate_order_data(start_date, num_weeks, menu, discounts, demand_model,
+                                                          first_order_id, first_order_item_id, num_days):
+                orders.write(order)
+                order_items.write_rows(items)
+                sales_report.write(sale)
+                for item in items:
+                    usage[order[2]][item[2]] += item[6]
+    write_usage(os.path.join(output_dir, usage_file), usage)
+    if partition_by_month:
+        end_date = start_date + timedelta(days=(num_days if num_days is not None else num_weeks * 7) - 1)
+        partitions.write_table_files(output_dir, (orders, order_items, sales_report),
+                                     {table: ddl for table, (_, _, ddl) in order_tables.items()}, start_date,
+                                     end_date)
+
+    rows = {}
+    for table, writer in zip(order_tables, (orders, order_items, sales_report)):
+        report_throughput(table, writer.rows_written, writer.started)
+        rows[table] = writer.rows_written
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the Orders, order_items and Sales_Report tables.")
+    parser.add_argument("--output-dir", default=sql_files_dir)
+    parser.add_argument("--format", choices=order_formats, default=DEFAULT_FORMAT)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--weeks", type=int, default=num_weeks)
+    parser.add_argument("--menu", default=create_menu_items.input_file)
+    parser.add_argument("--seed", help="use the same seed as create_promos so prices include its discounts")
+    parser.add_argument("--engine", choices=engines, default="python")
+    parser.add_argument("--demand", default=demand.default_config, help="demand model config (JSON)")
+    parser.add_argument("--daily-orders", type=int, nargs=2, metavar=("MIN", "MAX"),
+                        help="override the demand model's orders per ordinary day")
+    parser.add_argument("--partition-by-month", action="store_true",
+                        help="write the tables as monthly range partitions, one file per month")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
 
+    if args.seed is not None:
+        random.seed(f"{args.seed}:orders")
+    os.makedirs(args.output_dir, exist_ok=True)
+    with instrument(args, "orders"):
+        write_order_data(args.output_dir, start_date, args.weeks, args.format, args.batch_size, args.seed,
+                         args.menu, args.engine, args.demand, args.daily_orders,
+                         partition_by_month=args.partition_by_month)
+    print("Orders files created and written successfully.")
@@ -1,24 +1,55 @@
+import argparse
 import random
 
-output_file = r"/home/janelandrum/csce331/p3_database/sql_files/promos.sql"
+from .metrics import instrument
+from .paths import sql_file
+from .writers import DEFAULT_BATCH_SIZE, DEFAULT_FORMAT, add_output_arguments, open_table, report_throughput
 
-with open(output_file, 'w') as sql_file:
-    sql_file.write("CREATE TABLE promos (\n")
-    sql_file.write("    promo_id INT PRIMARY KEY,\n")
-    sql_file.write("    discount_amount FLOAT,\n")
-    sql_file.write("    discounted_item INT,\n")
-    sql_file.write("    FOREIGN KEY (discounted_item) REFERENCES menu_items(menu_item_id)\n")
-    sql_file.write(");\n\n")
+output_file = sql_file("promos")
 
-    sql_file.write("INSERT INTO promos (promo_id, discount_amount, discounted_item) VALUES \n")
+create_table = (
+    "CREATE TABLE promos (\n"
+    "    promo_id INT PRIMARY KEY,\n"
+    "    discount_amount FLOAT,\n"
+    "    discounted_item INT,\n"
+    "    FOREIGN KEY (discounted_item) REFERENCES menu_items(menu_item_id)\n"
+    ");\n\n"
+)
+columns = ["promo_id", "discount_amount", "discounted_item"]
 
-    # list with ids for each item that could have a discount on it (entrees, desserts, and drinks)
-    items = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 22, 23, 24, 25, 26]
-    # list with random generated discounts
-    discounts = [round(random.uniform(1, 5), 2) for _ in range(len(items))]
+# list with ids for each item that could have a discount on it (entrees, desserts, and drinks)
+items = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 22, 23, 24, 25, 26]
 
-    for i, (item, discount) in enumerate(zip(items, discounts), start=1):
-        end_char = ",\n" if i < len(items) else ";\n"
-        sql_file.write(f"    ({i}, {discount}, {item}){end_char}")
 
-print("SQL file created and written successfully.")
+def generate_promos(rng=random):
+    # random generated discount for each item
+    for promo_id, item in enumerate(items, start=1):
+        yield (promo_id, round(rng.uniform(1, 5), 2), item)
+
+
+# The discount on each item, as generated for the given seed. The seed command
+# seeds the promos table with f"{seed}:promos", so the order generator can
+# price orders with exactly the promos that were written.
+def promo_discounts(seed=None):
+    rng = random.Random(f"{seed}:promos") if seed is not None else random.Random()
+    return {item: discount for _, discount, item in generate_promos(rng)}
+
+
+def write_promos(output_file, fmt=DEFAULT_FORMAT, batch_size=DEFAULT_BATCH_SIZE):
+    with open_table(output_file, "promos", columns, create_table, fmt, batch_size) as writer:
+        writer.write_rows(generate_promos())
+    report_throughput("promos", writer.rows_written, writer.started)
+    return writer.rows_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the promos table.")
+    add_output_arguments(parser, output_file)
+    parser.add_argument("--seed", help="pass the same seed to create_orders so order prices use these promos")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(f"{args.seed}:promos")
+    with instrument(args, "promos"):
+        write_promos(args.output, args.format, args.batch_size)
+    print("SQL file created and written successfully.")
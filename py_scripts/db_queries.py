@@ -0,0 +1,36 @@
+import os
+import re
+
+from .paths import repo_root
+from .writers import sql_literal
+
+# The SQL that server.js runs lives in template literals in db.js. Tools that
+# benchmark or tune those queries read them from there, so they always test
+# what the app actually runs.
+db_js = os.path.join(repo_root, "app", "database", "db.js")
+
+
+def read_db_js(path=db_js):
+    with open(path) as source_file:
+        return source_file.read()
+
+
+# a string or template literal holding SQL
+query_literal = re.compile(r"""(["'`])\s*((?:SELECT|INSERT|UPDATE|DELETE|WITH)\b.*?)\1""", re.DOTALL)
+
+
+# the first query in a db.js function
+def function_query(name, source=None):
+    source = source if source is not None else read_db_js()
+    match = re.search(rf"(?:async function {name}\s*\(|const {name}\s*=\s*async\b)", source)
+    if not match:
+        raise ValueError(f"{name} not found in {db_js}")
+    query = query_literal.search(source, match.end())
+    if not query:
+        raise ValueError(f"{name} in {db_js} has no query")
+    return query.group(2).strip()
+
+
+# substitute $1, $2, ... with SQL literals so psql can run the query
+def bind(sql, params):
+    return re.sub(r"\$(\d+)", lambda match: sql_literal(params[int(match.group(1)) - 1]), sql)
@@ -0,0 +1,67 @@
+import re
+
+# Reads the CREATE TABLE statements the generators write, for the staged load
+# plan (see load_plan.py): the columns of a table, its primary and foreign
+# keys, and the same table with nothing but its columns. Names are returned
+# lowercase, the way Postgres stores the unquoted names of the DDL.
+
+create_pattern = re.compile(r"CREATE TABLE\s+(\w+)\s*\((.*)\)\s*;", re.DOTALL | re.IGNORECASE)
+inline_primary_key = re.compile(r"\s+PRIMARY KEY\b", re.IGNORECASE)
+table_primary_key = re.compile(r"PRIMARY KEY\s*\(([^)]*)\)", re.IGNORECASE)
+foreign_key_pattern = re.compile(r"FOREIGN KEY\s*\((\w+)\)\s*REFERENCES\s+(\w+)\s*\((\w+)\)", re.IGNORECASE)
+
+
+def table_name(create_table):
+    return create_pattern.search(create_table).group(1)
+
+
+# the comma-separated items of a CREATE TABLE, leaving alone the commas in
+# types like NUMERIC(10, 2)
+def table_items(create_table):
+    body = create_pattern.search(create_table).group(2)
+    items, depth, start = [], 0, 0
+    for position, char in enumerate(body):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            items.append(body[start:position])
+            start = position + 1
+    items.append(body[start:])
+    return [item.strip() for item in items if item.strip()]
+
+
+def is_constraint(item):
+    return item.upper().startswith(("PRIMARY KEY", "FOREIGN KEY", "UNIQUE", "CONSTRAINT", "CHECK"))
+
+
+# column: type (the type's first word, uppercase), in table order
+def columns(create_table):
+    found = {}
+    for item in table_items(create_table):
+        if not is_constraint(item):
+            name, column_type = item.split()[:2]
+            found[name.lower()] = re.match(r"\w+", column_type).group(0).upper()
+    return found
+
+
+def primary_key(create_table):
+    for item in table_items(create_table):
+        match = table_primary_key.match(item)
+        if match:
+            return [column.strip().lower() for column in match.group(1).split(",")]
+        if not is_constraint(item) and inline_primary_key.search(item):
+            return [item.split()[0].lower()]
+    return []
+
+
+# (column, referenced table, referenced column) per foreign key
+def foreign_keys(create_table):
+    return [tuple(name.lower() for name in match.groups()) for match in foreign_key_pattern.finditer(create_table)]
+
+
+# the CREATE TABLE without its keys, written the way the generators write it
+def bare_table(create_table):
+    items = [inline_primary_key.sub("", item) for item in table_items(create_table) if not is_constraint(item)]
+    return f"CREATE TABLE {table_name(create_table)} (\n" + ",\n".join(f"    {item}" for item in items) + "\n);\n\n"
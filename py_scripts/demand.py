@@ -0,0 +1,73 @@
+from itertools import accumulate
+import calendar
+import json
+import math
+import random
+
+from . import create_order_items
+from .paths import txt_file
+
+# The demand model decides how many orders each day gets, when during the day
+# they come in and what they contain. It is read from a JSON file
+# (txt_files/demand.json by default) with these keys:
+#
+#   daily_orders     [min, max] orders on an ordinary day
+#   opening_hours    [open, close] hours; orders only come in while open
+#   hourly_curve     a base rate plus peaks (hour, width in hours, weight),
+#                    e.g. the lunch and dinner rush
+#   weekday_factors  volume multiplier per weekday name
+#   holidays         volume multiplier per "MM-DD" (every year) or
+#                    "YYYY-MM-DD" (that day only)
+#   combo_mix        probability of each combo type, including 'A la carte'
+#   popularity       relative weight per menu_item_name (default 1.0)
+
+default_config = txt_file("demand.json")
+
+minutes_per_day = 24 * 60
+
+# every "HH:MM:00" order time, indexed by minute of the day
+times_of_day = [f"{minute // 60:02d}:{minute % 60:02d}:00" for minute in range(minutes_per_day)]
+
+
+class DemandModel:
+    def __init__(self, config, menu):
+        self.daily_orders = tuple(config["daily_orders"])
+
+        # weight of every minute of the day: the base rate plus a bell curve
+        # around each peak, and nothing outside opening hours
+        open_hour, close_hour = config["opening_hours"]
+        curve = config["hourly_curve"]
+        self.minute_weights = [0.0] * minutes_per_day
+        for minute in range(open_hour * 60, close_hour * 60):
+            hour = minute / 60
+            self.minute_weights[minute] = curve["base"] + sum(
+                peak["weight"] * math.exp(-(hour - peak["hour"]) ** 2 / (2 * peak["width"] ** 2))
+                for peak in curve["peaks"])
+        self.minute_cum_weights = list(accumulate(self.minute_weights))
+
+        self.weekday_factors = [config["weekday_factors"].get(day, 1.0) for day in calendar.day_name]
+        self.holidays = config.get("holidays", {})
+        self.combo_mix = [config["combo_mix"].get(combo, 0) for combo in create_order_items.combo_types]
+
+        popularity = config.get("popularity", {})
+        menu_ids = {item['menu_item_name']: item['menu_item_id'] for item in menu}
+        unknown = sorted(set(popularity) - set(menu_ids))
+        if unknown:
+            raise ValueError(f"popularity lists items that are not on the menu: {', '.join(unknown)}")
+        self.popularity = {menu_item_id: popularity.get(name, 1.0) for name, menu_item_id in menu_ids.items()}
+
+    # volume multiplier for a day; a dated holiday wins over a yearly one
+    def day_factor(self, day):
+        holiday = self.holidays.get(day.strftime('%Y-%m-%d'), self.holidays.get(day.strftime('%m-%d'), 1.0))
+        return self.weekday_factors[day.weekday()] * holiday
+
+    def order_count(self, day, rng=random):
+        return round(rng.randint(*self.daily_orders) * self.day_factor(day))
+
+    def order_time(self, rng=random):
+        return times_of_day[rng.choices(range(minutes_per_day), cum_weights=self.minute_cum_weights)[0]]
+
+
+def load_demand(config_file, menu):
+    with open(config_file) as demand_file:
+        return DemandModel(json.load(demand_file), menu)
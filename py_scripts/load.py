@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+import subprocess
+import sys
+import time
+
+from .compression import find_file, open_input
+from .load_plan import plan_file, read_plan
+from .pg import psql_env
+
+# Loads a directory written by the seed, shard or append command into
+# Postgres, compressed or not, without unpacking anything to disk. The load
+# file is streamed into a single psql reading from stdin, and on the way:
+#
+#   \ir <file>            is replaced by the file's lines, decompressed
+#   \copy ... FROM 'x'    becomes COPY ... FROM STDIN followed by the CSV
+#                         rows, decompressed
+#
+# so psql never opens a file itself. COPY ... FROM stdin blocks in the copy
+# format pass through as they are.
+#
+#   python -m py_scripts seed --seed 1 --compress zstd --output-dir seed
+#   python -m py_scripts load seed --database pos
+#
+# With --jobs, a directory with a staged load plan (see load_plan.py) is
+# loaded one stage at a time instead, with the parts of every stage streamed
+# into that many psql sessions at once.
+
+include_pattern = re.compile(r"\\ir?\s+(\S+)\s*$")
+copy_file_pattern = re.compile(r"\\copy\s+(.+?)\s+FROM\s+'([^']+)'(.*?)\s*$", re.IGNORECASE)
+copy_stdin_pattern = re.compile(r"COPY\s.*\sFROM\s+stdin", re.IGNORECASE)
+
+# characters per read when passing CSV rows through
+chunk_size = 1 << 20
+
+
+# Write the SQL of path, with everything it includes, to out. path is the
+# uncompressed name; includes and CSV files are found next to the file that
+# names them. Returns the number of characters written.
+def stream_file(path, out):
+    with open_input(path) as sql_file:
+        return stream_lines(sql_file, os.path.dirname(path), out)
+
+
+# stream_file for lines read from a file in directory
+def stream_lines(lines, directory, out):
+    written = 0
+    in_copy = False
+    for line in lines:
+        include = include_pattern.match(line) if not in_copy else None
+        copy_file = copy_file_pattern.match(line) if not in_copy else None
+        if include:
+            written += stream_file(os.path.join(directory, include.group(1)), out)
+        elif copy_file:
+            table, csv_name, options = copy_file.groups()
+            out.write(f"COPY {table} FROM STDIN{options};\n")
+            with open_input(os.path.join(directory, csv_name)) as csv_file:
+                for chunk in iter(lambda: csv_file.read(chunk_size), ""):
+                    out.write(chunk)
+                    written += len(chunk)
+            out.write("\\.\n")
+        else:
+            out.write(line)
+            written += len(line)
+            if in_copy:
+                in_copy = line.rstrip("\r\n") != "\\."
+            else:
+                in_copy = bool(copy_stdin_pattern.match(line))
+    return written
+
+
+# Run a psql reading what stream(out) writes, and return the characters
+# written. label names what is loaded when psql fails.
+def run_psql(stream, database, label):
+    psql = subprocess.Popen(["psql", "-X", "-q", "-v", "ON_ERROR_STOP=1", "-f", "-"], stdin=subprocess.PIPE,
+                            stdout=subprocess.DEVNULL, env=psql_env(database), text=True, encoding="utf-8")
+    try:
+        written = stream(psql.stdin)
+        psql.stdin.close()
+    except BrokenPipeError:
+        # psql stopped at an error, which it has printed
+        written = None
+    if psql.wait() != 0:
+        raise SystemExit(f"psql failed loading {label}")
+    return written
+
+
+# Load the stages of the plan in directory one after the other, with up to
+# jobs parts of a stage running at once
+def run_plan(directory, database, jobs):
+    written = 0
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for stage in read_plan(directory):
+            started = time.perf_counter()
+            parts = [pool.submit(run_psql, lambda out, part=part: stream_lines([f"{line}\n" for line in part],
+                                                                              directory, out),
+                                 database, f"{stage['stage']}: {part[-1]}") for part in stage["parts"]]
+            # every part finishes (or fails) before the first failure is raised
+            written += sum(part.result() for part in parts)
+            print(f"  {stage['stage']}: {len(parts)} parts in {time.perf_counter() - started:.2f}s")
+    return written
+
+
+def add_arguments(parser):
+    parser.add_argument("directory", help="the --output-dir of the seed, shard or append command")
+    parser.add_argument("--file", default="load.sql", help="the load file in the directory")
+    parser.add_argument("--database", help="database to load into (default: from the PG*/DB_* variables)")
+    parser.add_argument("--stdout", action="store_true", help="write the SQL to stdout instead of running psql")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help=f"psql sessions running the stages of the directory's {plan_file} at once")
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    path = os.path.join(args.directory, args.file)
+    if find_file(path) is None:
+        raise SystemExit(f"{path} not found")
+    if args.stdout:
+        stream_file(path, sys.stdout)
+        return
+
+    started = time.perf_counter()
+    if args.jobs > 1:
+        if not os.path.exists(os.path.join(args.directory, plan_file)):
+            raise SystemExit(f"--jobs needs the {plan_file} of a staged seed in {args.directory}")
+        written = run_plan(args.directory, args.database, args.jobs)
+        path = os.path.join(args.directory, plan_file)
+    else:
+        written = run_psql(lambda out: stream_file(path, out), args.database, path)
+    print(f"Loaded {path} ({written / 1e6:.1f} MB of SQL and CSV) in {time.perf_counter() - started:.2f}s")
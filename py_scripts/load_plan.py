@@ -0,0 +1,201 @@
+import json
+import os
+import re
+
+from . import db_queries, ddl
+
+# The staged load plan the seed command writes. Loading a table with its keys
+# in place makes Postgres update every index and check every foreign key row
+# by row as the rows go in; building them afterwards takes one sort per index
+# and one join per foreign key. So the tables are created bare and the plan
+# loads them in stages:
+#
+#   tables        every table file: the bare CREATE TABLE and the rows. With
+#                 no foreign keys yet the tables don't depend on each other.
+#   keys          the primary keys, and an index for every column the app's
+#                 queries look rows up by (see query_indexes)
+#   foreign_keys  every foreign key, added NOT VALID and then validated,
+#                 which checks all the rows in one go
+#   analyze       ANALYZE every table, so the planner knows about the rows
+#                 and the new indexes straight away
+#
+# load.sql runs the stages one statement after another. load_plan.json holds
+# them as parts that can run at the same time, and
+#
+#   python -m py_scripts load seed --jobs 4
+#
+# runs every stage on that many psql sessions, waiting for one stage to finish
+# before starting the next.
+#
+# The secondary indexes are read off the queries in db.js, so the report and
+# kitchen queries get the indexes they need and the list follows the app: a
+# column gets an index if a query compares it in a WHERE or JOIN ... ON
+# clause, to a parameter, a literal or a column of another table. Left out
+# are columns the primary key already starts with, boolean columns (an index
+# on two values is no use), prices and other FLOAT or NUMERIC amounts (a query
+# matching a price exactly is filtering a lookup table, not finding rows by
+# it) and comparisons between columns of the same table. The tables the order
+# history and the recipes live in always get these indexes, since append and
+# trickle keep adding orders after the load. Any other table only gets them
+# once it has index_min_rows rows: a lookup table like menu_items is a few
+# pages, which Postgres reads faster than an index.
+# Columns the generators keep unique get a UNIQUE index instead, whatever the
+# size of the table, so the database holds them to it.
+#
+# Monthly partitioned tables keep the primary keys their partitions are
+# created with, foreign keys into them are left out (see partitions.py), and
+# Postgres can only add a foreign key to them validated at once.
+
+plan_file = "load_plan.json"
+
+# the stages after tables, each also written to <stage>.sql for load.sql
+stage_files = {"keys": "keys.sql", "foreign_keys": "foreign_keys.sql", "analyze": "analyze.sql"}
+
+# the rows a table needs for the indexes read off db.js, unless it is one of
+# indexed_tables, which get them at any size
+index_min_rows = 10000
+indexed_tables = ["orders", "order_items", "ingredients"]
+
+# the column types that never get an index read off db.js
+unindexed_types = {"BOOLEAN", "FLOAT", "NUMERIC"}
+
+# (table, column) of the columns whose values are unique: db.js looks
+# customers up by email, and create_customers makes every email unique
+unique_columns = [("customers", "email")]
+
+# memory per session for sorting an index; the stages run several at a time
+maintenance_work_mem = "256MB"
+
+# The tables stage commits every INSERT without waiting for the disk. If the
+# server stops halfway the load is started over anyway.
+table_settings = ["SET synchronous_commit = off;"]
+key_settings = [f"SET maintenance_work_mem = '{maintenance_work_mem}';"]
+
+sql_keywords = {"as", "on", "where", "join", "left", "right", "inner", "outer", "full", "cross", "set", "group",
+                "order", "limit", "using", "values", "returning", "for", "select", "natural"}
+
+table_reference = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+predicate_clause = re.compile(r"\b(?:WHERE|ON)\b(.*?)(?=\b(?:GROUP\s+BY|ORDER\s+BY|LIMIT|RETURNING|HAVING|FOR|JOIN|"
+                              r"LEFT|RIGHT|INNER|FULL|CROSS|WHERE|UNION)\b|\)|;|$)", re.IGNORECASE | re.DOTALL)
+comparison = re.compile(r"(?:(\w+)\.)?(\w+)\s*(?:=|<>|!=|<=|>=|<|>|\bBETWEEN\b|\bIN\b|\bI?LIKE\b)\s*"
+                        r"(?:(\w+)\.)?(\w+)?", re.IGNORECASE)
+
+
+# the tables a query reads or writes, by the names and aliases it uses
+def query_tables(query, table_columns):
+    tables = {}
+    for match in table_reference.finditer(query):
+        table, alias = match.group(1).lower(), (match.group(2) or "").lower()
+        if table in table_columns:
+            tables[table] = table
+            if alias and alias not in sql_keywords:
+                tables[alias] = table
+    return tables
+
+
+# the (table, column) a column reference in a query stands for, or None
+def resolve_column(qualifier, column, tables, table_columns):
+    column = column.lower()
+    if qualifier:
+        table = tables.get(qualifier.lower())
+        return (table, column) if table and column in table_columns[table] else None
+    candidates = {table for table in tables.values() if column in table_columns[table]}
+    return (candidates.pop(), column) if len(candidates) == 1 else None
+
+
+# the (table, column) pairs a query looks rows up by
+def query_predicates(query, table_columns):
+    # aggregate FILTERs select rows within a group, not from a table
+    query = re.sub(r"FILTER\s*\([^)]*\)", "", re.sub(r"--[^\n]*", "", query), flags=re.IGNORECASE)
+    tables = query_tables(query, table_columns)
+    found = set()
+    for clause in predicate_clause.finditer(query):
+        for left_qualifier, left, right_qualifier, right in comparison.findall(clause.group(1)):
+            left_column = resolve_column(left_qualifier, left, tables, table_columns)
+            right_column = resolve_column(right_qualifier, right, tables, table_columns) if right else None
+            if left_column is None or (right_column and right_column[0] == left_column[0]):
+                continue
+            found.add(left_column)
+            if right_column:
+                found.add(right_column)
+    return found
+
+
+# The secondary indexes for the tables of create_tables ({table: CREATE
+# TABLE}), from the queries in db.js: (table, column, index name), sorted.
+# order_items_order_id_idx is the name rollups.py uses too.
+def query_indexes(create_tables, source=None):
+    source = source if source is not None else db_queries.read_db_js()
+    table_columns = {table: ddl.columns(create_table) for table, create_table in create_tables.items()}
+    found = set()
+    for match in db_queries.query_literal.finditer(source):
+        found |= query_predicates(match.group(2), table_columns)
+    return sorted((table, column, f"{table}_{column}_idx") for table, column in found
+                  if table_columns[table][column] not in unindexed_types
+                  and ddl.primary_key(create_tables[table])[:1] != [column])
+
+
+# Every stage of the plan, as a list of parts, every part a list of psql
+# lines that can run at the same time as the other parts of its stage.
+# tables are the tables loaded, biggest first (rows: {table: rows}),
+# create_tables the CREATE TABLE of every table and partitioned the tables
+# written as monthly partitions.
+def plan_stages(tables, rows, create_tables, partitioned=()):
+    tables = sorted(tables, key=lambda table: -rows.get(table, 0))
+    keys, foreign_keys = [], []
+    for table in tables:
+        columns = ddl.primary_key(create_tables[table])
+        if columns and table not in partitioned:
+            keys.append(key_settings + [f"ALTER TABLE {table} ADD PRIMARY KEY ({', '.join(columns)});"])
+    for table, column in unique_columns:
+        if table in tables:
+            keys.append(key_settings + [f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_{column}_key ON {table} "
+                                        f"({column});"])
+    for table, column, name in query_indexes({table: create_tables[table] for table in tables}):
+        big_enough = table in indexed_tables or rows.get(table, 0) >= index_min_rows
+        if big_enough and (table, column) not in unique_columns:
+            keys.append(key_settings + [f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column});"])
+    for table in tables:
+        for column, referenced, referenced_column in ddl.foreign_keys(create_tables[table]):
+            if referenced in partitioned:
+                continue
+            add = (f"ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey FOREIGN KEY ({column}) "
+                   f"REFERENCES {referenced} ({referenced_column})")
+            if table in partitioned:
+                foreign_keys.append([f"{add};"])
+            else:
+                foreign_keys.append([f"{add} NOT VALID;",
+                                     f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}_fkey;"])
+    return {
+        "tables": [table_settings + [f"\\ir {table}.sql"] for table in tables],
+        "keys": keys,
+        "foreign_keys": foreign_keys,
+        "analyze": [[f"ANALYZE {table};"] for table in tables],
+    }
+
+
+# Write load_plan.json and the file of every stage after tables, and return
+# the names of those files in the order load.sql includes them
+def write_plan(output_dir, stages):
+    with open(os.path.join(output_dir, plan_file), 'w') as json_file:
+        json.dump({"stages": [{"stage": stage, "parts": parts} for stage, parts in stages.items()]}, json_file,
+                  indent=2)
+    for stage, name in stage_files.items():
+        settings = key_settings if stage == "keys" else []
+        with open(os.path.join(output_dir, name), 'w') as stage_file:
+            stage_file.write(f"-- The {stage.replace('_', ' ')} stage of the load plan (see {plan_file}).\n")
+            for line in settings + [line for part in stages[stage] for line in part if line not in settings]:
+                stage_file.write(f"{line}\n")
+    return list(stage_files.values())
+
+
+# remove the plan files, when the tables are written with their keys again
+def remove_plan(output_dir):
+    for name in [plan_file] + list(stage_files.values()):
+        if os.path.exists(os.path.join(output_dir, name)):
+            os.remove(os.path.join(output_dir, name))
+
+
+def read_plan(directory):
+    with open(os.path.join(directory, plan_file)) as json_file:
+        return json.load(json_file)["stages"]
@@ -0,0 +1,302 @@
+from collections import Counter, defaultdict, deque
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from . import create_menu_items, create_order_items, create_orders, demand
+
+# Load test for the order and kitchen endpoints of server.js. Requests are
+# sent open-loop at a target rate: each one is scheduled up front and its
+# latency is measured from when it was due, so a slow server shows up as
+# latency instead of quietly lowering the request rate. At most --concurrency
+# requests are in flight, one keep-alive connection each.
+#
+# Orders are built with the same demand model and order item rules as the
+# seed data. Orders are placed as 'Awaiting', like the kiosk does, so they
+# show up in /api/pending-orders, and the kitchen requests move them on to
+# 'In Progress' and 'Completed'.
+#
+#   node server.js
+#   python -m py_scripts.load_test --rps 50 --duration 60 --json results.json
+
+endpoints = ["add-order", "cashout", "pending-orders", "order-status", "menu"]
+
+# share of requests per endpoint: every order is paid for, the kitchen polls
+# and moves orders along, and kiosks load the menu now and then
+default_mix = {"add-order": 0.3, "cashout": 0.3, "pending-orders": 0.2, "order-status": 0.15, "menu": 0.05}
+
+# e-mails are drawn from this many customers, so some come back and collect
+# points and some are new
+num_customers = 1000
+
+
+class HttpError(Exception):
+    pass
+
+
+# A minimal HTTP/1.1 client over keep-alive connections. The pool holds one
+# slot per allowed in-flight request, so taking a slot also caps concurrency.
+class HttpClient:
+    def __init__(self, url, connections):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = parts.scheme == "https"
+        self._pool = asyncio.Queue()
+        for _ in range(connections):
+            self._pool.put_nowait(None)
+
+    async def request(self, method, path, body=None):
+        connection = await self._pool.get()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+            reader, writer = connection
+            data = json.dumps(body).encode() if body is not None else b""
+            writer.write((f"{method} {path} HTTP/1.1\r\n"
+                          f"Host: {self.host}:{self.port}\r\n"
+                          "Content-Type: application/json\r\n"
+                          f"Content-Length: {len(data)}\r\n\r\n").encode() + data)
+            status, headers = await read_head(reader)
+            payload = await read_body(reader, headers)
+            if headers.get("connection", "").lower() == "close":
+                writer.close()
+                connection = None
+            return status, payload
+        except BaseException:
+            # the connection is in an unknown state, start over with a new one
+            if connection is not None:
+                connection[1].close()
+            connection = None
+            raise
+        finally:
+            self._pool.put_nowait(connection)
+
+    async def close(self):
+        while not self._pool.empty():
+            connection = self._pool.get_nowait()
+            if connection is not None:
+                connection[1].close()
+
+
+async def read_head(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise HttpError("connection closed by the server")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return status, headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+async def read_body(reader, headers):
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            chunk = await reader.readexactly(size + 2)
+            if size == 0:
+                return b"".join(chunks)
+            chunks.append(chunk[:-2])
+    return await reader.readexactly(int(headers.get("content-length", 0)))
+
+
+# Builds request bodies and remembers the orders that were placed, so the
+# kitchen requests have orders to move along.
+class Workload:
+    def __init__(self, menu, demand_model, mix, rng):
+        self.rng = rng
+        self.demand_model = demand_model
+        self.menu_choices = create_order_items.build_menu_choices(menu, demand_model.popularity)
+        self.endpoints = list(mix)
+        self.weights = list(mix.values())
+        self.awaiting = deque()
+        self.in_progress = deque()
+        self.last_total = 0
+
+    def choose(self):
+        return self.rng.choices(self.endpoints, weights=self.weights)[0]
+
+    # the method, path and body of the next request to an endpoint, or None
+    # when there is nothing for it to do yet
+    def request(self, endpoint):
+        if endpoint == "add-order":
+            items, price = create_order_items.generate_order_items(0, 0, self.menu_choices, {},
+                                                                   self.demand_model.combo_mix)
+            self.last_total = price
+            return "POST", "/api/add-order", {
+                "employee_id": self.rng.randint(1, 10),
+                "order_price": price,
+                "order_status": "Awaiting",
+                "order_items": [{"menu_item_id": menu_item_id, "combo": 't' if combo else 'f',
+                                 "combo_type": combo_type, "item_size": size, "recorded_quantity": quantity}
+                                for _, _, menu_item_id, combo, combo_type, size, quantity in items],
+            }
+        if endpoint == "cashout":
+            customer = self.rng.randrange(num_customers)
+            return "POST", "/api/cashout", {"name": f"Load Test {customer}", "email": f"loadtest{customer}@example.com",
+                                            "phone_number": f"555{customer:07d}", "totalPrice": self.last_total}
+        if endpoint == "pending-orders":
+            return "GET", "/api/pending-orders", None
+        if endpoint == "order-status":
+            if self.in_progress and (not self.awaiting or self.rng.random() < 0.5):
+                return "PUT", f"/api/order-status/{self.in_progress.popleft()}", {"newStatus": "Completed"}
+            if self.awaiting:
+                order_id = self.awaiting.popleft()
+                self.in_progress.append(order_id)
+                return "PUT", f"/api/order-status/{order_id}", {"newStatus": "In Progress"}
+            return None
+        return "GET", "/api/menu", None
+
+    def placed(self, payload):
+        order_id = json.loads(payload).get("order_id")
+        if order_id is not None:
+            self.awaiting.append(order_id)
+
+
+# When each request is due, in seconds from the start: a Poisson process at
+# rps, or with shape "demand" one that follows the demand model's day, with
+# the opening hours squeezed into the run and rps as the peak rate.
+def schedule(rps, duration, shape, demand_model, rng):
+    weights = demand_model.minute_weights
+    open_minutes = [minute for minute, weight in enumerate(weights) if weight > 0]
+    peak = max(weights)
+    t = 0.0
+    while True:
+        t += rng.expovariate(rps)
+        if t >= duration:
+            return
+        if shape == "demand":
+            minute = open_minutes[min(int(t / duration * len(open_minutes)), len(open_minutes) - 1)]
+            # thinning: keep the arrival with probability rate(t) / rps
+            if rng.random() * peak > weights[minute]:
+                continue
+        yield t
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+
+def summarize(results, elapsed):
+    report = {}
+    for endpoint in endpoints:
+        result = results.get(endpoint)
+        if not result:
+            continue
+        latencies = sorted(result["latencies"])
+        report[endpoint] = {
+            "requests": result["requests"],
+            "errors": result["errors"],
+            "error_rate": result["errors"] / result["requests"],
+            "rps": result["requests"] / elapsed,
+            "status_codes": dict(result["status_codes"]),
+            "latency_ms": {name: round(value * 1000, 2) if value is not None else None
+                           for name, value in [("p50", percentile(latencies, 50)),
+                                               ("p95", percentile(latencies, 95)),
+                                               ("p99", percentile(latencies, 99)),
+                                               ("max", latencies[-1] if latencies else None)]},
+        }
+    return report
+
+
+async def run(url, rps, duration, concurrency, mix, shape, demand_model, menu, seed, timeout):
+    rng = random.Random(seed)
+    # generate_order_items draws from the random module
+    random.seed(f"{seed}:orders")
+    workload = Workload(menu, demand_model, mix, rng)
+    client = HttpClient(url, concurrency)
+    results = defaultdict(lambda: {"requests": 0, "errors": 0, "status_codes": Counter(), "latencies": []})
+
+    async def send(endpoint, due):
+        request = workload.request(endpoint)
+        if request is None:
+            return
+        result = results[endpoint]
+        result["requests"] += 1
+        try:
+            status, payload = await asyncio.wait_for(client.request(*request), timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HttpError) as error:
+            result["errors"] += 1
+            result["status_codes"][type(error).__name__] += 1
+            return
+        result["latencies"].append(time.perf_counter() - due)
+        result["status_codes"][str(status)] += 1
+        if status >= 400:
+            result["errors"] += 1
+        elif endpoint == "add-order":
+            workload.placed(payload)
+
+    started = time.perf_counter()
+    tasks = set()
+    for offset in schedule(rps, duration, shape, demand_model, rng):
+        due = started + offset
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(send(workload.choose(), due))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+    elapsed = time.perf_counter() - started
+    await client.close()
+    return summarize(results, elapsed), elapsed
+
+
+# "add-order=0.5,menu=0.1" -> {"add-order": 0.5, "menu": 0.1}
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        endpoint, _, weight = part.partition("=")
+        if endpoint not in endpoints:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {endpoint!r} (choose from {', '.join(endpoints)})")
+        mix[endpoint] = float(weight)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the server.js order and kitchen endpoints.")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--rps", type=float, default=20,
+                        help="target requests per second (the peak rate with --shape demand)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=32, help="most requests in flight at once")
+    parser.add_argument("--mix", type=parse_mix, default=default_mix,
+                        help="endpoint weights, e.g. add-order=0.5,pending-orders=0.5")
+    parser.add_argument("--shape", choices=["flat", "demand"], default="flat",
+                        help="flat: constant rate; demand: follow the demand model's day over the run")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds before a request counts as an error")
+    parser.add_argument("--menu", default=create_menu_items.input_file)
+    parser.add_argument("--demand", default=demand.default_config, help="demand model config (JSON)")
+    parser.add_argument("--seed", default="load_test")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    menu = create_orders.load_menu(args.menu)
+    demand_model = demand.load_demand(args.demand, menu)
+    report, elapsed = asyncio.run(run(args.url, args.rps, args.duration, args.concurrency, args.mix, args.shape,
+                                      demand_model, menu, args.seed, args.timeout))
+
+    total = sum(result["requests"] for result in report.values())
+    print(f"{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+    print(f"{'endpoint':<16} {'requests':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, result in report.items():
+        latency = result["latency_ms"]
+        print(f"{endpoint:<16} {result['requests']:>8} {result['error_rate']:>6.1%} "
+              + " ".join(f"{latency[name] if latency[name] is not None else '-':>8}" for name in ["p50", "p95", "p99"]))
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({"url": args.url, "rps": args.rps, "duration": args.duration, "concurrency": args.concurrency,
+                       "mix": args.mix, "shape": args.shape, "seed": args.seed, "elapsed": elapsed,
+                       "endpoints": report}, json_file, indent=2)
@@ -0,0 +1,236 @@
+from contextlib import contextmanager
+import argparse
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import sys
+import time
+import tracemalloc
+
+from .compression import find_file
+
+# Instrumentation shared by the generators. Every table written through
+# writers.open_table is recorded here: rows, wall time, bytes on disk, and
+# how the writer's time split between formatting values and writing the
+# formatted text. collect() wraps a generator run and adds up its tables:
+#
+#   phases    generate: everything outside the writers (drawing random
+#             values, building rows, dates and prices); format: turning
+#             values into SQL or CSV text; write: joining the text and
+#             writing (and compressing) it
+#   memory    the peak resident size of the process during the run, and with
+#             --profile the peak of what Python allocated
+#
+# With --profile DIR, a run also leaves DIR/<label>.prof (cProfile, for
+# pstats or snakeviz), DIR/<label>.txt (the functions taking the most time)
+# and DIR/<label>.memory.txt (the lines that allocated the most). Profiling
+# slows the run down, tracemalloc especially, so the timings of a profiled
+# run are only good for comparing with each other.
+#
+# --metrics-json FILE writes the numbers as JSON, which
+#
+#   python -m py_scripts.metrics compare baseline.json metrics.json
+#
+# checks against a stored baseline, for CI.
+
+# the tables written since the last reset, in this process
+tables = []
+
+# lines in the profile summaries
+profile_lines = 30
+
+# compare fails on a job this much slower (rows/s) or bigger (memory, bytes)
+# than the baseline
+default_tolerance = 0.25
+
+# jobs faster than this in the baseline are too noisy to compare throughput
+default_min_seconds = 0.5
+
+
+# called by open_table when a table is written
+def record_table(table, writer, paths):
+    tables.append({
+        "table": table,
+        "files": [os.path.basename(find_file(path) or path) for path in paths],
+        "rows": writer.rows_written,
+        "seconds": time.perf_counter() - writer.started,
+        "format_seconds": getattr(writer, "format_seconds", 0.0),
+        "write_seconds": getattr(writer, "write_seconds", 0.0),
+        "bytes": sum(os.path.getsize(find_file(path)) for path in paths if find_file(path)),
+    })
+
+
+# Resets the peak resident size Linux keeps for the process, so a pool
+# worker's peak covers one job instead of every job it ran. Not possible
+# everywhere; then the peak is the process's since it started.
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", 'w') as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def write_profile(profile_dir, label, profiler, snapshot):
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, label)
+    profiler.dump_stats(path + ".prof")
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(profile_lines)
+    pstats.Stats(profiler, stream=summary).sort_stats("tottime").print_stats(profile_lines)
+    with open(path + ".txt", 'w') as summary_file:
+        summary_file.write(summary.getvalue())
+    with open(path + ".memory.txt", 'w') as memory_file:
+        for stat in snapshot.statistics("lineno")[:profile_lines]:
+            memory_file.write(f"{stat}\n")
+
+
+# The metrics of a run, from the tables it wrote
+def run_metrics(seconds, cpu_seconds, written, peak, traced_peak=None):
+    rows = sum(table["rows"] for table in written)
+    format_seconds = sum(table["format_seconds"] for table in written)
+    write_seconds = sum(table["write_seconds"] for table in written)
+    metrics = {
+        "seconds": seconds,
+        "cpu_seconds": cpu_seconds,
+        "rows": rows,
+        "rows_per_second": rows / seconds if seconds else None,
+        "bytes": sum(table["bytes"] for table in written),
+        "peak_rss_bytes": peak,
+        "phases": {"generate": max(seconds - format_seconds - write_seconds, 0.0), "format": format_seconds,
+                   "write": write_seconds},
+        "tables": written,
+    }
+    if traced_peak is not None:
+        metrics["peak_traced_bytes"] = traced_peak
+    return metrics
+
+
+# Collect the metrics of the code run inside, into the dict it yields.
+# profile_dir turns on cProfile and tracemalloc.
+@contextmanager
+def collect(label, profile_dir=None):
+    del tables[:]
+    reset_peak_rss()
+    profiler = None
+    if profile_dir:
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+    metrics = {}
+    started, cpu_started = time.perf_counter(), time.process_time()
+    try:
+        yield metrics
+    finally:
+        seconds, cpu_seconds = time.perf_counter() - started, time.process_time() - cpu_started
+        traced_peak = None
+        if profiler:
+            profiler.disable()
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            write_profile(profile_dir, label, profiler, tracemalloc.take_snapshot())
+            tracemalloc.stop()
+        metrics.update(run_metrics(seconds, cpu_seconds, list(tables), peak_rss(), traced_peak))
+
+
+def environment():
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def write_metrics(path, report):
+    with open(path, 'w') as json_file:
+        json.dump(dict(report, created=time.strftime("%Y-%m-%dT%H:%M:%S"), environment=environment()), json_file,
+                  indent=2)
+
+
+def print_summary(label, metrics):
+    phases = metrics["phases"]
+    print(f"{label}: {metrics['rows']} rows in {metrics['seconds']:.2f}s "
+          f"(generate {phases['generate']:.2f}s, format {phases['format']:.2f}s, write {phases['write']:.2f}s), "
+          f"{metrics['bytes'] / 1e6:.1f} MB, peak {metrics['peak_rss_bytes'] / 1e6:.0f} MB")
+
+
+# Run a standalone generator's main code under collect(), for its --profile
+# and --metrics-json options
+@contextmanager
+def instrument(args, label):
+    if not args.profile and not args.metrics_json:
+        yield
+        return
+    with collect(label, args.profile) as metrics:
+        yield
+    print_summary(label, metrics)
+    if args.metrics_json:
+        write_metrics(args.metrics_json, {"command": label, "jobs": {label: metrics}})
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--profile", metavar="DIR", help="write cProfile and tracemalloc results to this directory")
+    parser.add_argument("--metrics-json", metavar="FILE",
+                        help="write timings, rows/s, memory and bytes as JSON (see metrics.py compare)")
+
+
+# The regressions of current against baseline, as messages: jobs that got
+# slower, bigger in memory or bigger on disk by more than tolerance
+def compare(baseline, current, tolerance=default_tolerance, min_seconds=default_min_seconds):
+    regressions, notes = [], []
+    for job, before in baseline["jobs"].items():
+        after = current["jobs"].get(job)
+        if after is None:
+            notes.append(f"{job}: not in the current run")
+            continue
+        if after["rows"] != before["rows"]:
+            notes.append(f"{job}: {before['rows']} rows before, {after['rows']} now")
+        if before.get("cached") or after.get("cached"):
+            notes.append(f"{job}: taken from the build cache, not compared")
+            continue
+        if before["seconds"] >= min_seconds and before["rows_per_second"] and after["rows_per_second"]:
+            ratio = after["rows_per_second"] / before["rows_per_second"]
+            if ratio < 1 - tolerance:
+                regressions.append(f"{job}: {ratio - 1:+.0%} rows/s ({before['rows_per_second']:,.0f} -> "
+                                   f"{after['rows_per_second']:,.0f})")
+        for key, name in [("peak_rss_bytes", "peak memory"), ("bytes", "bytes written")]:
+            if before.get(key) and after.get(key) and after[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{job}: {after[key] / before[key] - 1:+.0%} {name} "
+                                   f"({before[key] / 1e6:.1f} MB -> {after[key] / 1e6:.1f} MB)")
+    return regressions, notes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Work with the metrics the generators write with --metrics-json.")
+    actions = parser.add_subparsers(dest="action", required=True)
+    compare_parser = actions.add_parser("compare", help="fail if a run regressed against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=default_tolerance,
+                                help="allowed slowdown or growth, as a fraction")
+    compare_parser.add_argument("--min-seconds", type=float, default=default_min_seconds,
+                                help="skip the throughput check of jobs faster than this in the baseline")
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        regressions, notes = compare(json.load(baseline_file), json.load(current_file), args.tolerance,
+                                     args.min_seconds)
+    for note in notes:
+        print(f"note: {note}")
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        raise SystemExit(1)
+    print("No regressions")
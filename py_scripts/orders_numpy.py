@@ -0,0 +1,217 @@
+from collections import namedtuple
+from datetime import timedelta
+import hashlib
+import time
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError("the numpy engine needs numpy: pip install numpy") from error
+
+from . import create_order_items, demand
+
+# Vectorized version of create_orders.generate_order_data. Instead of drawing
+# every value with the random module, a whole week of orders is drawn as
+# arrays and each column is formatted in one go. It follows the same rules as
+# the python engine but draws from its own generator, so the two engines give
+# different (each reproducible) data for the same seed.
+
+statuses = ['Completed', 'Pending', 'Cancelled']
+completed = statuses.index('Completed')
+combo_types = create_order_items.combo_types[:-1]
+sizes = create_order_items.item_size
+
+# A dictionary-encoded column: integer codes into a list of labels. The labels
+# are formatted once and the codes just pick them.
+Categorical = namedtuple("Categorical", ["codes", "labels"])
+
+
+# a numpy generator seeded from the same seed strings the python engine uses
+def make_rng(seed, name):
+    if seed is None:
+        return np.random.default_rng()
+    digest = hashlib.sha256(f"{seed}:{name}".encode()).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+
+# turn one column into a list of strings in the writer's format
+def format_column(writer, column):
+    if isinstance(column, Categorical):
+        labels = np.array([writer.format_value(label) for label in column.labels], dtype=object)
+        return labels[column.codes].tolist()
+    if column.dtype == bool:
+        return np.where(column, writer.format_value(True), writer.format_value(False)).tolist()
+    return list(map(str, column.tolist()))
+
+
+# columnar writers (see columnar.py) take the arrays as they are
+def write_columns(writer, columns):
+    if hasattr(writer, "write_arrays"):
+        writer.write_arrays(columns)
+    else:
+        started = time.perf_counter()
+        formatted = [format_column(writer, column) for column in columns]
+        if hasattr(writer, "format_seconds"):
+            writer.format_seconds += time.perf_counter() - started
+        writer.write_formatted(formatted)
+
+
+# turn weights into the probabilities numpy's choice() wants
+def probabilities(weights):
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum()
+
+
+# Lookup tables for pricing: the combo price of every entree per combo type,
+# and for every a la carte item the sizes it comes in and their prices. Also
+# holds the demand model's distributions as arrays.
+class PriceTables:
+    def __init__(self, menu, discounts, demand_model):
+        combo_items, combo_weights, a_la_carte_items, a_la_carte_weights = (
+            create_order_items.build_menu_choices(menu, demand_model.popularity))
+        self.combo_p = probabilities(combo_weights)
+        self.a_la_carte_p = probabilities(a_la_carte_weights)
+        self.combo_mix_p = probabilities(demand_model.combo_mix)
+        self.minute_p = probabilities(demand_model.minute_weights)
+
+        self.combo_item_ids = np.array([item['menu_item_id'] for item in combo_items])
+        self.combo_prices = np.array([[item[create_order_items.combo_price_columns[combo]] for combo in combo_types]
+                                      for item in combo_items])
+        self.combo_quantities = np.array([create_order_items.combo_quantities[combo] for combo in combo_types])
+
+        self.item_ids = np.array([item['menu_item_id'] for item, _ in a_la_carte_items])
+        self.size_counts = np.array([len(item_sizes) for _, item_sizes in a_la_carte_items])
+        # sizes and prices per item, padded out to the three sizes
+        self.size_codes = np.zeros((len(a_la_carte_items), len(sizes)), dtype=np.int64)
+        self.size_prices = np.zeros((len(a_la_carte_items), len(sizes)))
+        for i, (item, item_sizes) in enumerate(a_la_carte_items):
+            for j, size in enumerate(item_sizes):
+                self.size_codes[i, j] = sizes.index(size)
+                self.size_prices[i, j] = item[create_order_items.size_price_columns[size]]
+
+        # promo discount per menu item id
+        self.discounts = np.zeros(max(item['menu_item_id'] for item in menu) + 1)
+        for menu_item_id, discount in discounts.items():
+            if menu_item_id < len(self.discounts):
+                self.discounts[menu_item_id] = discount
+
+
+# The shape of a week: orders per day, each order's type (a combo type, or
+# past the combo types for a la carte) and its number of lines. It comes from
+# its own generator so the order and item counts can be worked out without
+# drawing everything else (see count_orders).
+def draw_shape(rng, prices, day_factors, daily_orders):
+    low, high = daily_orders
+    counts = np.rint(rng.integers(low, high + 1, len(day_factors)) * day_factors).astype(np.int64)
+    n = int(counts.sum())
+    order_type = rng.choice(len(prices.combo_mix_p), n, p=prices.combo_mix_p)
+    # an order is a single combo line or 1 to 5 a la carte lines
+    lines = np.where(order_type < len(combo_types), 1, rng.integers(1, 6, n))
+    return counts, order_type, lines
+
+
+# Draw the contents of one block of days with the given shape. Returns the
+# order, order item and sales report columns.
+def draw_block(rng, prices, dates, shape, first_order_id, first_order_item_id, first_employee_id=1):
+    counts, order_type, lines = shape
+    n = len(order_type)
+    m = int(lines.sum())
+    day = np.repeat(np.arange(len(dates)), counts)
+
+    minute = rng.choice(len(prices.minute_p), n, p=prices.minute_p)
+    employee = rng.integers(first_employee_id, first_employee_id + 10, n)
+    status = rng.integers(0, len(statuses), n)
+
+    is_combo = order_type < len(combo_types)
+    order_index = np.repeat(np.arange(n), lines)
+    combo_line = is_combo[order_index]
+
+    combo_type = np.minimum(order_type, len(combo_types) - 1)[order_index]
+    combo_item = rng.choice(len(prices.combo_p), n, p=prices.combo_p)[order_index]
+    combo_size = rng.integers(0, len(sizes), n)[order_index]
+    combo_quantity = prices.combo_quantities[combo_type]
+
+    item = rng.choice(len(prices.a_la_carte_p), m, p=prices.a_la_carte_p)
+    size_slot = (rng.random(m) * prices.size_counts[item]).astype(np.int64)
+    quantity = rng.integers(1, 4, m)
+
+    menu_item_id = np.where(combo_line, prices.combo_item_ids[combo_item], prices.item_ids[item])
+    size = np.where(combo_line, combo_size, prices.size_codes[item, size_slot])
+    quantity = np.where(combo_line, combo_quantity, quantity)
+    unit_price = np.where(combo_line, prices.combo_prices[combo_item, combo_type], prices.size_prices[item, size_slot])
+    line_price = np.maximum(unit_price * quantity - prices.discounts[menu_item_id], 0)
+
+    order_price = np.round(np.bincount(order_index, weights=line_price, minlength=n), 2)
+    order_id = np.arange(first_order_id, first_order_id + n)
+    date = Categorical(day, dates)
+
+    orders = [order_id, employee, date, Categorical(minute, demand.times_of_day), order_price,
+              Categorical(status, statuses)]
+    order_items = [np.arange(first_order_item_id, first_order_item_id + m), order_id[order_index], menu_item_id,
+                   combo_line, Categorical(np.where(combo_line, combo_type, len(combo_types)),
+                                           combo_types + ['N/A']),
+                   Categorical(size, sizes), quantity]
+    sales_report = [order_id, order_id, np.where(status == completed, order_price, 0.0), date]
+    return orders, order_items, sales_report
+
+
+# (dates, volume factor per day) for every week. volume scales the whole
+# period, e.g. for a busier store. num_days, if given, replaces num_weeks and
+# the last block is cut short.
+def weeks(start_date, num_weeks, demand_model, volume=1.0, num_days=None):
+    num_days = num_days if num_days is not None else num_weeks * 7
+    for week_start in range(0, num_days, 7):
+        days = [start_date + timedelta(days=day) for day in range(week_start, min(week_start + 7, num_days))]
+        yield ([day.strftime('%Y-%m-%d') for day in days],
+               np.array([demand_model.day_factor(day) for day in days]) * volume)
+
+
+# Number of orders and order items write_order_data would write with the same
+# arguments, without drawing or formatting any of the rows.
+def count_orders(start_date, num_weeks, menu, demand_model, seed=None, name="orders", volume=1.0, num_days=None):
+    rng = make_rng(seed, f"{name}:shape")
+    prices = PriceTables(menu, {}, demand_model)
+    orders = items = 0
+    for _, day_factors in weeks(start_date, num_weeks, demand_model, volume, num_days):
+        _, order_type, lines = draw_shape(rng, prices, day_factors, demand_model.daily_orders)
+        orders += len(order_type)
+        items += int(lines.sum())
+    return orders, items
+
+
+# add the servings of every menu item sold per day to usage
+def add_usage(usage, dates, line_day, menu_item_id, quantity):
+    width = int(menu_item_id.max(initial=0)) + 1
+    totals = np.bincount(line_day * width + menu_item_id, weights=quantity, minlength=len(dates) * width)
+    for date, day_totals in zip(dates, totals.reshape(len(dates), width)):
+        for item in np.flatnonzero(day_totals):
+            usage[date][int(item)] += int(day_totals[item])
+
+
+# Generate every order a week at a time straight into the three writers and
+# return the number of orders and order items written. name picks the random
+# streams, so differently named runs (e.g. stores) get different data. If
+# usage is given ({date: Counter}), the servings sold are added to it.
+def write_order_data(writers, start_date, num_weeks, menu, discounts, demand_model, seed=None, name="orders",
+                     first_order_id=1, first_order_item_id=1, first_employee_id=1, volume=1.0, usage=None,
+                     num_days=None):
+    orders_writer, order_items_writer, sales_report_writer = writers
+    shape_rng = make_rng(seed, f"{name}:shape")
+    rng = make_rng(seed, name)
+    prices = PriceTables(menu, discounts, demand_model)
+
+    order_id = first_order_id
+    order_item_id = first_order_item_id
+    for dates, day_factors in weeks(start_date, num_weeks, demand_model, volume, num_days):
+        shape = draw_shape(shape_rng, prices, day_factors, demand_model.daily_orders)
+        orders, order_items, sales_report = draw_block(rng, prices, dates, shape, order_id, order_item_id,
+                                                       first_employee_id)
+        write_columns(orders_writer, orders)
+        write_columns(order_items_writer, order_items)
+        write_columns(sales_report_writer, sales_report)
+        if usage is not None:
+            line_day = orders[2].codes[order_items[1] - order_id]
+            add_usage(usage, dates, line_day, order_items[2], order_items[6])
+        order_id += len(shape[1])
+        order_item_id += int(shape[2].sum())
+    return order_id - first_order_id, order_item_id - first_order_item_id
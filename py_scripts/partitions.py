@@ -0,0 +1,182 @@
+from bisect import bisect_right
+import os
+import re
+import time
+
+from . import create_order_items, create_sales_report
+from .compression import open_output
+from .writers import open_table, table_ddl, value_formatters
+
+# Monthly range partitioning of the order tables, for create_orders with
+# --partition-by-month:
+#
+#   orders        PARTITION BY RANGE (Order_Date), one partition per month
+#   sales_report  PARTITION BY RANGE (Sales_Report_Date), the same months
+#   order_items   PARTITION BY RANGE (order_id), split at the first order id
+#                 of every month, so an order's items are in the partition of
+#                 the same month as the order
+#
+# Reports that filter on a date range only scan the months in it, and an old
+# month can be detached or dropped by itself. Every table also gets a DEFAULT
+# partition: db.js inserts an order without a date and sets it afterwards,
+# and orders past the generated months land there too.
+#
+# Postgres only allows a primary key on a partitioned table if it includes the
+# partition key, and Order_Date is NULL until the app fills it in. So every
+# partition has its own primary key instead, ids are only unique within a
+# partition (the generators and db.js never reuse one anyway), and the
+# foreign keys that reference orders are left out.
+#
+# Rows go straight into their partition's table, one file per table and month
+# (orders.2023-09.sql and so on), so the months can be loaded in parallel once
+# the schema is in. <table>.schema.sql holds the schema and <table>.sql loads
+# the schema and then every month.
+
+# table: (table name in the DDL, partition key, primary key)
+partitioned_tables = {
+    "orders": ("Orders", "Order_Date", "Order_ID"),
+    "order_items": ("order_items", "order_id", "order_item_id"),
+    "sales_report": ("Sales_Report", "Sales_Report_Date", "Sales_Report_ID"),
+}
+
+# the column of each table's rows that picks the partition
+key_columns = {"orders": 2, "order_items": 1, "sales_report": 3}
+
+
+# The partitioned version of a table's CREATE TABLE: no primary key and no
+# foreign key to orders (see above)
+def partitioned_ddl(table, create_table):
+    _, key, _ = partitioned_tables[table]
+    ddl = re.sub(r" PRIMARY KEY", "", create_table)
+    ddl = re.sub(r",\n\s*FOREIGN KEY \(\w+\) REFERENCES Orders\(\w+\)", "", ddl, flags=re.IGNORECASE)
+    return ddl.replace("\n);", f"\n) PARTITION BY RANGE ({key});")
+
+
+# '2023-09-17' or "'2023-09-17'" (as formatted for INSERT) -> '2023-09'
+def month_of(value):
+    return value.strip("'")[:7]
+
+
+def next_month(month):
+    year, month = map(int, month.split("-"))
+    return f"{year + month // 12}-{month % 12 + 1:02d}"
+
+
+# every month from the one of start_date through the one of end_date
+def months_between(start_date, end_date):
+    month, last = start_date.strftime('%Y-%m'), end_date.strftime('%Y-%m')
+    months = [month]
+    while month < last:
+        month = next_month(month)
+        months.append(month)
+    return months
+
+
+def partition_name(table, month):
+    return f"{table}_{month.replace('-', '_')}"
+
+
+def partition_file(output_dir, table, month):
+    return os.path.join(output_dir, f"{table}.{month}.sql")
+
+
+# Stands in for a table's writer and sends every row to the writer of its
+# month's partition, which is opened the first time a row goes there. Rows
+# come in date order, so whole runs of rows go to the same writer. Keeps the
+# first and last id (the first column) written to every month.
+class PartitionedWriter:
+    def __init__(self, stack, output_dir, table, columns, fmt, batch_size, month_of_key):
+        self.stack = stack
+        self.output_dir = output_dir
+        self.table = table
+        self.columns = columns
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.month_of_key = month_of_key
+        self.format_value = value_formatters[fmt]
+        self.key_column = key_columns[table]
+        self.writers = {}
+        self.id_ranges = {}
+        # the months in the order they were opened, and their first ids
+        self.months = []
+        self.first_ids = []
+        self.rows_written = 0
+        self.started = time.perf_counter()
+
+    def writer(self, month, first_id, last_id):
+        if month not in self.writers:
+            self.writers[month] = self.stack.enter_context(open_table(
+                partition_file(self.output_dir, self.table, month), partition_name(self.table, month),
+                self.columns, "", self.fmt, self.batch_size))
+            self.id_ranges[month] = [int(first_id), int(last_id)]
+            self.months.append(month)
+            self.first_ids.append(int(first_id))
+        self.id_ranges[month][1] = int(last_id)
+        return self.writers[month]
+
+    def write(self, row):
+        self.writer(self.month_of_key(row[self.key_column]), row[0], row[0]).write(row)
+        self.rows_written += 1
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def write_formatted(self, columns):
+        keys = [self.month_of_key(key) for key in columns[self.key_column]]
+        start = 0
+        for end in range(1, len(keys) + 1):
+            if end == len(keys) or keys[end] != keys[start]:
+                self.writer(keys[start], columns[0][start], columns[0][end - 1]).write_formatted(
+                    [column[start:end] for column in columns])
+                start = end
+        self.rows_written += len(keys)
+
+
+# Writers for orders, order_items and sales_report. order_items rows are
+# routed by their order id to the month that order went to, so orders have to
+# be written before their items, as both order engines do.
+def open_partitioned_tables(stack, output_dir, fmt, batch_size, order_columns):
+    orders = PartitionedWriter(stack, output_dir, "orders", order_columns, fmt, batch_size, month_of)
+
+    def month_of_order(order_id):
+        return orders.months[bisect_right(orders.first_ids, int(order_id)) - 1]
+
+    order_items = PartitionedWriter(stack, output_dir, "order_items", create_order_items.order_item_columns, fmt,
+                                    batch_size, month_of_order)
+    sales_report = PartitionedWriter(stack, output_dir, "sales_report", create_sales_report.sales_columns, fmt,
+                                     batch_size, month_of)
+    return orders, order_items, sales_report
+
+
+def partition_ddl(table, month, bounds):
+    name, _, primary_key = partitioned_tables[table]
+    return (f"CREATE TABLE {partition_name(table, month)} PARTITION OF {name} (PRIMARY KEY ({primary_key})) "
+            f"FOR VALUES FROM ({bounds[0]}) TO ({bounds[1]});\n")
+
+
+# Write <table>.schema.sql and <table>.sql for every table once the rows are
+# in. orders and sales_report get a partition for every month from
+# start_date through end_date, order_items one for every month with orders.
+def write_table_files(output_dir, writers, create_tables, start_date, end_date):
+    months = months_between(start_date, end_date)
+    for writer in writers:
+        table = writer.table
+        name, _, primary_key = partitioned_tables[table]
+        with open_output(os.path.join(output_dir, f"{table}.schema.sql")) as schema_file:
+            schema_file.write(partitioned_ddl(table, table_ddl(create_tables[table])))
+            if table == "order_items":
+                ranges = writers[0].id_ranges
+                for month in ranges:
+                    schema_file.write(partition_ddl(table, month, (ranges[month][0], ranges[month][1] + 1)))
+            else:
+                for month in months:
+                    schema_file.write(partition_ddl(table, month, (f"'{month}-01'", f"'{next_month(month)}-01'")))
+            schema_file.write(f"CREATE TABLE {table}_default PARTITION OF {name} (PRIMARY KEY ({primary_key})) "
+                              "DEFAULT;\n")
+
+        with open_output(os.path.join(output_dir, f"{table}.sql")) as table_file:
+            table_file.write(f"\\ir {table}.schema.sql\n")
+            for month in writer.writers:
+                table_file.write(f"\\ir {os.path.basename(partition_file(output_dir, table, month))}\n")
+
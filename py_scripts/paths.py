@@ -0,0 +1,15 @@
+import os
+
+# generated SQL goes to sql_files/ and the hand-maintained inputs live in
+# txt_files/, both at the root of the repository
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sql_files_dir = os.path.join(repo_root, "sql_files")
+txt_files_dir = os.path.join(repo_root, "txt_files")
+
+
+def sql_file(table, output_dir=sql_files_dir):
+    return os.path.join(output_dir, f"{table}.sql")
+
+
+def txt_file(name):
+    return os.path.join(txt_files_dir, name)
@@ -0,0 +1,46 @@
+import os
+import subprocess
+
+# db.js reads its connection settings from DB_* variables; map them onto the
+# libpq variables so psql connects to the same database
+env_mapping = [
+    ("DB_HOST", "PGHOST"),
+    ("DB_USER", "PGUSER"),
+    ("DB_PASSWORD", "PGPASSWORD"),
+    ("DB_NAME", "PGDATABASE"),
+    ("DB_PORT", "PGPORT"),
+]
+
+
+def psql_env(database=None):
+    env = dict(os.environ)
+    for db_var, pg_var in env_mapping:
+        if db_var in os.environ:
+            env.setdefault(pg_var, os.environ[db_var])
+    if database:
+        env["PGDATABASE"] = database
+    return env
+
+
+# run psql and stop on the first error
+def run_psql(args, database=None, cwd=None, input=None):
+    return subprocess.run(["psql", "-X", "-q", "-v", "ON_ERROR_STOP=1", *args],
+                          env=psql_env(database), cwd=cwd, input=input,
+                          check=True, capture_output=True, text=True)
+
+
+def run_sql_file(path, database=None):
+    # run from the file's directory so \copy can find its CSV files
+    directory, name = os.path.split(os.path.abspath(path))
+    return run_psql(["-f", name], database=database, cwd=directory)
+
+
+def recreate_database(name):
+    run_psql(["-c", f"DROP DATABASE IF EXISTS {name}", "-c", f"CREATE DATABASE {name}"], database="postgres")
+
+
+# the same settings as keyword arguments for a driver such as asyncpg
+def connection_settings(database=None):
+    env = psql_env(database)
+    return {"host": env.get("PGHOST"), "port": int(env["PGPORT"]) if env.get("PGPORT") else None,
+            "user": env.get("PGUSER"), "password": env.get("PGPASSWORD"), "database": env.get("PGDATABASE")}
@@ -0,0 +1,204 @@
+from datetime import date
+import argparse
+import time
+
+from . import db_queries
+from .pg import run_psql
+
+# Pre-aggregated sales tables for the manager reports, kept up to date
+# incrementally:
+#
+#   rollup_hourly_sales           completed orders and revenue per day and hour
+#   rollup_daily_menu_items       order item lines and servings per day and menu item
+#   rollup_daily_inventory_usage  servings used per day and inventory item
+#
+# Only completed orders count, like in the reports. Each run adds the orders
+# past the watermark (the highest order_id already rolled up) and moves the
+# watermark on. Only whole days before --through (today by default) are
+# rolled up, so orders are not counted while their status can still change.
+# The watermark stops at the first order on or after that day, which relies on
+# order ids growing with time, as db.js hands them out. If orders of a day
+# that was already rolled up change later, rebuild with --backfill.
+
+rollup_tables = ["rollup_hourly_sales", "rollup_daily_menu_items", "rollup_daily_inventory_usage"]
+
+setup_sql = """
+CREATE TABLE IF NOT EXISTS rollup_hourly_sales (
+    sales_date DATE,
+    sales_hour INT,
+    order_count INT,
+    revenue NUMERIC(12, 2),
+    PRIMARY KEY (sales_date, sales_hour)
+);
+CREATE TABLE IF NOT EXISTS rollup_daily_menu_items (
+    sales_date DATE,
+    menu_item_id INT,
+    item_count INT,
+    quantity INT,
+    PRIMARY KEY (sales_date, menu_item_id)
+);
+CREATE TABLE IF NOT EXISTS rollup_daily_inventory_usage (
+    sales_date DATE,
+    inventory_item_id INT,
+    total_used INT,
+    PRIMARY KEY (sales_date, inventory_item_id)
+);
+CREATE TABLE IF NOT EXISTS rollup_watermark (
+    rollup_name VARCHAR(50) PRIMARY KEY,
+    last_order_id INT,
+    updated_at TIMESTAMP
+);
+INSERT INTO rollup_watermark VALUES ('sales', 0, NULL) ON CONFLICT DO NOTHING;
+-- finding the items of the new orders must not scan all of order_items
+CREATE INDEX IF NOT EXISTS order_items_order_id_idx ON order_items (order_id);
+"""
+
+backfill_sql = """
+TRUNCATE rollup_hourly_sales, rollup_daily_menu_items, rollup_daily_inventory_usage;
+UPDATE rollup_watermark SET last_order_id = 0 WHERE rollup_name = 'sales';
+"""
+
+# one increment, run with the psql variable through set to the first day not
+# to roll up yet
+increment_sql = """
+BEGIN;
+-- one rollup job at a time
+SELECT last_order_id FROM rollup_watermark WHERE rollup_name = 'sales' FOR UPDATE;
+
+CREATE TEMP TABLE rollup_range ON COMMIT DROP AS
+SELECT w.last_order_id AS low,
+       GREATEST(w.last_order_id, COALESCE(
+           (SELECT min(order_id) - 1 FROM orders
+            WHERE order_id > w.last_order_id AND (order_date IS NULL OR order_date >= :'through')),
+           (SELECT max(order_id) FROM orders),
+           w.last_order_id)) AS high
+FROM rollup_watermark w
+WHERE w.rollup_name = 'sales';
+
+CREATE TEMP TABLE new_orders ON COMMIT DROP AS
+SELECT o.order_id, o.order_date, o.order_time, o.order_price
+FROM orders o, rollup_range r
+WHERE o.order_id > r.low AND o.order_id <= r.high
+  AND o.order_status = 'Completed';
+
+INSERT INTO rollup_hourly_sales (sales_date, sales_hour, order_count, revenue)
+SELECT order_date, EXTRACT(HOUR FROM order_time), COUNT(*), SUM(order_price)
+FROM new_orders
+GROUP BY 1, 2
+ON CONFLICT (sales_date, sales_hour) DO UPDATE
+SET order_count = rollup_hourly_sales.order_count + EXCLUDED.order_count,
+    revenue = rollup_hourly_sales.revenue + EXCLUDED.revenue;
+
+INSERT INTO rollup_daily_menu_items (sales_date, menu_item_id, item_count, quantity)
+SELECT n.order_date, oi.menu_item_id, COUNT(*), SUM(oi.recorded_quantity)
+FROM new_orders n
+JOIN order_items oi ON oi.order_id = n.order_id
+GROUP BY 1, 2
+ON CONFLICT (sales_date, menu_item_id) DO UPDATE
+SET item_count = rollup_daily_menu_items.item_count + EXCLUDED.item_count,
+    quantity = rollup_daily_menu_items.quantity + EXCLUDED.quantity;
+
+INSERT INTO rollup_daily_inventory_usage (sales_date, inventory_item_id, total_used)
+SELECT n.order_date, ig.inventory_item_id, SUM(oi.recorded_quantity)
+FROM new_orders n
+JOIN order_items oi ON oi.order_id = n.order_id
+JOIN ingredients ig ON ig.menu_item_id = oi.menu_item_id
+GROUP BY 1, 2
+ON CONFLICT (sales_date, inventory_item_id) DO UPDATE
+SET total_used = rollup_daily_inventory_usage.total_used + EXCLUDED.total_used;
+
+UPDATE rollup_watermark w
+SET last_order_id = r.high, updated_at = now()
+FROM rollup_range r
+WHERE w.rollup_name = 'sales';
+
+SELECT r.low, r.high, (SELECT COUNT(*) FROM new_orders) FROM rollup_range r;
+COMMIT;
+"""
+
+# The db.js reports answered from the rollups, with the same parameters and
+# columns as the originals
+report_queries = {
+    "getHourlySales": """
+      SELECT sales_hour AS hour, revenue AS total_sales
+      FROM rollup_hourly_sales
+      WHERE sales_date = $1
+      ORDER BY hour ASC
+    """,
+    "getSalesReport": """
+      SELECT mi.menu_item_name, mi.menu_item_type, SUM(r.item_count) AS item_count
+        FROM rollup_daily_menu_items r
+        JOIN menu_items mi ON mi.menu_item_id = r.menu_item_id
+        WHERE r.sales_date BETWEEN $1 AND $2
+        GROUP BY mi.menu_item_name, mi.menu_item_type
+        ORDER BY
+          CASE mi.menu_item_type
+            WHEN 'entree' THEN 1
+            WHEN 'side' THEN 2
+            WHEN 'appetizer' THEN 3
+            WHEN 'drink' THEN 4
+            WHEN 'dessert' THEN 5
+            ELSE 6
+          END
+    """,
+    "getProductUsage": """
+      SELECT iv.inventory_item_name, SUM(r.total_used) AS total_used
+      FROM rollup_daily_inventory_usage r
+      JOIN inventory iv ON r.inventory_item_id = iv.inventory_id
+      WHERE r.sales_date BETWEEN $1 AND $2
+      GROUP BY iv.inventory_item_name
+      ORDER BY iv.inventory_item_name
+    """,
+}
+
+
+# Bring the rollups up to date (or rebuild them with backfill) and return the
+# order id range that was processed and the number of completed orders in it
+def run_rollup(database=None, through=None, backfill=False):
+    through = through or date.today().isoformat()
+    script = setup_sql + (backfill_sql if backfill else "") + increment_sql
+    result = run_psql(["-A", "-t", "-F", "\t", "-v", f"through={through}"], database, input=script)
+    low, high, orders = result.stdout.split()[-3:]
+    return int(low), int(high), int(orders)
+
+
+def query_rows(sql, database):
+    return sorted(run_psql(["-A", "-t", "-c", sql], database).stdout.splitlines())
+
+
+# compare the rollup reports with the db.js ones over a date range and return
+# the names of the reports that differ
+def verify(database, start_date, end_date):
+    source = db_queries.read_db_js()
+    mismatched = []
+    for report, sql in report_queries.items():
+        params = [start_date] if report == "getHourlySales" else [start_date, end_date]
+        raw = db_queries.bind(db_queries.function_query(report, source), params)
+        if query_rows(raw, database) != query_rows(db_queries.bind(sql, params), database):
+            mismatched.append(report)
+    return mismatched
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the sales rollup tables.")
+    parser.add_argument("--database", help="defaults to DB_NAME / PGDATABASE")
+    parser.add_argument("--through", help="roll up orders before this day (default: today)")
+    parser.add_argument("--backfill", action="store_true", help="rebuild the rollups from all orders")
+    parser.add_argument("--verify", nargs=2, metavar=("START", "END"),
+                        help="check the rollup reports against the db.js queries for a date range")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    low, high, orders = run_rollup(args.database, args.through, args.backfill)
+    if high > low:
+        print(f"Rolled up {orders} completed orders (order_id {low + 1} to {high}) "
+              f"in {time.perf_counter() - started:.2f}s")
+    else:
+        print(f"No new orders to roll up (watermark at order_id {high})")
+
+    if args.verify:
+        mismatched = verify(args.database, *args.verify)
+        print(f"Rollups differ from the db.js reports: {', '.join(mismatched)}" if mismatched
+              else "Rollups match the db.js reports")
+        if mismatched:
+            raise SystemExit(1)
@@ -0,0 +1,330 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import importlib
+import json
+import os
+import random
+import re
+import time
+
+from . import (build_cache, compression, create_allergens, create_customers, create_employees, create_ingredients,
+               create_inventory, create_inventory_report, create_menu_item_allergens, create_menu_items,
+               create_order_items, create_orders, create_promos, create_sales_report, demand, load_plan, metrics,
+               partitions)
+from .paths import sql_file, sql_files_dir
+from .writers import DEFAULT_BATCH_SIZE, DEFAULT_FORMAT, FORMATS, configure_tables
+
+# every table and the module holding its CREATE TABLE
+table_modules = {
+    "allergens": create_allergens,
+    "customers": create_customers,
+    "employees": create_employees,
+    "ingredients": create_ingredients,
+    "inventory": create_inventory,
+    "inventory_report": create_inventory_report,
+    "menu_item_allergens": create_menu_item_allergens,
+    "menu_items": create_menu_items,
+    "order_items": create_order_items,
+    "orders": create_orders,
+    "promos": create_promos,
+    "sales_report": create_sales_report,
+}
+
+# the generator jobs and the tables each one writes; create_orders writes
+# orders, order_items and sales_report in a single pass
+jobs = {table: [table] for table in table_modules if table not in create_orders.order_tables}
+jobs["orders"] = list(create_orders.order_tables)
+
+# jobs that read another job's output: the inventory report is simulated from
+# the menu item usage the orders job writes
+job_inputs = {"inventory_report": ["orders"]}
+
+# files a job writes besides its tables' files
+job_outputs = {"orders": [create_orders.usage_file]}
+
+# the options each job's output depends on, for the build cache
+common_options = ["format", "batch_size", "seed", "compress", "compress_level", "inline_constraints"]
+job_options = {"orders": ["weeks", "engine", "daily_orders", "partition_by_month"], "inventory_report": ["weeks"],
+               "customers": ["customers"]}
+
+
+# the tables a table references, read from the REFERENCES clauses of its DDL
+def foreign_keys(module):
+    return sorted({table.lower() for table in re.findall(r"REFERENCES\s+(\w+)", module.create_table)})
+
+
+table_dependencies = {table: foreign_keys(module) for table, module in table_modules.items()}
+
+
+# Sort tables so every table comes after the tables it references. Tables at
+# the same depth are sorted by name so the order is stable.
+def load_order(tables):
+    depth = {}
+
+    def table_depth(table):
+        if table not in depth:
+            depth[table] = 1 + max((table_depth(dep) for dep in table_dependencies[table]), default=-1)
+        return depth[table]
+
+    return sorted(tables, key=lambda table: (table_depth(table), table))
+
+
+# the jobs a job depends on: the ones writing the tables its tables reference,
+# and the ones whose output it reads
+def job_dependencies(job):
+    tables = {dep for table in jobs[job] for dep in table_dependencies[table]}
+    upstream = {other for other, other_tables in jobs.items() if tables & set(other_tables)}
+    return sorted((upstream | set(job_inputs.get(job, []))) - {job})
+
+
+# The input files a job reads: the input_file of its module and of the
+# modules it imports, and the demand model if it uses one
+def job_input_files(job, options):
+    modules, _ = build_cache.module_closure(table_modules[job].__name__.rsplit(".", 1)[1])
+    files = []
+    for name in modules:
+        module = importlib.import_module(f".{name}", __package__)
+        if hasattr(module, "input_file"):
+            files.append(module.input_file)
+    if "demand" in modules:
+        files.append(options["demand"])
+    return files
+
+
+# the build cache fingerprint of every job, upstream ones first
+def job_fingerprints(options):
+    fingerprints = {}
+
+    def job_fingerprint(job):
+        if job not in fingerprints:
+            fingerprints[job] = build_cache.fingerprint(
+                table_modules[job].__name__.rsplit(".", 1)[1], job_input_files(job, options),
+                {option: options[option] for option in common_options + job_options.get(job, [])},
+                {dep: job_fingerprint(dep) for dep in job_dependencies(job)})
+        return fingerprints[job]
+
+    for job in jobs:
+        job_fingerprint(job)
+    return fingerprints
+
+
+# the names of the files in output_dir a job wrote: <table>.sql and whatever
+# else starts with a table's name (CSV files, partitions, part files)
+def job_files(job, output_dir):
+    prefixes = tuple(f"{table}." for table in jobs[job])
+    return [name for name in os.listdir(output_dir)
+            if (name.startswith(prefixes) or name in job_outputs.get(job, []))
+            and os.path.isfile(os.path.join(output_dir, name))]
+
+
+# Runs in a worker process and returns the number of rows written per table.
+def run_generator(job, output_dir, options):
+    seed = options["seed"]
+    compression.configure(options["compress"], options["compress_level"], options["compress_threads"])
+    configure_tables(bare=not options["inline_constraints"])
+    # seed per job so the result doesn't depend on scheduling
+    random.seed(f"{seed}:{job}")
+    module = table_modules[job]
+    if hasattr(module, "fake"):
+        module.fake.seed_instance(f"{seed}:{job}")
+
+    fmt, batch_size = options["format"], options["batch_size"]
+    if job == "orders":
+        return module.write_order_data(output_dir, module.start_date, options["weeks"], fmt, batch_size, seed,
+                                       engine=options["engine"], demand_file=options["demand"],
+                                       daily_orders=options["daily_orders"],
+                                       partition_by_month=options["partition_by_month"])
+    if job == "inventory_report":
+        return {job: module.write_inventory_report(sql_file(job, output_dir), seed=seed, num_weeks=options["weeks"],
+                                                   fmt=fmt, batch_size=batch_size)}
+    if job == "customers":
+        return {job: module.write_customers(sql_file(job, output_dir), fmt, batch_size, options["customers"])}
+    rows = getattr(module, f"write_{job}")(sql_file(job, output_dir), fmt=fmt, batch_size=batch_size)
+    return {job: rows}
+
+
+# run_generator, and its metrics (see metrics.py)
+def instrumented_generator(job, output_dir, options, profile_dir=None):
+    with metrics.collect(job, profile_dir) as job_metrics:
+        rows = run_generator(job, output_dir, options)
+    return rows, job_metrics
+
+
+# Generate the tables on a process pool. Jobs start as soon as the jobs they
+# read from (job_inputs) are done; everything else runs at once, since the
+# order generator prices orders from the same menu file and the same seeded
+# promos rather than reading them. The foreign-key graph only decides the
+# load order.
+#
+# With a build cache, a job whose fingerprint is in the cache has its files
+# copied from there instead, and the files of every job that runs are stored
+# in it. The files a job wrote before are removed first, so none of them (an
+# old partition, say) are left behind or stored with the new ones.
+#
+# job_metrics, if given, gets the metrics of every job, and profile_dir turns
+# on profiling.
+def generate_tables(tables, output_dir, options, workers=None, cache=None, profile_dir=None, job_metrics=None):
+    selected = [job for job, job_tables in jobs.items() if set(job_tables) & set(tables)]
+    fingerprints = job_fingerprints(options) if cache else {}
+    # a job whose input isn't selected reads that input from output_dir
+    waiting = {job: {dep for dep in job_inputs.get(job, []) if dep in selected} for job in selected}
+    rows = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while waiting or running:
+            for job in [job for job, deps in waiting.items() if not deps]:
+                del waiting[job]
+                for name in job_files(job, output_dir):
+                    os.remove(os.path.join(output_dir, name))
+                entry = cache.get(fingerprints[job]) if cache else None
+                if entry is not None:
+                    rows.update(cache.restore(fingerprints[job], entry, output_dir))
+                    if job_metrics is not None:
+                        job_metrics[job] = {"cached": True, "rows": sum(entry["rows"].values())}
+                    for deps in waiting.values():
+                        deps.discard(job)
+                    continue
+                running[pool.submit(instrumented_generator, job, output_dir, options, profile_dir)] = job
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished = running.pop(future)
+                job_rows, finished_metrics = future.result()
+                rows.update(job_rows)
+                if job_metrics is not None:
+                    job_metrics[finished] = finished_metrics
+                if cache:
+                    cache.store(fingerprints[finished], finished, output_dir, job_files(finished, output_dir),
+                                job_rows, finished_metrics["seconds"])
+                for deps in waiting.values():
+                    deps.discard(finished)
+    return rows
+
+
+# Write load.sql, which loads every table in dependency order, and
+# manifest.json, which records what was generated. Unless the tables were
+# written with their keys, load.sql follows the staged load plan (see
+# load_plan.py) and the plan's files are written too. command is the
+# py_scripts command load.sql says wrote it.
+def write_manifest(output_dir, rows, options, command="seed"):
+    ordered = load_order(rows)
+    staged = not options.get("inline_constraints")
+    if staged:
+        partitioned = set(partitions.partitioned_tables) if options.get("partition_by_month") else set()
+        stages = load_plan.plan_stages(ordered, rows, {table: module.create_table for table, module
+                                                       in table_modules.items()}, partitioned)
+        stage_files = load_plan.write_plan(output_dir, stages)
+    else:
+        load_plan.remove_plan(output_dir)
+    with open(os.path.join(output_dir, "load.sql"), 'w') as load_file:
+        load_file.write(f"-- Generated by python -m py_scripts {command}.\n")
+        if options.get("compress"):
+            load_file.write("-- The table files are compressed: python -m py_scripts load <this directory>\n")
+        else:
+            load_file.write("-- Run from this directory so \\copy can find the CSV files: psql -f load.sql\n")
+        if staged:
+            load_file.write(f"-- The tables are created without keys, which {', '.join(stage_files)} add once the rows "
+                            f"are in.\n-- python -m py_scripts load <this directory> --jobs N runs every stage in "
+                            f"parallel.\n")
+            for line in load_plan.table_settings:
+                load_file.write(f"{line}\n")
+        for table in ordered:
+            load_file.write(f"\\ir {table}.sql\n")
+        if staged:
+            for name in stage_files:
+                load_file.write(f"\\ir {name}\n")
+
+    manifest = {
+        "format": options["format"],
+        "seed": options["seed"],
+        "engine": options["engine"],
+        "demand": options["demand"],
+        "partition_by_month": options.get("partition_by_month", False),
+        "compress": options.get("compress"),
+        "staged_load": not options.get("inline_constraints"),
+        "tables": [{"table": table, "file": f"{table}.sql", "rows": rows[table],
+                    "depends_on": table_dependencies[table]} for table in ordered],
+    }
+    with open(os.path.join(output_dir, "manifest.json"), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+
+def add_arguments(parser):
+    parser.add_argument("--output-dir", default=sql_files_dir)
+    parser.add_argument("--format", choices=FORMATS, default=DEFAULT_FORMAT)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--tables", nargs="+", choices=sorted(table_modules), default=sorted(table_modules),
+                        help="only generate these tables (orders, order_items and sales_report come together)")
+    parser.add_argument("--weeks", type=int, default=create_orders.num_weeks)
+    parser.add_argument("--customers", type=int, default=create_customers.num_customers,
+                        help="number of customers (create_customers --workers writes millions faster)")
+    parser.add_argument("--engine", choices=create_orders.engines, default="python",
+                        help="how orders are drawn; numpy is much faster for large datasets")
+    parser.add_argument("--demand", default=demand.default_config, help="demand model config (JSON)")
+    parser.add_argument("--daily-orders", type=int, nargs=2, metavar=("MIN", "MAX"),
+                        help="override the demand model's orders per ordinary day")
+    parser.add_argument("--partition-by-month", action="store_true",
+                        help="write orders, order_items and sales_report as monthly range partitions")
+    parser.add_argument("--inline-constraints", action="store_true",
+                        help="write the keys into the CREATE TABLEs instead of a staged load plan (see load_plan.py)")
+    parser.add_argument("--seed", help="make the output reproducible (a random seed is picked otherwise)")
+    compression.add_compression_arguments(parser)
+    metrics.add_metrics_arguments(parser)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="size of the process pool")
+    parser.add_argument("--cache", nargs="?", const=build_cache.default_cache_dir, metavar="DIR",
+                        help=f"reuse the tables whose inputs haven't changed from a build cache "
+                             f"(default DIR: {os.path.relpath(build_cache.default_cache_dir)})")
+    parser.add_argument("--cache-max-size", metavar="SIZE",
+                        help="after the run, evict the least recently used cache entries down to this size, "
+                             "e.g. 2G")
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    # every run is seeded, so the promos table and the order prices agree
+    seed = args.seed if args.seed is not None else str(random.randrange(2 ** 32))
+    if args.customers > create_customers.phone_space:
+        raise SystemExit(f"at most {create_customers.phone_space} customers have distinct phone numbers")
+    options = {"format": args.format, "batch_size": args.batch_size, "weeks": args.weeks, "seed": seed,
+               "customers": args.customers,
+               "engine": args.engine, "demand": os.path.abspath(args.demand), "daily_orders": args.daily_orders,
+               "partition_by_month": args.partition_by_month, "compress": args.compress,
+               "compress_level": args.compress_level, "compress_threads": args.compress_threads,
+               "inline_constraints": args.inline_constraints}
+    compression.configure(args.compress, args.compress_level, args.compress_threads)
+    configure_tables(bare=not args.inline_constraints)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    if args.cache_max_size and not args.cache:
+        raise SystemExit("--cache-max-size needs --cache")
+    cache = build_cache.BuildCache(args.cache) if args.cache else None
+
+    started = time.perf_counter()
+    job_metrics = {}
+    rows = generate_tables(args.tables, args.output_dir, options, args.workers, cache, args.profile, job_metrics)
+    generated = time.perf_counter()
+    write_manifest(args.output_dir, rows, options)
+    phases = {"generate": generated - started, "manifest": time.perf_counter() - generated}
+
+    print(f"Seeded {len(rows)} tables ({sum(rows.values())} rows) into {args.output_dir} "
+          f"in {time.perf_counter() - started:.2f}s")
+    if cache:
+        evicting = time.perf_counter()
+        cache.record_run()
+        evicted = (cache.evict(build_cache.parse_size(args.cache_max_size), keep=job_fingerprints(options).values())
+                   if args.cache_max_size else [])
+        phases["cache"] = time.perf_counter() - evicting
+        print(f"Build cache: {cache.hits} jobs reused, {cache.misses} generated "
+              f"({cache.seconds_saved:.1f}s saved), {len(evicted)} entries evicted")
+
+    if args.profile or args.metrics_json:
+        for job, job_result in sorted(job_metrics.items()):
+            if not job_result.get("cached"):
+                metrics.print_summary(job, job_result)
+    if args.profile:
+        print(f"Profiles in {args.profile}")
+    if args.metrics_json:
+        metrics.write_metrics(args.metrics_json, {
+            "command": "seed", "options": dict(options, tables=args.tables, workers=args.workers),
+            "seconds": time.perf_counter() - started, "phases": phases, "rows": sum(rows.values()),
+            "peak_rss_bytes": metrics.peak_rss(), "jobs": job_metrics})
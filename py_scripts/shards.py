@@ -0,0 +1,207 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from datetime import timedelta
+from itertools import accumulate
+import json
+import os
+import random
+import time
+
+from . import compression, create_orders, create_promos, demand
+from .paths import sql_files_dir
+from .writers import DEFAULT_BATCH_SIZE, DEFAULT_FORMAT, FORMATS, open_table, report_throughput
+
+# Chain-scale orders, order_items and sales_report: many stores over many
+# years, generated in shards on a process pool with the numpy engine.
+#
+# The work is cut into units of one store over one slice of weeks, ordered by
+# slice and then store, and the shards take consecutive runs of units. Every
+# unit has its own random streams, so its rows only depend on the seed. IDs
+# are handed out in unit order: a cheap first pass counts the orders and
+# order items of every unit (see orders_numpy.count_orders), so every unit
+# knows its ID ranges up front and the shards never overlap or leave gaps.
+#
+# The tables have no store column. Each store has its own ten employees
+# instead: store s takes employee IDs 10*s+1 to 10*s+10, so store 0 looks
+# exactly like the single-store data.
+
+default_output_dir = os.path.join(sql_files_dir, "shards")
+
+employees_per_store = 10
+
+# how much busier or quieter than the demand model a store can be
+store_volume_range = (0.7, 1.3)
+
+
+# Every (store, slice) unit in ID order, with the date range it covers
+def plan_units(stores, num_weeks, weeks_per_slice):
+    units = []
+    for first_week in range(0, num_weeks, weeks_per_slice):
+        for store in range(stores):
+            units.append({"store": store, "first_week": first_week,
+                          "weeks": min(weeks_per_slice, num_weeks - first_week)})
+    return units
+
+
+# Split the units into runs of nearly equal length, one per shard
+def split_units(units, num_shards):
+    size, extra = divmod(len(units), num_shards)
+    bounds = list(accumulate([0] + [size + (shard < extra) for shard in range(num_shards)]))
+    return [units[bounds[shard]:bounds[shard + 1]] for shard in range(num_shards)]
+
+
+# everything a worker needs to rebuild the same inputs as every other worker
+def load_inputs(options):
+    menu = create_orders.load_menu(options["menu"])
+    demand_model = demand.load_demand(options["demand"], menu)
+    if options["daily_orders"] is not None:
+        demand_model.daily_orders = tuple(options["daily_orders"])
+    return menu, demand_model
+
+
+def unit_arguments(unit, options):
+    from . import orders_numpy
+    seed = options["seed"]
+    store = unit["store"]
+    volume = orders_numpy.make_rng(seed, f"store:{store}").uniform(*store_volume_range)
+    start_date = create_orders.start_date + timedelta(weeks=unit["first_week"])
+    return start_date, unit["weeks"], f"orders:{store}:{unit['first_week']}", volume
+
+
+# Runs in a worker process: count the orders and order items of some units
+def count_units(units, options):
+    from . import orders_numpy
+    compression.configure(options["compress"], options["compress_level"], options["compress_threads"])
+    menu, demand_model = load_inputs(options)
+    counts = []
+    for unit in units:
+        start_date, num_weeks, name, volume = unit_arguments(unit, options)
+        counts.append(orders_numpy.count_orders(start_date, num_weeks, menu, demand_model, options["seed"], name,
+                                                volume))
+    return counts
+
+
+def shard_file(table, shard):
+    return f"{table}.{shard:04d}.sql"
+
+
+# Runs in a worker process: write one shard's files and return its row counts
+def write_shard(shard, units, output_dir, options):
+    from . import orders_numpy
+    compression.configure(options["compress"], options["compress_level"], options["compress_threads"])
+    menu, demand_model = load_inputs(options)
+    discounts = create_promos.promo_discounts(options["seed"])
+
+    with ExitStack() as stack:
+        # the tables are created once by schema.sql, so no CREATE TABLE here
+        writers = [stack.enter_context(open_table(os.path.join(output_dir, shard_file(table, shard)), name, columns,
+                                                  "", options["format"], options["batch_size"]))
+                   for table, (name, columns, _) in create_orders.order_tables.items()]
+        for unit in units:
+            start_date, num_weeks, name, volume = unit_arguments(unit, options)
+            orders_numpy.write_order_data(writers, start_date, num_weeks, menu, discounts, demand_model,
+                                          options["seed"], name, unit["orders"][0], unit["order_items"][0],
+                                          employees_per_store * unit["store"] + 1, volume)
+
+    return {table: writer.rows_written for table, writer in zip(create_orders.order_tables, writers)}
+
+
+# Give every unit its first and last order and order item ID
+def assign_ids(units, counts):
+    next_order_id = next_order_item_id = 1
+    for unit, (orders, items) in zip(units, counts):
+        unit["orders"] = [next_order_id, next_order_id + orders - 1]
+        unit["order_items"] = [next_order_item_id, next_order_item_id + items - 1]
+        next_order_id += orders
+        next_order_item_id += items
+
+
+# Write schema.sql, load.sql (schema, then every shard of each table in
+# foreign-key order) and shards.json, the merge manifest.
+def write_manifest(output_dir, shards, rows, options):
+    with open(os.path.join(output_dir, "schema.sql"), 'w') as schema_file:
+        for _, _, ddl in create_orders.order_tables.values():
+            schema_file.write(ddl)
+
+    with open(os.path.join(output_dir, "load.sql"), 'w') as load_file:
+        load_file.write("-- Generated by python -m py_scripts shard.\n")
+        load_file.write("-- order_items references menu_items, so load menu_items.sql first.\n")
+        if options["compress"]:
+            load_file.write("-- The shard files are compressed: python -m py_scripts load <this directory>\n")
+        else:
+            load_file.write("-- Run from this directory so \\copy can find the CSV files: psql -f load.sql\n")
+        load_file.write("\\ir schema.sql\n")
+        for table in create_orders.order_tables:
+            for shard in range(len(shards)):
+                load_file.write(f"\\ir {shard_file(table, shard)}\n")
+
+    manifest = {
+        "format": options["format"],
+        "seed": options["seed"],
+        "start_date": create_orders.start_date.strftime('%Y-%m-%d'),
+        "stores": options["stores"],
+        "weeks": options["weeks"],
+        "weeks_per_slice": options["weeks_per_slice"],
+        "employees_per_store": employees_per_store,
+        "demand": options["demand"],
+        "compress": options["compress"],
+        "tables": {table: sum(shard_rows[table] for shard_rows in rows) for table in create_orders.order_tables},
+        "shards": [{"shard": shard,
+                    "files": {table: shard_file(table, shard) for table in create_orders.order_tables},
+                    "rows": rows[shard],
+                    "orders": [units[0]["orders"][0], units[-1]["orders"][1]],
+                    "order_items": [units[0]["order_items"][0], units[-1]["order_items"][1]],
+                    "units": units}
+                   for shard, units in enumerate(shards) if units],
+    }
+    with open(os.path.join(output_dir, "shards.json"), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+
+def generate_shards(output_dir, options, num_shards, workers=None):
+    units = plan_units(options["stores"], options["weeks"], options["weeks_per_slice"])
+    shards = [units for units in split_units(units, num_shards) if units]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        counts = [count for shard_counts in pool.map(count_units, shards, [options] * len(shards))
+                  for count in shard_counts]
+        assign_ids(units, counts)
+        rows = list(pool.map(write_shard, range(len(shards)), shards, [output_dir] * len(shards),
+                             [options] * len(shards)))
+
+    write_manifest(output_dir, shards, rows, options)
+    return rows
+
+
+def add_arguments(parser):
+    parser.add_argument("--output-dir", default=default_output_dir)
+    parser.add_argument("--format", choices=FORMATS, default=DEFAULT_FORMAT)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--stores", type=int, default=1)
+    parser.add_argument("--weeks", type=int, default=create_orders.num_weeks, help="weeks from the start date")
+    parser.add_argument("--weeks-per-slice", type=int, default=create_orders.num_weeks,
+                        help="the date range one unit of work covers")
+    parser.add_argument("--shards", type=int, default=os.cpu_count(), help="number of shards (files per table)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="size of the process pool")
+    parser.add_argument("--menu", default=create_orders.create_menu_items.input_file)
+    parser.add_argument("--demand", default=demand.default_config, help="demand model config (JSON)")
+    parser.add_argument("--daily-orders", type=int, nargs=2, metavar=("MIN", "MAX"),
+                        help="override the demand model's orders per ordinary day")
+    parser.add_argument("--seed", help="make the output reproducible (a random seed is picked otherwise)")
+    compression.add_compression_arguments(parser)
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    seed = args.seed if args.seed is not None else str(random.randrange(2 ** 32))
+    options = {"format": args.format, "batch_size": args.batch_size, "seed": seed, "stores": args.stores,
+               "weeks": args.weeks, "weeks_per_slice": args.weeks_per_slice, "menu": os.path.abspath(args.menu),
+               "demand": os.path.abspath(args.demand), "daily_orders": args.daily_orders, "compress": args.compress,
+               "compress_level": args.compress_level, "compress_threads": args.compress_threads}
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    rows = generate_shards(args.output_dir, options, args.shards, args.workers)
+    total = sum(sum(shard_rows.values()) for shard_rows in rows)
+    report_throughput(f"{len(rows)} shards", total, started)
+    print(f"Wrote {args.output_dir}/load.sql and shards.json")
@@ -0,0 +1,329 @@
+from collections import Counter
+from contextlib import ExitStack
+from operator import itemgetter
+import json
+import os
+import random
+import re
+import time
+
+from . import compression, create_customers, create_orders, ddl, seed
+from .compression import find_file
+from .paths import sql_file
+from .validate import base_table, null_values, statements
+from .writers import DEFAULT_BATCH_SIZE, DEFAULT_FORMAT, FORMATS, open_table, report_throughput
+
+# Cuts a generated directory (or a plain SQL dump) of the full order history
+# down to a fraction of its orders, for a database that fits on a laptop but
+# still looks like the real traffic to the reports:
+#
+#   python -m py_scripts subsample sql_files --fraction 0.01 --output-dir small
+#   python -m py_scripts load small --database pos_small
+#
+# An order is kept or dropped whole, with its order_items and sales_report
+# rows, so the foreign keys hold and order prices still add up. The
+# generators write the three tables in order id order, so they are read side
+# by side, one order at a time, and nothing is kept of the orders dropped.
+#
+# Orders are picked systematically within strata: every (hour, first menu
+# item, status) stratum has a credit that starts at a random point and goes
+# up by the fraction with every order in it, and an order is kept once the
+# credit reaches one, which takes one off it. The hourly sales, product usage
+# and sales reports only count completed orders, hence the status. Date is
+# not part of the stratum, as there would be too few orders in each; dates
+# are balanced by the order of the input instead, which runs from the first
+# date to the last: half of the sample's shortfall so far (the orders it
+# should have kept less the ones it did) is added to every credit, so a
+# stretch of dates that would come up short gets its orders from whichever
+# strata are nearest. The shortfall only moves a stratum's orders within one
+# of its share, so every stratum still keeps the fraction of its orders to
+# within one. How close the sample came is in subsample.json; the fewer orders
+# a day, hour or menu item keeps, the further off it can be.
+#
+# The other tables are copied as they are, or with --scrub-pii with the
+# names, emails and phone numbers of customers and employees replaced by ones
+# made from the id. inventory_report is copied too: its stock levels were
+# simulated from the full sales. The output is written like a seed directory,
+# with the keys in the CREATE TABLEs, and subsample.json compares the report
+# aggregates of the sample, scaled up by 1 / fraction, with the input's.
+
+order_tables = list(create_orders.order_tables)
+
+report_file = "subsample.json"
+
+# how much of the sample's shortfall a stratum's credit is topped up with
+shortfall_weight = 0.5
+
+# what the differences of the aggregates broken down are summed over
+breakdowns = {"daily_orders": "day by day", "hourly_sales": "hour by hour", "item_counts": "item by item",
+              "item_quantities": "item by item"}
+
+# column types read back as numbers; the rest stay strings
+integer_types = {"INT", "INTEGER", "SMALLINT", "BIGINT", "SERIAL", "BIGSERIAL"}
+decimal_types = {"NUMERIC", "DECIMAL", "FLOAT", "REAL", "DOUBLE"}
+
+copy_escape = re.compile(r"\\(.)")
+copy_escapes = {"t": "\t", "n": "\n", "r": "\r"}
+
+# the tables --scrub-pii rewrites, and what their people are called
+pii_tables = {"customers": "customer", "employees": "employee"}
+
+
+# a value of a row read in the format fmt as the generators would write it
+def parse_value(value, fmt, column_type):
+    if value == null_values[fmt]:
+        return None
+    if fmt == "copy" and "\\" in value:
+        value = copy_escape.sub(lambda match: copy_escapes.get(match.group(1), match.group(1)), value)
+    if column_type in integer_types:
+        return int(value)
+    if column_type in decimal_types:
+        return float(value)
+    if column_type == "BOOLEAN":
+        return value in ("t", "true", "True")
+    return value
+
+
+# The rows of table in path, as (format, values) with the values in the
+# column order of the CREATE TABLE
+def table_rows(path, table, create_tables):
+    names = list(ddl.columns(create_tables[table]))
+    for name, columns, fmt, rows in statements(path, lambda name: base_table(name, create_tables) == table):
+        missing = [column for column in names if column not in columns]
+        if missing:
+            raise SystemExit(f"{name} in {path} has no {', '.join(missing)} column")
+        pick = itemgetter(*[columns.index(column) for column in names])
+        for row in rows:
+            yield fmt, pick(row)
+
+
+# The rows of a table referencing orders, handed out an order at a time
+class ChildRows:
+    def __init__(self, rows, order_id_index):
+        self.rows = rows
+        self.order_id_index = order_id_index
+        self.next = next(rows, None)
+        # rows whose order wasn't among the orders read
+        self.orphans = 0
+
+    # the rows of order_id, passing over the rows of the orders before it
+    def take(self, order_id):
+        group = []
+        while self.next is not None:
+            row_order_id = int(self.next[1][self.order_id_index])
+            if row_order_id > order_id:
+                break
+            if row_order_id == order_id:
+                group.append(self.next)
+            else:
+                self.orphans += 1
+            self.next = next(self.rows, None)
+        return group
+
+    def finish(self):
+        while self.next is not None:
+            self.orphans += 1
+            self.next = next(self.rows, None)
+
+
+# Keeps a fraction of the orders of every stratum, systematically, leaning
+# towards keeping an order while the whole sample is behind
+class Sampler:
+    def __init__(self, fraction, rng):
+        self.fraction = fraction
+        self.rng = rng
+        # (starting credit, credit) per stratum
+        self.credit = {}
+        # orders the sample should have kept so far, less the ones it did
+        self.shortfall = 0.0
+
+    def keep(self, stratum):
+        if stratum not in self.credit:
+            start = self.rng.random()
+            self.credit[stratum] = (start, start)
+        start, credit = self.credit[stratum]
+        credit += self.fraction
+        self.shortfall += self.fraction
+        # credit - start is how many orders the stratum is behind its share,
+        # which the shortfall may move but never to one or more either way
+        kept = credit >= start + 1 or (credit > start and credit + shortfall_weight * self.shortfall >= 1)
+        if kept:
+            credit -= 1
+            self.shortfall -= 1
+        self.credit[stratum] = (start, credit)
+        return kept
+
+
+# What the db.js reports add up, over a set of orders
+class Aggregates:
+    def __init__(self):
+        self.orders = 0
+        self.revenue = 0.0
+        # getDailyOrders
+        self.daily_orders = Counter()
+        # getHourlySales: completed order prices by hour
+        self.hourly_sales = Counter()
+        # getSalesReport: completed order item lines by menu item
+        self.item_counts = Counter()
+        # getProductUsage: completed quantities by menu item
+        self.item_quantities = Counter()
+
+    def add(self, order_date, hour, price, status, items, revenue):
+        self.orders += 1
+        self.revenue += revenue
+        self.daily_orders[order_date] += 1
+        if status == "Completed":
+            self.hourly_sales[hour] += price
+            for menu_item_id, quantity in items:
+                self.item_counts[menu_item_id] += 1
+                self.item_quantities[menu_item_id] += quantity
+
+    # The sample's aggregates scaled up by 1 / fraction against these, as
+    # {aggregate: (input total, scaled sample total, difference)}, the
+    # difference being the sum of the differences per day, hour or menu item
+    # as a share of the input total
+    def compare(self, sample, fraction):
+        compared = {"orders": (self.orders, sample.orders / fraction, None),
+                    "revenue": (self.revenue, sample.revenue / fraction, None)}
+        for name in breakdowns:
+            full, part = getattr(self, name), getattr(sample, name)
+            total = sum(full.values())
+            off = sum(abs(part[key] / fraction - full[key]) for key in full.keys() | part.keys())
+            compared[name] = (total, sum(part.values()) / fraction, off / total if total else 0.0)
+        return compared
+
+
+# the row with its name, email and phone number made from its id, the phone
+# number by the permutation of phone_keys for its table
+def scrub(table, row, names, phone_keys):
+    person = pii_tables[table]
+    row[names.index("name")] = f"{person.title()} {row[0]}"
+    row[names.index("email")] = f"{person}{row[0]}@example.com"
+    row[names.index("phone_number")] = create_customers.phone_number(row[0], phone_keys[table])
+    return row
+
+
+# Copy the rows of every table but the order tables from path into
+# output_dir, and return the rows copied per table
+def copy_tables(path, output_dir, create_tables, fmt, batch_size, phone_keys=None):
+    writers = {}
+    with ExitStack() as stack:
+        for name, columns, row_format, rows in statements(path, lambda name: base_table(name, create_tables)
+                                                          not in order_tables + [None]):
+            table = base_table(name, create_tables)
+            types = list(ddl.columns(create_tables[table]).items())
+            names = [column for column, _ in types]
+            if table not in writers:
+                writers[table] = stack.enter_context(open_table(sql_file(table, output_dir), table, names,
+                                                                create_tables[table], fmt, batch_size))
+            positions = [columns.index(column) if column in columns else None for column in names]
+            for row in rows:
+                values = [None if position is None else parse_value(row[position], row_format, column_type)
+                          for position, (_, column_type) in zip(positions, types)]
+                if phone_keys and table in pii_tables:
+                    values = scrub(table, values, names, phone_keys)
+                writers[table].write(values)
+    for table, writer in writers.items():
+        report_throughput(table, writer.rows_written, writer.started)
+    return {table: writer.rows_written for table, writer in writers.items()}
+
+
+# Write a fraction of the orders of path, with their order_items and
+# sales_report rows, into output_dir. Returns the rows written per table,
+# the aggregates of the input and of the sample, and the orphaned child rows.
+def sample_orders(path, output_dir, create_tables, fraction, rng, fmt, batch_size):
+    columns = {table: list(ddl.columns(create_tables[table])) for table in order_tables}
+    types = {table: list(ddl.columns(create_tables[table]).values()) for table in order_tables}
+    order_id, order_date, order_time, order_price, order_status = (
+        columns["orders"].index(column) for column in
+        ["order_id", "order_date", "order_time", "order_price", "order_status"])
+    item_order_id, menu_item_id, quantity = (columns["order_items"].index(column) for column in
+                                             ["order_id", "menu_item_id", "recorded_quantity"])
+    sale_order_id, revenue = (columns["sales_report"].index(column) for column in ["order_id", "revenue"])
+    children = {"order_items": ChildRows(table_rows(path, "order_items", create_tables), item_order_id),
+                "sales_report": ChildRows(table_rows(path, "sales_report", create_tables), sale_order_id)}
+    sampler = Sampler(fraction, rng)
+    full, sample = Aggregates(), Aggregates()
+
+    with ExitStack() as stack:
+        writers = {table: stack.enter_context(open_table(sql_file(table, output_dir), table, columns[table],
+                                                         create_tables[table], fmt, batch_size))
+                   for table in order_tables}
+        for row_format, order in table_rows(path, "orders", create_tables):
+            items = children["order_items"].take(int(order[order_id]))
+            sales = children["sales_report"].take(int(order[order_id]))
+            hour = int(order[order_time][:2])
+            status = order[order_status]
+            lines = [(int(item[menu_item_id]), int(item[quantity])) for _, item in items]
+            aggregates = (order[order_date], hour, float(order[order_price]), status, lines,
+                          sum(float(sale[revenue]) for _, sale in sales))
+            full.add(*aggregates)
+            if not sampler.keep((hour, lines[0][0] if lines else None, status)):
+                continue
+            sample.add(*aggregates)
+            for table, rows in [("orders", [(row_format, order)]), ("order_items", items), ("sales_report", sales)]:
+                for values_format, values in rows:
+                    writers[table].write([parse_value(value, values_format, column_type)
+                                          for value, column_type in zip(values, types[table])])
+        for child in children.values():
+            child.finish()
+    if not full.orders:
+        raise SystemExit(f"no orders in {path}")
+    for table, writer in writers.items():
+        report_throughput(table, writer.rows_written, writer.started)
+    return ({table: writer.rows_written for table, writer in writers.items()}, full, sample,
+            {table: child.orphans for table, child in children.items()})
+
+
+def add_arguments(parser):
+    parser.add_argument("path", help="the --output-dir of the seed, shard or append command, or a SQL file")
+    parser.add_argument("--file", default="load.sql", help="the load file in the directory")
+    parser.add_argument("--fraction", type=float, required=True, help="share of the orders to keep, e.g. 0.01")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--format", choices=FORMATS, default=DEFAULT_FORMAT)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--seed", default="subsample", help="the same seed and input always give the same sample")
+    parser.add_argument("--scrub-pii", action="store_true",
+                        help="replace the names, emails and phone numbers of customers and employees")
+    compression.add_compression_arguments(parser)
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    if not 0 < args.fraction <= 1:
+        raise SystemExit("--fraction must be more than 0 and at most 1")
+    path = os.path.join(args.path, args.file) if os.path.isdir(args.path) else args.path
+    if find_file(path) is None:
+        raise SystemExit(f"{path} not found")
+    compression.configure(args.compress, args.compress_level, args.compress_threads)
+    os.makedirs(args.output_dir, exist_ok=True)
+    create_tables = {table: module.create_table for table, module in seed.table_modules.items()}
+    rng = random.Random(args.seed)
+
+    started = time.perf_counter()
+    # a permutation per table, so customers and employees never share a number
+    phone_keys = {table: create_customers.phone_permutation(random.Random(f"{args.seed}:{table}:phone"))
+                  for table in pii_tables} if args.scrub_pii else None
+    rows = copy_tables(path, args.output_dir, create_tables, args.format, args.batch_size, phone_keys)
+    order_rows, full, sample, orphans = sample_orders(path, args.output_dir, create_tables, args.fraction, rng,
+                                                      args.format, args.batch_size)
+    rows.update(order_rows)
+    options = {"format": args.format, "seed": args.seed, "engine": None, "demand": None, "compress": args.compress,
+               "inline_constraints": True}
+    seed.write_manifest(args.output_dir, rows, options, "subsample")
+
+    compared = full.compare(sample, args.fraction)
+    for name, (total, scaled, difference) in compared.items():
+        print(f"  {name}: {total:,.0f} in the input, {scaled:,.0f} scaled up from the sample"
+              + (f", {difference:.1%} off {breakdowns[name]}" if difference is not None else ""))
+    for table, count in orphans.items():
+        if count:
+            print(f"  {table}: {count} rows dropped, their order not found (is the input in order id order?)")
+    with open(os.path.join(args.output_dir, report_file), 'w') as json_file:
+        json.dump({"input": path, "fraction": args.fraction, "seed": args.seed, "scrub_pii": args.scrub_pii,
+                   "rows": rows, "orphans": orphans,
+                   "aggregates": {name: {"input": total, "sample_scaled": scaled, "difference": difference}
+                                  for name, (total, scaled, difference) in compared.items()}},
+                  json_file, indent=2)
+    print(f"Kept {order_rows['orders']} of {full.orders} orders ({sum(rows.values())} rows) in {args.output_dir} "
+          f"in {time.perf_counter() - started:.2f}s")
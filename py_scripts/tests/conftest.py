@@ -0,0 +1,18 @@
+import subprocess
+import sys
+
+import pytest
+
+from ..paths import repo_root
+from ..writers import FORMATS
+
+
+# A week of seed data in every output format, generated once per test run.
+# Tests that change it work on a copy.
+@pytest.fixture(scope="session", params=FORMATS)
+def seed_dir(request, tmp_path_factory):
+    output_dir = tmp_path_factory.mktemp(f"seed_{request.param}")
+    subprocess.run([sys.executable, "-m", "py_scripts", "seed", "--seed", "1", "--weeks", "1", "--format",
+                    request.param, "--output-dir", str(output_dir), "--workers", "2"],
+                   cwd=repo_root, check=True, capture_output=True)
+    return output_dir
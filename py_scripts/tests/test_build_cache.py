@@ -0,0 +1,84 @@
+import os
+import shutil
+
+import pytest
+
+from .. import build_cache, create_menu_items, demand, seed
+
+# a seed run's options, as seed.main puts them together
+seed_options = {"format": "insert", "batch_size": 1000, "weeks": 52, "seed": "1", "customers": 299, "engine": "python",
+                "demand": demand.default_config, "daily_orders": None, "partition_by_month": False,
+                "compress": None, "compress_level": None, "compress_threads": None, "inline_constraints": False}
+
+
+# the jobs whose fingerprint differs between two sets of fingerprints
+def missed(before, after):
+    return sorted(job for job in before if before[job] != after[job])
+
+
+@pytest.fixture
+def before():
+    return seed.job_fingerprints(seed_options)
+
+
+def test_fingerprints_are_stable(before):
+    assert seed.job_fingerprints(dict(seed_options)) == before
+
+
+def test_input_file_change_misses_its_jobs_and_downstream(before, tmp_path, monkeypatch):
+    menu_file = tmp_path / "menu_items.txt"
+    shutil.copyfile(create_menu_items.input_file, menu_file)
+    with open(menu_file, "a") as changed:
+        changed.write("\n")
+    monkeypatch.setattr(create_menu_items, "input_file", str(menu_file))
+    assert missed(before, seed.job_fingerprints(seed_options)) == [
+        "ingredients", "inventory_report", "menu_item_allergens", "menu_items", "orders", "promos"]
+
+
+def test_option_change_misses_only_the_jobs_using_it(before):
+    assert missed(before, seed.job_fingerprints(dict(seed_options, weeks=4))) == ["inventory_report", "orders"]
+    assert missed(before, seed.job_fingerprints(dict(seed_options, customers=5000))) == ["customers"]
+    assert missed(before, seed.job_fingerprints(dict(seed_options, seed="2"))) == sorted(seed.jobs)
+    # not an option any job's output depends on
+    assert missed(before, seed.job_fingerprints(dict(seed_options, compress_threads=2))) == []
+
+
+def test_module_change_misses_its_importers_and_downstream(before, monkeypatch):
+    file_digest = build_cache.file_digest
+    monkeypatch.setattr(build_cache, "file_digest", lambda path: file_digest(path) + (
+        "changed" if os.path.basename(path) == "create_promos.py" else ""))
+    assert missed(before, seed.job_fingerprints(seed_options)) == ["inventory_report", "orders", "promos"]
+
+
+def store(cache, tmp_path, fingerprint, size, used):
+    output_dir = tmp_path / "output"
+    output_dir.mkdir(exist_ok=True)
+    (output_dir / "table.sql").write_bytes(b"x" * size)
+    cache.store(fingerprint, "job", str(output_dir), ["table.sql"], {"table": 1}, 1.0)
+    os.utime(os.path.join(cache.entry_dir(fingerprint), build_cache.entry_file), (used, used))
+
+
+def test_store_and_restore(tmp_path):
+    cache = build_cache.BuildCache(str(tmp_path / "cache"))
+    store(cache, tmp_path, "a", 10, 1000)
+    restored = tmp_path / "restored"
+    restored.mkdir()
+    assert cache.restore("a", cache.get("a"), str(restored)) == {"table": 1}
+    assert (restored / "table.sql").read_bytes() == b"x" * 10
+    assert cache.get("missing") is None
+
+
+def test_evict_removes_least_recently_used_but_spares_keep(tmp_path):
+    cache = build_cache.BuildCache(str(tmp_path / "cache"))
+    for used, fingerprint in enumerate(["oldest", "old", "new"]):
+        store(cache, tmp_path, fingerprint, 100, 1000 + used)
+    assert cache.evict(150, keep={"oldest"}) == ["old", "new"]
+    assert [fingerprint for fingerprint, _, _ in cache.entries()] == ["oldest"]
+
+
+def test_evict_stops_at_the_limit(tmp_path):
+    cache = build_cache.BuildCache(str(tmp_path / "cache"))
+    for used, fingerprint in enumerate(["oldest", "old", "new"]):
+        store(cache, tmp_path, fingerprint, 100, 1000 + used)
+    assert cache.evict(200) == ["oldest"]
+    assert sorted(fingerprint for fingerprint, _, _ in cache.entries()) == ["new", "old"]
@@ -0,0 +1,20 @@
+import pytest
+
+from .. import catalog
+
+
+@pytest.fixture(scope="module")
+def compiled():
+    return catalog.compile_catalog()
+
+
+def test_allergens_match_by_the_name_before_brackets(compiled):
+    sesame = 1 << compiled["allergens"].index("sesame (sesame oil)")
+    assert catalog.allergen_mask(compiled, ["sesame"]) == sesame
+    assert catalog.allergen_mask(compiled, ["Sesame", "sesame (sesame oil)"]) == sesame
+    assert all(not item["allergens"] & sesame for item in catalog.items_without(compiled, ["sesame"]))
+
+
+def test_unknown_allergens_are_refused(compiled):
+    with pytest.raises(ValueError, match="unknown allergens: sesam"):
+        catalog.allergen_mask(compiled, ["sesam"])
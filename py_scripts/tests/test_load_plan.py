@@ -0,0 +1,45 @@
+from .. import load_plan, seed
+
+create_tables = {table: module.create_table for table, module in seed.table_modules.items()}
+
+
+def index_lines(rows):
+    stages = load_plan.plan_stages(list(rows), rows, create_tables)
+    return [line for part in stages["keys"] for line in part if "INDEX" in line]
+
+
+def test_small_tables_get_no_secondary_indexes():
+    lines = index_lines({"menu_items": 26, "inventory": 46, "orders": 66806, "order_items": 130000})
+    assert not [line for line in lines if " ON menu_items " in line or " ON inventory " in line]
+    assert "CREATE INDEX IF NOT EXISTS orders_order_date_idx ON orders (order_date);" in lines
+    assert "CREATE INDEX IF NOT EXISTS order_items_order_id_idx ON order_items (order_id);" in lines
+
+
+def test_order_and_recipe_tables_get_their_indexes_at_any_size():
+    lines = index_lines({"menu_items": 26, "ingredients": 105, "orders": 300, "order_items": 600})
+    assert lines == ["CREATE INDEX IF NOT EXISTS ingredients_inventory_item_id_idx ON ingredients (inventory_item_id);",
+                     "CREATE INDEX IF NOT EXISTS ingredients_menu_item_id_idx ON ingredients (menu_item_id);",
+                     "CREATE INDEX IF NOT EXISTS order_items_menu_item_id_idx ON order_items (menu_item_id);",
+                     "CREATE INDEX IF NOT EXISTS order_items_order_id_idx ON order_items (order_id);",
+                     "CREATE INDEX IF NOT EXISTS orders_order_date_idx ON orders (order_date);",
+                     "CREATE INDEX IF NOT EXISTS orders_order_status_idx ON orders (order_status);"]
+
+
+def test_prices_get_no_index():
+    lines = index_lines({"menu_items": 1000000})
+    assert "CREATE INDEX IF NOT EXISTS menu_items_menu_item_name_idx ON menu_items (menu_item_name);" in lines
+    assert not [line for line in lines if "price" in line]
+
+
+def test_customer_emails_get_a_unique_index_at_any_size():
+    for customers in [299, 1000000]:
+        lines = index_lines({"customers": customers})
+        assert lines == ["CREATE UNIQUE INDEX IF NOT EXISTS customers_email_key ON customers (email);"]
+
+
+def test_foreign_keys_are_added_not_valid_then_validated():
+    stages = load_plan.plan_stages(["orders", "sales_report"], {"orders": 10, "sales_report": 10}, create_tables)
+    assert stages["foreign_keys"] == [[
+        "ALTER TABLE sales_report ADD CONSTRAINT sales_report_order_id_fkey FOREIGN KEY (order_id) "
+        "REFERENCES orders (order_id) NOT VALID;",
+        "ALTER TABLE sales_report VALIDATE CONSTRAINT sales_report_order_id_fkey;"]]
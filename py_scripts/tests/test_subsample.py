@@ -0,0 +1,99 @@
+from collections import Counter, defaultdict
+import json
+import random
+import subprocess
+import sys
+
+from .. import ddl, seed, subsample
+from ..paths import repo_root
+from .test_validate import run_validator
+
+create_tables = {table: module.create_table for table, module in seed.table_modules.items()}
+
+
+def run_subsample(directory, output_dir, *options):
+    fmt = json.loads((directory / "manifest.json").read_text())["format"]
+    subprocess.run([sys.executable, "-m", "py_scripts", "subsample", str(directory), "--output-dir", str(output_dir),
+                    "--format", fmt, *options], cwd=repo_root, check=True, capture_output=True)
+
+
+# the rows of table in a load file as value tuples, grouped by column
+def rows_by(path, table, column):
+    types = list(ddl.columns(create_tables[table]).values())
+    index = list(ddl.columns(create_tables[table])).index(column)
+    grouped = defaultdict(list)
+    for fmt, values in subsample.table_rows(str(path), table, create_tables):
+        row = tuple(subsample.parse_value(value, fmt, column_type) for value, column_type in zip(values, types))
+        grouped[row[index]].append(row)
+    return grouped
+
+
+def test_kept_orders_bring_all_their_rows(seed_dir, tmp_path):
+    run_subsample(seed_dir, tmp_path, "--fraction", "0.3")
+    assert (tmp_path / "load.sql").read_text().startswith("-- Generated by python -m py_scripts subsample.\n")
+    orders = rows_by(tmp_path / "load.sql", "orders", "order_id")
+    all_orders = rows_by(seed_dir / "load.sql", "orders", "order_id")
+    assert 0.25 * len(all_orders) < len(orders) < 0.35 * len(all_orders)
+    for table in ["order_items", "sales_report"]:
+        kept = rows_by(tmp_path / "load.sql", table, "order_id")
+        every = rows_by(seed_dir / "load.sql", table, "order_id")
+        assert set(kept) <= set(orders)
+        assert {order_id: every[order_id] for order_id in orders} == {order_id: kept[order_id] for order_id in orders}
+        assert {order_id: all_orders[order_id] for order_id in orders} == orders
+    validator = run_validator(tmp_path / "load.sql")
+    assert not validator.failed() and not validator.problems
+    report = json.loads((tmp_path / subsample.report_file).read_text())
+    assert report["rows"]["orders"] == len(orders) and report["orphans"] == {"order_items": 0, "sales_report": 0}
+
+
+def test_every_stratum_keeps_its_share_to_within_one():
+    rng = random.Random(1)
+    for fraction in [0.01, 0.1, 0.5]:
+        sampler = subsample.Sampler(fraction, random.Random(2))
+        seen, kept = Counter(), Counter()
+        for stratum in rng.choices(range(200), weights=[rng.random() ** 3 for _ in range(200)], k=20000):
+            seen[stratum] += 1
+            kept[stratum] += sampler.keep(stratum)
+        assert all(abs(kept[stratum] - fraction * count) <= 1 + 1e-9 for stratum, count in seen.items())
+        # the shortfall keeps the whole sample close too, though not to within one
+        assert abs(sum(kept.values()) - fraction * 20000) <= 5
+
+
+def test_scrub_pii_rewrites_names_emails_and_phones(seed_dir, tmp_path):
+    run_subsample(seed_dir, tmp_path, "--fraction", "0.1", "--scrub-pii")
+    phones = []
+    for table, person in subsample.pii_tables.items():
+        before = rows_by(seed_dir / "load.sql", table, "customer_id" if table == "customers" else "employee_id")
+        after = rows_by(tmp_path / "load.sql", table, "customer_id" if table == "customers" else "employee_id")
+        assert set(after) == set(before)
+        for person_id, [(_, name, email, phone, *rest)] in after.items():
+            (_, old_name, old_email, old_phone, *old_rest), = before[person_id]
+            assert (name, email) == (f"{person.title()} {person_id}", f"{person}{person_id}@example.com")
+            assert (name, email, phone) != (old_name, old_email, old_phone) and rest == old_rest
+            phones.append(phone)
+    assert len(set(phones)) == len(phones)
+
+
+def test_rows_out_of_order_id_order_are_counted_as_orphans(tmp_path):
+    (tmp_path / "dump.sql").write_text(
+        "COPY orders (order_id, employee_id, order_date, order_time, order_price, order_status) FROM stdin;\n"
+        "1\t1\t2023-09-17\t11:00:00\t5.0\tCompleted\n"
+        "2\t1\t2023-09-17\t12:00:00\t6.0\tCompleted\n"
+        "3\t1\t2023-09-18\t12:00:00\t7.0\tPending\n"
+        "\\.\n"
+        "COPY order_items (order_item_id, order_id, menu_item_id, combo, combo_type, item_size, recorded_quantity) "
+        "FROM stdin;\n"
+        "1\t2\t1\tf\tN/A\tSmall\t1\n"
+        "2\t1\t1\tf\tN/A\tSmall\t1\n"
+        "3\t3\t2\tf\tN/A\tSmall\t2\n"
+        "4\t9\t2\tf\tN/A\tSmall\t2\n"
+        "\\.\n"
+        "COPY sales_report (sales_report_id, order_id, revenue, sales_report_date) FROM stdin;\n"
+        "1\t1\t5.0\t2023-09-17\n2\t2\t6.0\t2023-09-17\n3\t3\t0.0\t2023-09-18\n"
+        "\\.\n")
+    rows, full, sample, orphans = subsample.sample_orders(str(tmp_path / "dump.sql"), str(tmp_path), create_tables,
+                                                          1.0, random.Random(1), "copy", 1000)
+    # order 1's item comes after order 2's, and order 9 isn't there
+    assert orphans == {"order_items": 2, "sales_report": 0}
+    assert rows == {"orders": 3, "order_items": 2, "sales_report": 3}
+    assert full.orders == sample.orders == 3 and full.item_counts == {1: 1}
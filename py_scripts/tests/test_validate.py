@@ -0,0 +1,121 @@
+from datetime import date
+import io
+import json
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from .. import seed, validate
+from ..paths import repo_root
+from ..writers import open_table
+
+# the CLI defaults: hire dates run up to today
+start, end = date(2023, 9, 17), date.today()
+
+
+def run_validator(path, database=None):
+    validator = validate.Validator({table: module.create_table for table, module in seed.table_modules.items()},
+                                   start, end)
+    validate.scan_file(str(path), validator.visit)
+    validator.finish(database)
+    return validator
+
+
+def problems(validator):
+    return {(problem["table"], problem["kind"], problem["column"]): problem
+            for problem in validator.report()["problems"]}
+
+
+# Write rows into extra.sql in the format of the directory and have load.sql
+# include it last
+def plant(directory, table, columns, rows):
+    fmt = json.loads((directory / "manifest.json").read_text())["format"]
+    with open_table(str(directory / f"extra_{table}.sql"), table, columns, "", fmt) as writer:
+        writer.write_rows(rows)
+    with open(directory / "load.sql", "a") as load_file:
+        load_file.write(f"\\ir extra_{table}.sql\n")
+
+
+def test_generated_directory_is_clean(seed_dir):
+    validator = run_validator(seed_dir / "load.sql")
+    assert not validator.failed()
+    assert validator.rows["orders"] > 0 and validator.rows["order_items"] > validator.rows["orders"]
+
+
+def test_planted_problems_are_reported(seed_dir, tmp_path):
+    directory = tmp_path / "planted"
+    shutil.copytree(seed_dir, directory)
+    order_columns = ["order_id", "employee_id", "order_date", "order_time", "order_price", "order_status"]
+    plant(directory, "orders", order_columns, [
+        # a second order 1
+        (1, 1, "2023-09-18", "12:00:00", 5.0, "Completed"),
+        # after --end
+        (900001, 1, "2099-01-01", "12:00:00", 5.0, "Completed"),
+    ])
+    plant(directory, "order_items", ["order_item_id", "order_id", "menu_item_id", "combo", "combo_type",
+                                     "item_size", "recorded_quantity"],
+          [(900001, 777777, 1, False, "N/A", "Small", 1)])
+    found = problems(run_validator(directory / "load.sql"))
+    assert found[("orders", "duplicate keys", "order_id")]["sample"] == ["1"]
+    assert found[("orders", "bad dates", "order_date")]["sample"] == ["2099-01-01"]
+    assert found[("order_items", "dangling refs", "order_id")]["sample"] == ["777777"]
+    assert len(found) == 3
+
+    result = subprocess.run([sys.executable, "-m", "py_scripts", "validate", str(directory), "--end", str(end)],
+                            cwd=repo_root, capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "order_items.order_id: dangling refs: 1 (777777)" in result.stdout
+
+
+def test_history_dates_before_start_are_bad_but_hire_dates_are_not(seed_dir, tmp_path):
+    directory = tmp_path / "early"
+    shutil.copytree(seed_dir, directory)
+    plant(directory, "orders", ["order_id", "employee_id", "order_date", "order_time", "order_price",
+                                "order_status"], [(900001, 1, "2023-09-16", "12:00:00", 5.0, "Completed")])
+    found = problems(run_validator(directory / "load.sql"))
+    assert list(found) == [("orders", "bad dates", "order_date")]
+
+
+def test_missing_referenced_table_is_not_checked(seed_dir):
+    validator = run_validator(seed_dir / "order_items.sql")
+    assert list(problems(validator)) == [("order_items", "not checked", "menu_item_id"),
+                                         ("order_items", "not checked", "order_id")]
+    assert not validator.failed()
+
+
+def test_id_set_grows_and_differs():
+    ids = validate.IdSet()
+    size = len(ids.bits)
+    ids.add(np.array([3, 5, 10 ** 6]))
+    assert len(ids.bits) * 8 > 10 ** 6 > size * 8
+    assert ids.contains(np.array([3, 4, 5, 10 ** 6, 10 ** 7, -3])).tolist() == [True, False, True, True, False,
+                                                                               False]
+    # other is smaller than this set: the ids past its end are all missing
+    other = validate.IdSet()
+    other.add(np.array([3, 4]))
+    assert list(ids.difference(other)) == [5, 10 ** 6]
+    assert list(other.difference(ids)) == [4]
+
+
+def test_id_set_refuses_negative_ids():
+    with pytest.raises(ValueError):
+        validate.IdSet().add(np.array([1, -5]))
+
+
+def test_negative_and_non_numeric_keys_are_bad_keys():
+    validator = validate.Validator({"orders": seed.table_modules["orders"].create_table}, start, end)
+    validator.visit("Orders", ["order_id", "order_date"], iter([["-5", "2023-09-18"], ["7", "2023-09-18"],
+                                                                ["x1", "2023-09-18"]]), "\\N")
+    found = problems(validator)
+    assert sorted(found[("orders", "bad keys", "order_id")]["sample"]) == ["-5", "x1"]
+    # -5 didn't end up in the bitmap as some other id
+    assert list(validator.keys[("orders", "order_id")].difference(validate.IdSet())) == [7]
+
+
+def test_insert_rows_read_quoted_values():
+    lines = io.StringIO("(1, 'O''Brien, Pat', NULL),\n(2, 'a (b)', 'c');\nSELECT 1;\n")
+    assert list(validate.insert_rows(lines)) == [["1", "O'Brien, Pat", "NULL"], ["2", "a (b)", "c"]]
+    assert next(lines) == "SELECT 1;\n"
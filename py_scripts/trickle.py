@@ -0,0 +1,360 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime, time as time_of_day, timedelta
+import argparse
+import asyncio
+import heapq
+import json
+import random
+import time
+
+from . import create_menu_items, create_order_items, create_orders, demand
+from .load_test import percentile
+from .pg import connection_settings
+
+try:
+    import asyncpg
+except ImportError as error:
+    raise ImportError("the trickle simulator needs asyncpg: pip install asyncpg") from error
+
+# Feeds a seeded database a steady trickle of orders, so the kitchen view
+# (getPendingOrders, /api/orders-status, updateOrderStatus) has live orders to
+# show, instead of a static dump.
+#
+# Orders come from the same demand model and order item rules as the seed
+# data, day after day from --start-date, on a simulated clock that runs
+# faster than real time: --speed simulated seconds per second, or fast enough
+# for --orders-per-minute on average over each day (the lunch and dinner
+# peaks still come faster). Closed hours are skipped. Every order is inserted
+# as 'Awaiting', like the kiosk does, when the clock reaches its time. A
+# kitchen of --cooks cooks then takes the orders in turn, moves each to
+# 'In Progress' and, after a preparation time that grows with its servings,
+# to 'Completed', the statuses the kitchen page sets.
+#
+# Everything due is sent every --tick: the new orders with their items as one
+# COPY in one transaction, and the status changes as one UPDATE per status,
+# on a pool of --pool-size connections. The lag is how long after its time on
+# the simulated clock (converted to real time) a change was committed. It
+# stays near the tick while the database keeps up, and grows once it falls
+# behind. A batch that fails, on a duplicate key or a lost connection, is
+# counted with its error, and the status changes of the orders it held are
+# dropped with it; the summary and --json give both per kind of change.
+#
+#   python -m py_scripts.trickle --database pos --orders-per-minute 10000 --duration 60
+
+statuses = ["Awaiting", "In Progress", "Completed"]
+
+# the statuses an order may be in when it's moved to each status, so a late
+# 'In Progress' never undoes a 'Completed'
+previous_statuses = {"In Progress": ["Awaiting"], "Completed": ["Awaiting", "In Progress"]}
+
+# preparation time in simulated seconds: a base plus some per serving, times
+# a random factor
+prep_base = 120
+prep_per_serving = 30
+prep_spread = 0.3
+
+# the errors a batch can fail with, which lose the batch but not the run
+database_errors = (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError)
+
+update_status_sql = ("UPDATE orders SET order_status = $1 "
+                     "WHERE order_id = ANY($2::int[]) AND order_status = ANY($3::text[])")
+
+
+def open_window(demand_model):
+    minutes = [minute for minute, weight in enumerate(demand_model.minute_weights) if weight > 0]
+    return minutes[0] * 60, (minutes[-1] + 1) * 60
+
+
+# Plans the simulated days: the orders of every day with their items, the
+# kitchen's status changes, and when each of them is due in real seconds from
+# the start of the run
+class Plan:
+    def __init__(self, start_date, demand_model, menu, discounts, first_order_id, first_order_item_id, cooks,
+                 speed=None, orders_per_minute=None):
+        self.demand_model = demand_model
+        self.menu_choices = create_order_items.build_menu_choices(menu, demand_model.popularity)
+        self.discounts = discounts
+        self.order_id = first_order_id
+        self.order_item_id = first_order_item_id
+        self.speed = speed
+        self.orders_per_minute = orders_per_minute
+        self.opens, self.closes = open_window(demand_model)
+        self.day = start_date
+        # when the next day opens, in real seconds
+        self.day_start = 0.0
+        # when each cook is free again, in simulated seconds from the start
+        self.cooks = [0.0] * cooks
+        self.start_date = start_date
+
+    # the events of the next day, as (due, simulated time, kind, payload),
+    # and the real second the day after it starts
+    def next_day(self):
+        day = self.day
+        times = sorted(self.demand_model.order_time() for _ in range(self.demand_model.order_count(day)))
+        # order times are whole minutes; spread them over their minute
+        seconds = sorted(int(t[:2]) * 3600 + int(t[3:5]) * 60 + random.randrange(60) for t in times)
+        speed = self.speed or (len(seconds) and (self.closes - self.opens) * self.orders_per_minute
+                               / (60 * len(seconds)))
+        offset = (day - self.start_date).days * 86400
+        day_start = self.day_start
+
+        def due(simulated):
+            return day_start + (simulated - offset - self.opens) / speed
+
+        events = []
+        for second in seconds:
+            items, price = create_order_items.generate_order_items(self.order_id, self.order_item_id,
+                                                                   self.menu_choices, self.discounts,
+                                                                   self.demand_model.combo_mix)
+            arrival = offset + second
+            order_time = time_of_day(second // 3600, second // 60 % 60, second % 60)
+            order = (self.order_id, random.randint(1, 10), day, order_time, price, statuses[0])
+            events.append((due(arrival), arrival, "insert", (order, items)))
+
+            # the first cook free takes the order
+            cook = min(range(len(self.cooks)), key=self.cooks.__getitem__)
+            started = max(arrival, self.cooks[cook])
+            servings = sum(item[-1] for item in items)
+            done = started + (prep_base + prep_per_serving * servings) * random.lognormvariate(0, prep_spread)
+            self.cooks[cook] = done
+            events.append((due(started), started, "In Progress", self.order_id))
+            events.append((due(done), done, "Completed", self.order_id))
+
+            self.order_id += 1
+            self.order_item_id += len(items)
+
+        self.day += timedelta(days=1)
+        if seconds:
+            self.day_start += (self.closes - self.opens) / speed
+        return events, self.day_start
+
+
+class Stats:
+    def __init__(self):
+        self.lags = defaultdict(list)
+        self.interval_lags = []
+        self.inserted = 0
+        self.updated = defaultdict(int)
+        self.batches = 0
+        # per kind of change: the batches that failed by error, and the
+        # orders or status changes lost with them
+        self.errors = defaultdict(Counter)
+        self.failed = defaultdict(int)
+        self.failed_orders = set()
+
+    def fail(self, kind, error, order_ids):
+        self.errors[kind][type(error).__name__] += 1
+        self.failed[kind] += len(order_ids)
+        if kind == "insert":
+            self.failed_orders.update(order_ids)
+
+
+async def insert_orders(pool, batch, started, stats):
+    orders = [order for _, _, _, (order, _) in batch]
+    items = [item for _, _, _, (_, order_items) in batch for item in order_items]
+    try:
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.copy_records_to_table(
+                    "orders", records=orders, columns=[column.lower() for column in create_orders.order_columns])
+                await connection.copy_records_to_table("order_items", records=items,
+                                                       columns=create_order_items.order_item_columns)
+    except database_errors as error:
+        stats.fail("insert", error, [order[0] for order in orders])
+        return
+    committed = time.perf_counter() - started
+    stats.inserted += len(orders)
+    stats.batches += 1
+    for event in batch:
+        stats.lags["insert"].append(committed - event[0])
+        stats.interval_lags.append(committed - event[0])
+
+
+async def update_statuses(pool, status, batch, started, stats):
+    # the orders of a failed insert are never there to update
+    lost = [event for event in batch if event[3] in stats.failed_orders]
+    stats.failed[status] += len(lost)
+    batch = [event for event in batch if event[3] not in stats.failed_orders]
+    if not batch:
+        return
+    try:
+        await pool.execute(update_status_sql, status, [order_id for _, _, _, order_id in batch],
+                           previous_statuses[status])
+    except database_errors as error:
+        stats.fail(status, error, [order_id for _, _, _, order_id in batch])
+        return
+    committed = time.perf_counter() - started
+    stats.updated[status] += len(batch)
+    stats.batches += 1
+    for event in batch:
+        stats.lags[status].append(committed - event[0])
+        stats.interval_lags.append(committed - event[0])
+
+
+def simulated_clock(start_date, simulated):
+    return datetime.combine(start_date, time_of_day()) + timedelta(seconds=simulated)
+
+
+def lag_summary(lags):
+    lags = sorted(lags)
+    return {name: round(percentile(lags, q) * 1000, 1) if lags else None
+            for name, q in [("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)]}
+
+
+async def run(database, plan, duration, tick, batch_size, pool_size, report_every):
+    pool = await asyncpg.create_pool(min_size=1, max_size=pool_size, **connection_settings(database))
+    stats = Stats()
+    # the batch inserting every order not yet completed, which its status
+    # changes wait for
+    inserting = {}
+    tasks = set()
+    events = []
+    sequence = 0
+    next_day_start = 0.0
+    simulated = 0.0
+
+    # any other error is a bug, and stops the run
+    crashed = []
+
+    def finished(task):
+        tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            crashed.append(task.exception())
+
+    def launch(coroutine):
+        task = asyncio.create_task(coroutine)
+        tasks.add(task)
+        task.add_done_callback(finished)
+        return task
+
+    async def after_inserts(waiting, coroutine):
+        await asyncio.gather(*waiting)
+        await coroutine
+
+    started = time.perf_counter()
+    last_report = started
+    try:
+        while True:
+            now = time.perf_counter() - started
+            if crashed:
+                raise crashed[0]
+            if now >= duration:
+                break
+            # plan a day ahead of the clock
+            while next_day_start <= now + tick:
+                day_events, next_day_start = plan.next_day()
+                for event in day_events:
+                    heapq.heappush(events, (event[0], sequence, event))
+                    sequence += 1
+
+            due = defaultdict(list)
+            while events and events[0][0] <= now:
+                event = heapq.heappop(events)[2]
+                due[event[2]].append(event)
+                simulated = event[1]
+            for kind in ["insert"] + statuses[1:]:
+                for first in range(0, len(due[kind]), batch_size):
+                    batch = due[kind][first:first + batch_size]
+                    if kind == "insert":
+                        task = launch(insert_orders(pool, batch, started, stats))
+                        for event in batch:
+                            inserting[event[3][0][0]] = task
+                    else:
+                        order_ids = [event[3] for event in batch]
+                        waiting = {inserting[order_id] for order_id in order_ids if order_id in inserting}
+                        launch(after_inserts(waiting, update_statuses(pool, kind, batch, started, stats)))
+                        if kind == "Completed":
+                            for order_id in order_ids:
+                                inserting.pop(order_id, None)
+
+            if report_every and time.perf_counter() - last_report >= report_every:
+                last_report = time.perf_counter()
+                lag = lag_summary(stats.interval_lags)
+                stats.interval_lags = []
+                print(f"{now:6.1f}s  clock {simulated_clock(plan.start_date, simulated):%Y-%m-%d %H:%M}  "
+                      f"{stats.inserted} orders, {stats.updated['Completed']} completed  "
+                      f"lag p50 {lag['p50']} ms, max {lag['max']} ms  {len(tasks)} batches in flight")
+            await asyncio.sleep(max(0.0, tick - (time.perf_counter() - started - now)))
+
+        if tasks:
+            await asyncio.wait(tasks)
+        if crashed:
+            raise crashed[0]
+    finally:
+        await pool.close()
+    elapsed = time.perf_counter() - started
+    return {
+        "elapsed": elapsed,
+        "orders": stats.inserted,
+        "orders_per_minute": stats.inserted / elapsed * 60,
+        "status_changes": dict(stats.updated),
+        "batches": stats.batches,
+        "simulated_until": simulated_clock(plan.start_date, simulated).isoformat(),
+        "lag_ms": {kind: lag_summary(stats.lags[kind]) for kind in ["insert"] + statuses[1:]
+                   if stats.lags[kind] or stats.failed[kind]},
+        "failed": dict(stats.failed),
+        "errors": {kind: dict(errors) for kind, errors in stats.errors.items()},
+    }
+
+
+async def plan_inputs(database, menu_file, demand_file, seed):
+    connection = await asyncpg.connect(**connection_settings(database))
+    try:
+        first_order_id = await connection.fetchval("SELECT COALESCE(max(order_id), 0) + 1 FROM orders")
+        first_order_item_id = await connection.fetchval(
+            "SELECT COALESCE(max(order_item_id), 0) + 1 FROM order_items")
+        discounts = {row["discounted_item"]: float(row["discount_amount"])
+                     for row in await connection.fetch("SELECT discounted_item, discount_amount FROM promos")}
+    finally:
+        await connection.close()
+    menu = create_orders.load_menu(menu_file)
+    demand_model = demand.load_demand(demand_file, menu)
+    random.seed(f"{seed}:trickle")
+    return menu, demand_model, discounts, first_order_id, first_order_item_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trickle simulated orders into a seeded database in real time.")
+    parser.add_argument("--database", default=None, help="default: from the PG*/DB_* variables")
+    rate = parser.add_mutually_exclusive_group()
+    rate.add_argument("--speed", type=float, help="simulated seconds per second")
+    rate.add_argument("--orders-per-minute", type=float, default=10000,
+                      help="average orders per real minute (the default)")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=date.today(),
+                        help="the first simulated day (default: today)")
+    parser.add_argument("--cooks", type=int, default=4, help="orders prepared at once")
+    parser.add_argument("--tick", type=float, default=0.05, help="seconds between batches")
+    parser.add_argument("--batch-size", type=int, default=1000, help="most orders or status changes per statement")
+    parser.add_argument("--pool-size", type=int, default=10,
+                        help="database connections (node-postgres pools 10 by default)")
+    parser.add_argument("--report-every", type=float, default=5, help="seconds between progress lines (0: none)")
+    parser.add_argument("--menu", default=create_menu_items.input_file)
+    parser.add_argument("--demand", default=demand.default_config, help="demand model config (JSON)")
+    parser.add_argument("--seed", default="trickle")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    menu, demand_model, discounts, first_order_id, first_order_item_id = asyncio.run(
+        plan_inputs(args.database, args.menu, args.demand, args.seed))
+    plan = Plan(args.start_date, demand_model, menu, discounts, first_order_id, first_order_item_id, args.cooks,
+                args.speed, None if args.speed else args.orders_per_minute)
+    result = asyncio.run(run(args.database, plan, args.duration, args.tick, args.batch_size, args.pool_size,
+                             args.report_every))
+
+    print(f"{result['orders']} orders in {result['elapsed']:.1f}s ({result['orders_per_minute']:,.0f} orders/min), "
+          f"simulated clock at {result['simulated_until']}")
+    print(f"{'change':<12} {'count':>8} {'failed':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for kind, lag in result["lag_ms"].items():
+        count = result["orders"] if kind == "insert" else result["status_changes"].get(kind, 0)
+        print(f"{kind:<12} {count:>8} {result['failed'].get(kind, 0):>8} "
+              + " ".join(f"{lag[name] if lag[name] is not None else '-':>8}" for name in ["p50", "p95", "p99", "max"]))
+    for kind, errors in result["errors"].items():
+        print(f"{kind} batches failed: " + ", ".join(f"{count} {name}" for name, count in errors.items()))
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(dict(result, database=args.database, speed=args.speed,
+                           target_orders_per_minute=None if args.speed else args.orders_per_minute,
+                           cooks=args.cooks, tick=args.tick, pool_size=args.pool_size, seed=args.seed),
+                      json_file, indent=2)
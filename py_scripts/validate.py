@@ -0,0 +1,390 @@
+from datetime import date
+from itertools import islice
+import csv
+import json
+import os
+import re
+import subprocess
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import create_orders, ddl, seed
+from .compression import find_file, open_input
+from .load import copy_file_pattern, copy_stdin_pattern, include_pattern
+from .pg import psql_env
+
+# Checks a generated directory (or a plain SQL dump) for the problems that
+# otherwise only show up when a load fails halfway through:
+#
+#   duplicate keys     a primary key value seen twice
+#   dangling refs      a foreign key value missing from the table it references
+#   bad keys           a key that isn't a whole number, or a NULL primary key
+#   bad dates          a DATE that isn't a date or is past --end, or a date
+#                      of the order history before --start
+#
+# The files are streamed the way load.py streams them, following \ir and
+# \copy, decompressing as they go, in the insert, copy and csv formats. Rows
+# are checked a chunk at a time and nothing is kept of them but bitmaps over
+# the integer ids: one bit per id for every primary key and for the values of
+# every foreign key, about 12 MB per 100 million ids. Once everything is read,
+# the foreign key bitmaps are checked against the key bitmaps, so the check
+# doesn't depend on the order the tables come in; seed, shard and append
+# directories list them in foreign-key order anyway. Tables are recognised by
+# name, monthly partitions (orders_2023_09) as their parent.
+#
+#   python -m py_scripts validate sql_files
+#   python -m py_scripts validate top_up --database pos
+#
+# A table referenced but not in the input (an append directory has no
+# menu_items) is read from --database; without one its references aren't
+# checked.
+
+# rows per chunk
+chunk_rows = 1 << 16
+
+# ids listed per problem
+sample_size = 10
+
+# the dates of the order history, which start at --start; other dates (hire
+# dates) only can't be past --end
+history_dates = {("orders", "order_date"), ("sales_report", "sales_report_date"),
+                 ("inventory_report", "inventory_report_date")}
+
+insert_pattern = re.compile(r"INSERT INTO\s+(\S+)\s*\(([^)]*)\)\s*VALUES\s*$", re.IGNORECASE)
+copy_target_pattern = re.compile(r"COPY\s+(\S+)\s*\(([^)]*)\)", re.IGNORECASE)
+partition_pattern = re.compile(r"(\w+?)_(?:\d{4}_\d{2}|default)")
+
+
+# A set of non-negative integer ids, a bit per id up to the largest one
+# (a negative id would index the bitmap from its end)
+class IdSet:
+    def __init__(self):
+        self.bits = np.zeros(1 << 16, dtype=np.uint8)
+
+    def _grow(self, largest):
+        size = len(self.bits)
+        while size * 8 <= largest:
+            size *= 2
+        if size > len(self.bits):
+            self.bits = np.concatenate([self.bits, np.zeros(size - len(self.bits), dtype=np.uint8)])
+
+    def contains(self, ids):
+        found = np.zeros(len(ids), dtype=bool)
+        inside = (ids >= 0) & (ids < len(self.bits) * 8)
+        found[inside] = (self.bits[ids[inside] >> 3] >> (ids[inside] & 7)) & 1 == 1
+        return found
+
+    def add(self, ids):
+        if len(ids):
+            if ids.min() < 0:
+                raise ValueError(f"negative id: {int(ids.min())}")
+            self._grow(int(ids.max()))
+            np.bitwise_or.at(self.bits, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+
+    # the ids in this set and not in other, a block at a time
+    def difference(self, other, block=1 << 20):
+        for start in range(0, len(self.bits), block):
+            mine = self.bits[start:start + block]
+            theirs = np.zeros(len(mine), dtype=np.uint8)
+            overlap = other.bits[start:start + len(mine)]
+            theirs[:len(overlap)] = overlap
+            missing = np.unpackbits(mine & ~theirs, bitorder="little")
+            for offset in np.flatnonzero(missing):
+                yield start * 8 + int(offset)
+
+
+# A count of problems and the first few values they were found in
+class Problem:
+    def __init__(self):
+        self.count = 0
+        self.sample = []
+
+    def add(self, values, count=None):
+        self.count += len(values) if count is None else count
+        self.sample.extend(values[:sample_size - len(self.sample)])
+
+    def as_dict(self):
+        return {"count": self.count, "sample": [str(value) for value in self.sample]}
+
+
+# the table a table or partition name in the files belongs to, or None
+def base_table(name, tables):
+    name = name.split(".")[-1].strip('"').lower()
+    if name in tables:
+        return name
+    partition = partition_pattern.fullmatch(name)
+    return partition.group(1) if partition and partition.group(1) in tables else None
+
+
+def column_names(columns):
+    return [column.strip().strip('"').lower() for column in columns.split(",")]
+
+
+class Validator:
+    def __init__(self, create_tables, start, end):
+        self.primary_keys, self.foreign_keys, self.date_columns = {}, {}, {}
+        for table, create_table in create_tables.items():
+            primary_key = ddl.primary_key(create_table)
+            if len(primary_key) == 1:
+                self.primary_keys[table] = primary_key[0]
+            self.foreign_keys[table] = ddl.foreign_keys(create_table)
+            self.date_columns[table] = [column for column, column_type in ddl.columns(create_table).items()
+                                        if column_type == "DATE"]
+        self.start, self.end = start, end
+        # ids per (table, column): the primary keys and the columns referenced
+        self.keys = {(table, column): IdSet() for table, column in self.primary_keys.items()}
+        for references in self.foreign_keys.values():
+            for _, referenced, referenced_column in references:
+                self.keys.setdefault((referenced, referenced_column), IdSet())
+        # the values of every foreign key, per (table, column)
+        self.references = {(table, column): IdSet() for table, references in self.foreign_keys.items()
+                           for column, _, _ in references}
+        self.rows = {}
+        self.problems = {}
+        # the dates already found good, per (table, column)
+        self.good_dates = {}
+
+    def problem(self, table, kind, column):
+        return self.problems.setdefault((table, kind, column), Problem())
+
+    # the values of a chunk as ids, with the ones that aren't ids (whole
+    # numbers of 0 or more) reported
+    def ids(self, table, column, values):
+        try:
+            ids = np.array(values, dtype=np.int64)
+        except (ValueError, OverflowError):
+            good = [value for value in values if re.fullmatch(r"\d+", value.strip())]
+            self.problem(table, "bad keys", column).add([value for value in values
+                                                         if not re.fullmatch(r"\d+", value.strip())])
+            return np.array(good, dtype=np.int64)
+        negative = ids < 0
+        if negative.any():
+            self.problem(table, "bad keys", column).add([str(value) for value in ids[negative].tolist()])
+            return ids[~negative]
+        return ids
+
+    def check_keys(self, table, column, values, null):
+        nulls = sum(1 for value in values if value == null)
+        if nulls:
+            self.problem(table, "bad keys", column).add(["NULL"], nulls)
+        ids = self.ids(table, column, [value for value in values if value != null])
+        unique, counts = np.unique(ids, return_counts=True)
+        seen = self.keys[(table, column)].contains(unique)
+        repeated = (counts > 1) | seen
+        if repeated.any():
+            self.problem(table, "duplicate keys", column).add(unique[repeated].tolist(),
+                                                              int((counts - 1 + seen)[repeated].sum()))
+        self.keys[(table, column)].add(unique)
+
+    def check_references(self, table, column, values, null):
+        ids = self.ids(table, column, [value for value in values if value != null])
+        self.references[(table, column)].add(np.unique(ids))
+
+    def check_dates(self, table, column, values, null):
+        good = self.good_dates.setdefault((table, column), set())
+        start = self.start if (table, column) in history_dates else date.min
+        bad = set()
+        for value in set(values) - good - {null}:
+            try:
+                day = date.fromisoformat(value)
+            except ValueError:
+                day = None
+            if day and start <= day <= self.end:
+                good.add(value)
+            else:
+                bad.add(value)
+        if bad:
+            self.problem(table, "bad dates", column).add(sorted(bad), sum(1 for value in values if value in bad))
+
+    # rows are lists of the values of columns, as strings; null is how the
+    # format spells NULL
+    def visit(self, name, columns, rows, null):
+        table = base_table(name, self.foreign_keys)
+        if table is None:
+            for _ in rows:
+                pass
+            return
+        position = {column: index for index, column in enumerate(columns)}
+        checks = []
+        if table in self.primary_keys:
+            checks.append((self.check_keys, self.primary_keys[table]))
+        checks += [(self.check_references, column) for column, _, _ in self.foreign_keys[table]]
+        checks += [(self.check_dates, column) for column in self.date_columns[table]]
+        checks = [(check, column, position[column]) for check, column in checks if column in position]
+        self.rows.setdefault(table, 0)
+        while True:
+            chunk = list(islice(rows, chunk_rows))
+            if not chunk:
+                break
+            self.rows[table] += len(chunk)
+            for check, column, index in checks:
+                check(table, column, [row[index] for row in chunk], null)
+
+    # Check every foreign key's values against the keys of the table it
+    # references. Tables not in the input are read from database, if given.
+    def finish(self, database=None):
+        for table, references in self.foreign_keys.items():
+            if table not in self.rows:
+                continue
+            for column, referenced, referenced_column in references:
+                if referenced not in self.rows:
+                    if not database:
+                        self.problem(table, "not checked", column).add([f"{referenced} not in the input"], 0)
+                        continue
+                    self.read_keys(referenced, referenced_column, database)
+                missing = self.references[(table, column)].difference(self.keys[(referenced, referenced_column)])
+                problem = self.problem(table, "dangling refs", column)
+                for value in missing:
+                    problem.add([value])
+                if not problem.count:
+                    del self.problems[(table, "dangling refs", column)]
+
+    def read_keys(self, table, column, database):
+        psql = subprocess.Popen(["psql", "-X", "-q", "-v", "ON_ERROR_STOP=1", "-c",
+                                 f"COPY (SELECT {column} FROM {table}) TO STDOUT"], stdout=subprocess.PIPE,
+                                env=psql_env(database), text=True)
+        lines = (line.rstrip("\n") for line in psql.stdout)
+        while True:
+            chunk = list(islice(lines, chunk_rows))
+            if not chunk:
+                break
+            self.keys[(table, column)].add(np.unique(self.ids(table, column, [v for v in chunk if v != "\\N"])))
+        if psql.wait() != 0:
+            raise SystemExit(f"psql failed reading {table}.{column} from {database}")
+        self.rows.setdefault(table, 0)
+
+    def failed(self):
+        return any(kind != "not checked" for _, kind, _ in self.problems)
+
+    def report(self):
+        return {
+            "rows": self.rows,
+            "problems": [dict(problem.as_dict(), table=table, kind=kind, column=column)
+                         for (table, kind, column), problem in sorted(self.problems.items())],
+        }
+
+
+# the rows of a COPY ... FROM stdin block, up to its \.
+def copy_rows(lines):
+    for line in lines:
+        line = line.rstrip("\n")
+        if line == "\\.":
+            return
+        yield line.split("\t")
+
+
+# The rows of a multi-row INSERT, one per line as writers.InsertWriter writes
+# them, up to the ;
+def insert_rows(lines):
+    def values(lines):
+        for line in lines:
+            line = line.rstrip()
+            yield line[1:line.rindex(")")]
+            if line.endswith(";"):
+                return
+
+    return csv.reader(values(lines), quotechar="'", skipinitialspace=True)
+
+
+# how every format spells NULL
+null_values = {"insert": "NULL", "copy": "\\N", "csv": "\\N"}
+
+
+# The statements of path (and the files it includes) that hold rows, as
+# (table, columns, format, rows), one at a time. Rows not read before the
+# next statement are skipped, and so are the statements of the tables wanted
+# (given a table name) says no to, without splitting their rows.
+def statements(path, wanted=None):
+    directory = os.path.dirname(path)
+    with open_input(path) as sql_file:
+        lines = iter(sql_file)
+        for line in lines:
+            include = include_pattern.match(line)
+            copy_file = copy_file_pattern.match(line)
+            copy_stdin = copy_stdin_pattern.match(line)
+            insert = insert_pattern.match(line)
+            if include:
+                yield from statements(os.path.join(directory, include.group(1)), wanted)
+            elif copy_file:
+                target, csv_name, _ = copy_file.groups()
+                table, columns = copy_target_pattern.match(f"COPY {target}").groups()
+                if wanted is None or wanted(table):
+                    with open_input(os.path.join(directory, csv_name)) as csv_file:
+                        yield table, column_names(columns), "csv", csv.reader(csv_file)
+            elif copy_stdin:
+                table, columns = copy_target_pattern.match(line).groups()
+                if wanted is None or wanted(table):
+                    rows = copy_rows(lines)
+                    yield table, column_names(columns), "copy", rows
+                    for _ in rows:
+                        pass
+                else:
+                    for line in lines:
+                        if line.rstrip("\n") == "\\.":
+                            break
+            elif insert:
+                table, columns = insert.groups()
+                if wanted is None or wanted(table):
+                    rows = insert_rows(lines)
+                    yield table, column_names(columns), "insert", rows
+                    for _ in rows:
+                        pass
+                else:
+                    for line in lines:
+                        if line.rstrip().endswith(";"):
+                            break
+
+
+# Stream the rows of path (and the files it includes) into visit(table,
+# columns, rows, null), one statement at a time
+def scan_file(path, visit):
+    for table, columns, fmt, rows in statements(path):
+        visit(table, columns, rows, null_values[fmt])
+
+
+def print_report(report):
+    for table, rows in report["rows"].items():
+        print(f"{table}: {rows} rows")
+    for problem in report["problems"]:
+        if problem["kind"] == "not checked":
+            print(f"  {problem['table']}.{problem['column']}: not checked ({problem['sample'][0]})")
+            continue
+        print(f"  {problem['table']}.{problem['column']}: {problem['kind']}: {problem['count']} "
+              f"({', '.join(problem['sample'])}{', ...' if problem['count'] > len(problem['sample']) else ''})")
+
+
+def add_arguments(parser):
+    parser.add_argument("path", help="the --output-dir of the seed, shard or append command, or a SQL file")
+    parser.add_argument("--file", default="load.sql", help="the load file in the directory")
+    parser.add_argument("--database", help="read the keys of referenced tables missing from the input from here")
+    parser.add_argument("--start", type=date.fromisoformat, default=create_orders.start_date.date(),
+                        help="order history dates before this are out of range")
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today(),
+                        help="dates after this are out of range")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    if np is None:
+        raise SystemExit("validate needs numpy: pip install numpy")
+    path = os.path.join(args.path, args.file) if os.path.isdir(args.path) else args.path
+    if find_file(path) is None:
+        raise SystemExit(f"{path} not found")
+    started = time.perf_counter()
+    validator = Validator({table: module.create_table for table, module in seed.table_modules.items()},
+                          args.start, args.end)
+    scan_file(path, validator.visit)
+    validator.finish(args.database)
+    report = validator.report()
+    print_report(report)
+    print(f"Checked {sum(report['rows'].values())} rows in {time.perf_counter() - started:.2f}s")
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+    if validator.failed():
+        raise SystemExit(1)
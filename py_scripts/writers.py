@@ -0,0 +1,219 @@
+from contextlib import contextmanager
+import csv
+import os
+import time
+
+from . import metrics
+from .compression import open_output
+from .ddl import bare_table
+
+# number of rows per multi-row INSERT statement (or per write for COPY/CSV)
+DEFAULT_BATCH_SIZE = 1000
+
+# output formats every generator understands
+FORMATS = ["insert", "copy", "csv"]
+DEFAULT_FORMAT = "insert"
+
+
+# With the seed command's staged load plan (see load_plan.py) the tables are
+# created bare, with their columns only, and the plan adds the keys once the
+# rows are in. Set per process by configure_tables, like the compression
+# settings.
+table_settings = {"bare": False}
+
+
+def configure_tables(bare=False):
+    table_settings["bare"] = bare
+
+
+# the CREATE TABLE to write for a table, as configured
+def table_ddl(create_table):
+    return bare_table(create_table) if create_table and table_settings["bare"] else create_table
+
+
+# turn a python value into a SQL literal for an INSERT statement
+def sql_literal(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "True" if value else "False"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+# turn a python value into a field of COPY's tab-separated text format
+def copy_field(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+# turn a python value into a CSV field, using the same NULL and boolean
+# spelling as COPY
+def csv_field(value):
+    return copy_field(value) if value is None or isinstance(value, bool) else value
+
+
+# Base class for the row writers. Rows are buffered until batch_size is
+# reached and then flushed, so memory stays flat no matter how many rows the
+# generator produces.
+class RowWriter:
+    def __init__(self, sql_file, table, columns, batch_size=DEFAULT_BATCH_SIZE):
+        self.sql_file = sql_file
+        self.table = table
+        self.columns = columns
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self.started = time.perf_counter()
+        # time spent formatting values and writing text, for metrics.py
+        self.format_seconds = 0.0
+        self.write_seconds = 0.0
+        self._batch = []
+
+    def write(self, row):
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        if not self._batch:
+            return
+        started = time.perf_counter()
+        batch = [tuple(map(self.format_value, row)) for row in self._batch]
+        formatted = time.perf_counter()
+        self.write_formatted_batch(batch)
+        self.format_seconds += formatted - started
+        self.write_seconds += time.perf_counter() - formatted
+        self.rows_written += len(self._batch)
+        self._batch = []
+
+    # Write rows whose values were already turned into strings with
+    # format_value, given column by column. Bulk generators use this to format
+    # a whole column at once instead of value by value.
+    def write_formatted(self, columns):
+        self.flush()
+        started = time.perf_counter()
+        rows = list(zip(*columns))
+        for start in range(0, len(rows), self.batch_size):
+            self.write_formatted_batch(rows[start:start + self.batch_size])
+        self.write_seconds += time.perf_counter() - started
+        self.rows_written += len(rows)
+
+    # this writer's spelling of a single value
+    def format_value(self, value):
+        raise NotImplementedError
+
+    def write_formatted_batch(self, batch):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+
+# Writes rows as a series of chunked multi-row INSERT statements.
+class InsertWriter(RowWriter):
+    def __init__(self, sql_file, table, columns, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(sql_file, table, columns, batch_size)
+        self._header = f"INSERT INTO {table} ({', '.join(columns)}) VALUES \n"
+
+    format_value = staticmethod(sql_literal)
+
+    def write_formatted_batch(self, batch):
+        values = ",\n".join("(" + ", ".join(row) + ")" for row in batch)
+        self.sql_file.write(self._header)
+        self.sql_file.write(values + ";\n")
+
+
+# Writes rows as a single tab-separated COPY ... FROM stdin block.
+class CopyWriter(RowWriter):
+    def __init__(self, sql_file, table, columns, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(sql_file, table, columns, batch_size)
+        self.sql_file.write(f"COPY {table} ({', '.join(columns)}) FROM stdin;\n")
+
+    format_value = staticmethod(copy_field)
+
+    def write_formatted_batch(self, batch):
+        self.sql_file.write("".join("\t".join(row) + "\n" for row in batch))
+
+    def close(self):
+        super().close()
+        self.sql_file.write("\\.\n")
+
+
+# Writes rows to a CSV file next to the SQL file, and a \copy command in the
+# SQL file that loads it. psql resolves the CSV path against its working
+# directory, so run the loader from the output directory.
+class CsvWriter(RowWriter):
+    def __init__(self, sql_file, table, columns, batch_size=DEFAULT_BATCH_SIZE, csv_file=None):
+        super().__init__(sql_file, table, columns, batch_size)
+        self.csv_path = csv_file
+        self._csv_file = open_output(csv_file, newline='')
+        self._csv = csv.writer(self._csv_file)
+
+    format_value = staticmethod(csv_field)
+
+    def write_formatted_batch(self, batch):
+        self._csv.writerows(batch)
+
+    def close(self):
+        super().close()
+        self._csv_file.close()
+        self.sql_file.write(f"\\copy {self.table} ({', '.join(self.columns)}) "
+                            f"FROM '{os.path.basename(self.csv_path)}' WITH (FORMAT csv, NULL '\\N')\n")
+
+
+# how every format spells a single value, for code that formats rows before
+# it knows which writer they go to
+value_formatters = {"insert": sql_literal, "copy": copy_field, "csv": csv_field}
+
+
+def make_writer(fmt, sql_file, table, columns, batch_size=DEFAULT_BATCH_SIZE, output_file=None):
+    if fmt == "insert":
+        return InsertWriter(sql_file, table, columns, batch_size)
+    if fmt == "copy":
+        return CopyWriter(sql_file, table, columns, batch_size)
+    if fmt == "csv":
+        csv_file = os.path.splitext(output_file)[0] + ".csv"
+        return CsvWriter(sql_file, table, columns, batch_size, csv_file)
+    raise ValueError(f"Unknown output format: {fmt}")
+
+
+# Open a table's output file, write its CREATE TABLE statement and hand back a
+# writer for the rows in the requested format. after_load is any SQL that has
+# to run once the rows are in.
+@contextmanager
+def open_table(output_file, table, columns, create_table, fmt=DEFAULT_FORMAT, batch_size=DEFAULT_BATCH_SIZE,
+               after_load=None):
+    with open_output(output_file) as sql_file:
+        sql_file.write(table_ddl(create_table))
+        writer = make_writer(fmt, sql_file, table, columns, batch_size, output_file)
+        yield writer
+        writer.close()
+        if after_load:
+            sql_file.write("\n" + after_load)
+    metrics.record_table(table, writer, [output_file] + ([writer.csv_path] if fmt == "csv" else []))
+
+
+# the output options shared by every generator's command line
+def add_output_arguments(parser, default_output):
+    parser.add_argument("--output", default=default_output)
+    parser.add_argument("--format", choices=FORMATS, default=DEFAULT_FORMAT,
+                        help="insert: multi-row INSERTs, copy: COPY FROM stdin, csv: CSV file plus \\copy loader")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    metrics.add_metrics_arguments(parser)
+
+
+# print how many rows were written and the rows/sec achieved
+def report_throughput(label, rows, started):
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"{label}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/sec)")